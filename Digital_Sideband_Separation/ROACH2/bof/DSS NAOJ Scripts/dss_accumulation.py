@@ -0,0 +1,225 @@
+# Functions to synchronize the measurements with the accumulations of the
+# dss model, so that the data is read as soon as a clean accumulation is
+# available instead of waiting a fixed pause time, to detect when a test
+# tone has settled, and to average several accumulations in software.
+
+# imports
+import time
+import numpy as np
+from dss_tone_check import is_tone_settled
+from dss_multilo_parameters import *
+
+# cache of the roach objects that have an accumulation counter register
+acc_cnt_available = {}
+
+def has_acc_cnt(roach):
+    """
+    Check if the model has an accumulation counter register. The check is
+    done only once per roach object.
+    :param roach: FpgaClient object to communicate with roach.
+    :return: True if the accumulation counter can be read, False otherwise.
+    """
+    if acc_cnt_reg is None:
+        return False
+    if roach not in acc_cnt_available:
+        acc_cnt_available[roach] = hasattr(roach, 'listdev') and \
+            acc_cnt_reg in roach.listdev()
+    return acc_cnt_available[roach]
+
+def get_acc_mark(roach):
+    """
+    Get a reference point to wait for new accumulations with wait_new_acc.
+    It should be taken right after the event that contaminates the current
+    accumulation (e.g. a tone change).
+    :param roach: FpgaClient object to communicate with roach.
+    :return: (time, accumulation count) tuple. The count is None if the
+        model has no accumulation counter.
+    """
+    if has_acc_cnt(roach):
+        return time.time(), roach.read_uint(acc_cnt_reg)
+    return time.time(), None
+
+def wait_new_acc(roach, mark=None, nacc=2):
+    """
+    Wait until nacc accumulations have finished after mark. If the model
+    has an accumulation counter the register is polled and the function
+    returns as soon as it has advanced nacc times. Otherwise it waits the
+    computed duration of nacc accumulations since mark, plus acc_margin.
+    The default nacc=2 discards the accumulation in progress at mark, and
+    waits for one complete accumulation after it.
+    :param roach: FpgaClient object to communicate with roach.
+    :param mark: reference point from get_acc_mark. If None it is taken
+        when the function is called.
+    :param nacc: number of accumulations to wait.
+    """
+    if mark is None:
+        mark = get_acc_mark(roach)
+    start_time, start_cnt = mark
+
+    # no counter, wait for the computed accumulation time
+    if start_cnt is None:
+        remaining_time = nacc*acc_time + acc_margin - (time.time() - start_time)
+        if remaining_time > 0:
+            time.sleep(remaining_time)
+        return
+
+    # poll the accumulation counter (it may wrap around)
+    timeout = 2*nacc*acc_time + 1 # s
+    while (roach.read_uint(acc_cnt_reg) - start_cnt) % 2**32 < nacc:
+        if time.time() - start_time > timeout:
+            raise RuntimeError("Timeout waiting for accumulation counter " +
+                acc_cnt_reg + ".")
+        time.sleep(acc_time / 10)
+
+def restart_acc(roach):
+    """
+    Restart the accumulation by pulsing the counter reset register, so
+    that the next accumulation contains only data after the call.
+    :param roach: FpgaClient object to communicate with roach.
+    :return: reference point for wait_new_acc, taken after the restart.
+    """
+    roach.write_int(cnt_rst_reg, 1)
+    roach.write_int(cnt_rst_reg, 0)
+    return get_acc_mark(roach)
+
+def start_clean_acc(roach):
+    """
+    Start waiting for a clean accumulation after a change in the input
+    signal (e.g. after the generator confirmed a tone change with *opc?).
+    If acc_restart is True the accumulation is restarted and only one 
+    accumulation must be waited, otherwise the accumulation in progress 
+    is discarded and the next one is waited.
+    :param roach: FpgaClient object to communicate with roach.
+    :return: (mark, nacc) arguments for wait_new_acc.
+    """
+    if acc_restart:
+        return restart_acc(roach), 1
+    return get_acc_mark(roach), 2
+
+def wait_clean_acc(roach):
+    """
+    Wait for a clean accumulation after a change in the input signal.
+    :param roach: FpgaClient object to communicate with roach.
+    """
+    mark, nacc = start_clean_acc(roach)
+    wait_new_acc(roach, mark, nacc)
+
+def wait_tone_settled(roach, read_acc, acc_start, get_tone):
+    """
+    Wait until the test tone has settled after a frequency change. Every
+    new accumulation after acc_start is read, and the tone is declared 
+    settled when its value at the test channel agrees with the previous
+    accumulation within settle_pow_tol and settle_ang_tol (see 
+    is_tone_settled of dss_tone_check.py). If the tone doesn't settle in 
+    settle_max_time, the last data is returned anyway with a warning.
+    :param roach: FpgaClient object to communicate with roach.
+    :param read_acc: function that reads the data of one accumulation as a
+        tuple of arrays.
+    :param acc_start: (mark, nacc) tuple from start_clean_acc.
+    :param get_tone: function that gets the complex tone value at the test
+        channel from the data arrays. Its magnitude is compared as power 
+        and its angle as phase (e.g. the cross-power ab).
+    :return: accumulation mark taken before the last read (for 
+        wait_new_acc), and data of the first settled accumulation.
+    """
+    wait_new_acc(roach, *acc_start)
+    start_time = time.time()
+    prev_tone  = None
+    while True:
+        mark = get_acc_mark(roach)
+        data = read_acc()
+        tone = get_tone(*data)
+        if prev_tone is not None and is_tone_settled(prev_tone, tone,
+            settle_pow_tol, settle_ang_tol):
+            return mark, data
+        if time.time() - start_time > settle_max_time:
+            print("Warning: tone not settled after " + str(settle_max_time) +
+                "[s], using last accumulation.")
+            return mark, data
+        prev_tone = tone
+        wait_new_acc(roach, mark, nacc=1)
+
+class RunningStats():
+    """
+    Running mean and variance of a sequence of arrays, computed with 
+    Welford's algorithm, so the data of every accumulation doesn't need to
+    be stored. Works with complex arrays, where the variance is the mean of
+    |x - mean|^2 (the sum of the variances of the real and imaginary parts).
+    """
+    def __init__(self):
+        self.n    = 0
+        self.mean = 0
+        self.m2   = 0
+
+    def update(self, x):
+        """
+        Add a new sample to the statistics.
+        :param x: data array (or scalar) of the sample.
+        """
+        self.n += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.n
+        self.m2 = self.m2 + np.real(delta * np.conj(x - self.mean))
+
+    def var(self):
+        """
+        :return: sample variance of the data, inf if there is only one sample.
+        """
+        if self.n < 2:
+            return np.full(np.shape(self.mean), np.inf)
+        return self.m2 / (self.n - 1)
+
+    def std_err(self):
+        """
+        :return: standard error of the mean, inf if there is only one sample.
+        """
+        return np.sqrt(self.var() / self.n)
+
+def average_accs(roach, read_acc, acc_start, get_ratio=None, get_tone=None):
+    """
+    Average up to n_accs consecutive accumulations in software. The first
+    accumulation is read once acc_start is reached (or once the tone has
+    settled if settle_tone is True and get_tone is given), and then every
+    new accumulation, updating the running mean and variance of each array
+    returned by read_acc. If get_ratio is given, the running statistics of
+    the ratio it computes from the data are also kept, and if target_err
+    is not None the averaging stops as soon as the relative standard error
+    of the ratio is below target_err.
+    :param roach: FpgaClient object to communicate with roach.
+    :param read_acc: function that reads the data of one accumulation as a
+        tuple of arrays.
+    :param acc_start: (mark, nacc) tuple from start_clean_acc.
+    :param get_ratio: function that computes a ratio from the data of one
+        accumulation, with the data arrays as arguments.
+    :param get_tone: function that gets the complex tone value at the test
+        channel from the data arrays, see wait_tone_settled.
+    :return: list of RunningStats, one per array returned by read_acc, and 
+        the RunningStats of the ratio (empty if get_ratio is None).
+    """
+    if settle_tone and get_tone is not None:
+        mark, data = wait_tone_settled(roach, read_acc, acc_start, get_tone)
+    else:
+        wait_new_acc(roach, *acc_start)
+        mark = get_acc_mark(roach)
+        data = read_acc()
+
+    stats       = None
+    ratio_stats = RunningStats()
+    for i in range(n_accs):
+        if i > 0:
+            wait_new_acc(roach, mark, nacc=1)
+            mark = get_acc_mark(roach)
+            data = read_acc()
+
+        if stats is None:
+            stats = [RunningStats() for _ in data]
+        for stat, x in zip(stats, data):
+            stat.update(x)
+
+        if get_ratio is not None:
+            ratio_stats.update(get_ratio(*data))
+            if target_err is not None and np.all(ratio_stats.std_err() <= 
+                target_err * np.abs(ratio_stats.mean)):
+                break
+
+    return stats, ratio_stats
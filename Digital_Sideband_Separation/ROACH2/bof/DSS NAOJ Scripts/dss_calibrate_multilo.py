@@ -3,10 +3,20 @@
 # multiple LO values and multiple LO stages.
 
 # imports
-import os, time, tarfile, shutil, json
+import os, time, tarfile, shutil, json, argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import calandigital as cd
+from dss_readout import read_caldata, read_sparse_caldata
+from dss_accumulation import start_clean_acc, average_accs
+from dss_sweep import sweep_tones, get_freq_setter
+from dss_journal import RunJournal, make_dir
+from dss_store import RawDataStore, get_meas_los
+from dss_writer import AsyncWriter, save_npz
+from dss_print_plots import print_run_data, save_figures
+from dss_report import make_run_report
+from dss_interp_complex import interp_complex
+from dss_instrument import CachedInstrument, wait_all
 from dss_multilo_parameters import *
 
 def main():
@@ -14,6 +24,7 @@ def main():
 
     make_pre_measurements_actions()
     make_dss_multilo_measurements()
+    turn_off_instruments()
     make_post_measurements_actions()
 
     print("Finished. Total time: " + str(int(time.time() - start_time)) + "[s]")
@@ -26,17 +37,21 @@ def make_pre_measurements_actions():
     - setting initial registers in FPGA
     - turning on generator power
     """
-    global roach, rf_generator, lo1_generator, lo2_generator, fig, lines
+    global roach, rf_generator, lo1_generator, lo2_generator, fig, lines, journal, \
+        store, writer
 
     roach = cd.initialize_roach(roach_ip)
-    lo1_generator = rm.open_resource(lo1_generator_name)
-    lo2_generator = rm.open_resource(lo2_generator_name)
-    rf_generator  = rm.open_resource(rf_generator_name)
+    lo1_generator = CachedInstrument(rm.open_resource(lo1_generator_name))
+    lo2_generator = CachedInstrument(rm.open_resource(lo2_generator_name))
+    rf_generator  = CachedInstrument(rm.open_resource(rf_generator_name))
 
     print("Setting up plotting and data saving elements...")
     if show_plots:
         fig, lines = create_figure()
     make_data_directory()
+    journal = RunJournal(cal_datadir, journal_name, journal_setup)
+    store = open_rawdata_store()
+    writer = AsyncWriter(write_queue_len)
     print("done")
 
     print("Setting accumulation register to " + str(acc_len) + "...")
@@ -48,14 +63,15 @@ def make_pre_measurements_actions():
     print("done")
     
     print("Setting instruments power and outputs...")
-    lo1_generator.write("power " + str(lo1_power))
-    lo1_generator.write("freq:mult " + str(lo1_mult))
-    lo2_generator.write("power " + str(lo2_power))
-    rf_generator.write("power " + str(rf_power))
-    rf_generator.write("freq:mult " + str(rf_mult))
-    lo1_generator.write("outp on")
-    lo2_generator.write("outp on")
-    rf_generator.write("outp on")
+    wait_all([
+        lo1_generator.write_async("power " + str(lo1_power)),
+        lo1_generator.write_async("freq:mult " + str(lo1_mult)),
+        lo2_generator.write_async("power " + str(lo2_power)),
+        rf_generator.write_async("power " + str(rf_power)),
+        rf_generator.write_async("freq:mult " + str(rf_mult)),
+        lo1_generator.write_async("outp on"),
+        lo2_generator.write_async("outp on"),
+        rf_generator.write_async("outp on")])
     print("done")
 
 def make_dss_multilo_measurements():
@@ -63,41 +79,43 @@ def make_dss_multilo_measurements():
     Makes the measurements for dss calibration with multiple LOs.
     :param datair: directory where to save the data.
     """
-    for lo1_freq in lo1_freqs:
-        # set lo1 frequency
-        lo1_generator.ask("freq " + str(lo1_freq) + " ghz; *opc?")
+    for lo1_freq, lo2_freq in lo_grid:
+        # print setting
+        print("Current LOs: LO1:" + str(lo1_freq) + "GHz," +
+                          " LO2:" + str(lo2_freq) + "GHz")
         
-        for lo2_freq in lo2_freqs:
-            # set lo2 frequency
-            lo2_generator.ask("freq " + str(lo2_freq) + "ghz; *opc?")
-
-            # print setting
-            print("Current LOs: LO1:" + str(lo1_freq) + "GHz," +
-                              " LO2:" + str(lo2_freq) + "GHz")
-            
-            # make measurement subdirectory
-            measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
-                                str(lo2_freq) + "ghz"
-            measdir = cal_datadir + "/" + measname
-            os.mkdir(measdir)
-            os.mkdir(measdir + "/rawdata_tone_usb")
-            os.mkdir(measdir + "/rawdata_tone_lsb")
-            
-            # compute rf frequencies
-            rf_freqs_usb = lo1_freq + lo2_freq + (if_freqs/1e3) # GHz
-            rf_freqs_lsb = lo1_freq - lo2_freq - (if_freqs/1e3) # GHz
-
-            # make measurement
-            make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb)
-
-    print_multilo_data()
-
-def make_post_measurements_actions():
+        # make measurement subdirectory
+        measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
+                            str(lo2_freq) + "ghz"
+        measdir = cal_datadir + "/" + measname
+        if journal.is_finished(measname):
+            print("Measurement already finished, skipping.")
+            continue
+        make_dir(measdir)
+        if save_rawdata:
+            make_dir(measdir + "/rawdata_tone_usb")
+            make_dir(measdir + "/rawdata_tone_lsb")
+        
+        # compute rf frequencies
+        rf_freqs_usb = lo1_freq + lo2_freq + (if_freqs/1e3) # GHz
+        rf_freqs_lsb = lo1_freq - lo2_freq - (if_freqs/1e3) # GHz
+
+        # set the LOs and the first tone of the sweep at the same time, the
+        # unchanged settings are not sent (see CachedInstrument)
+        settings = [
+            lo1_generator.ask_async("freq " + str(lo1_freq) + " ghz; *opc?"),
+            lo2_generator.ask_async("freq " + str(lo2_freq) + " ghz; *opc?"),
+            rf_generator.ask_async("freq " + str(rf_freqs_usb[test_channels[0]]) +
+                " ghz; *opc?")]
+        wait_all(settings)
+
+        # make measurement
+        make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb)
+        journal.set_finished(measname)
+
+def turn_off_instruments():
     """
-    Makes all the actions required after measurements:
-    - turn off sources
-    - compress data
-    - write calibration data name in file
+    Turn off the sources and close the instruments communication.
     """
     print("Turning off instruments...")
     #lo1_generator.write("freq:mult 1")
@@ -108,6 +126,26 @@ def make_post_measurements_actions():
     rm.close()
     print("done")
 
+def make_post_measurements_actions():
+    """
+    Makes all the actions required after measurements:
+    - print data of all LOs
+    - compress data
+    - write calibration data name in file
+    """
+    if print_plots == 'inline':
+        print("Printing data of all LOs...")
+        print_multilo_data()
+        print("done")
+    elif print_plots == 'post':
+        print("Printing data of all LOs and tones...")
+        print_run_data(cal_datadir)
+        print("done")
+    elif print_plots == 'report':
+        print("Making report of all LOs...")
+        make_run_report(cal_datadir)
+        print("done")
+
     print("Compressing data...")
     compress_data(cal_datadir)
     print("done")
@@ -160,7 +198,11 @@ def create_figure():
 def make_data_directory():
     """
     Make directory where to save all the calibration data.
+    If the directory already exists the run is resumed.
     """
+    if os.path.exists(cal_datadir):
+        print("Using existing data directory " + cal_datadir + "...")
+        return
     os.mkdir(cal_datadir)
 
     # make .json file with test info
@@ -172,6 +214,10 @@ def make_data_directory():
     testinfo["nchannels"]          = nchannels
     testinfo["acc len"]            = acc_len
     testinfo["chnl step"]          = chnl_step
+    testinfo["save rawdata"]       = save_rawdata
+    testinfo["n accs"]             = n_accs
+    testinfo["target err"]         = target_err
+    testinfo["settle tone"]        = settle_tone
     testinfo["lo1 generator name"] = lo1_generator_name
     testinfo["lo2 generator name"] = lo2_generator_name
     testinfo["lo1 freqs ghz"]      = str(lo1_freqs)
@@ -180,10 +226,26 @@ def make_data_directory():
     testinfo["lo2 power dbm"]      = lo2_power
     testinfo["rf generator name"]  = rf_generator_name
     testinfo["rf power dbm"]       = rf_power
+    testinfo["ab interp"]          = ab_interp
 
     with open(cal_datadir + "/testinfo.json", "w") as f:
         json.dump(testinfo, f, indent=4, sort_keys=True)
 
+    # create the raw data store here, before the parallel setups open it
+    if save_rawdata:
+        open_rawdata_store().close()
+
+def open_rawdata_store():
+    """
+    Open the store of the full spectra of the tones (see dss_store.py), or
+    create it in a new run.
+    :return: RawDataStore object, or None if save_rawdata is False.
+    """
+    if not save_rawdata:
+        return None
+    return RawDataStore(cal_datadir + "/rawdata", ["a2", "b2", "ab_re", "ab_im"],
+        lo1_freqs, lo2_freqs, test_channels, nchannels)
+
 def make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb):
     """
     Makes the measurements for dss calibration for a single set of LOs.
@@ -191,136 +253,221 @@ def make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb):
         (sub directory of main cal_datadir).
     :param rf_freqs_usb: rf frequencies to measure in usb (GHz).
     :param rf_freqs_lsb: rf frequencies to measure in lsb (GHz).
+    :return: dictionary with the calibration data, as saved in caldata.npz.
     """
     print("Starting tone sweep in upper sideband...")
     sweep_time = time.time()
-    a2_toneusb, b2_toneusb, ab_toneusb = get_caldata(measdir, rf_freqs_usb, "usb")
+    a2_toneusb, b2_toneusb, ab_toneusb, errs_toneusb = \
+        get_caldata(measdir, rf_freqs_usb, "usb")
     print("done (" +str(int(time.time() - sweep_time)) + "[s])")
         
     print("Starting tone sweep in lower sideband...")
     sweep_time = time.time()
-    a2_tonelsb, b2_tonelsb, ab_tonelsb = get_caldata(measdir, rf_freqs_lsb, "lsb")
+    a2_tonelsb, b2_tonelsb, ab_tonelsb, errs_tonelsb = \
+        get_caldata(measdir, rf_freqs_lsb, "lsb")
     print("done (" +str(int(time.time() - sweep_time)) + "[s])")
 
     print("Saving data...")
-    np.savez(measdir+"/caldata", 
+    caldata = dict(
         a2_toneusb=a2_toneusb, b2_toneusb=b2_toneusb, ab_toneusb=ab_toneusb,
-        a2_tonelsb=a2_tonelsb, b2_tonelsb=b2_tonelsb, ab_tonelsb=ab_tonelsb)
+        a2_tonelsb=a2_tonelsb, b2_tonelsb=b2_tonelsb, ab_tonelsb=ab_tonelsb,
+        mag_err_toneusb=errs_toneusb[0], ang_err_toneusb=errs_toneusb[1],
+        nacc_toneusb=errs_toneusb[2],
+        mag_err_tonelsb=errs_tonelsb[0], ang_err_tonelsb=errs_tonelsb[1],
+        nacc_tonelsb=errs_tonelsb[2])
+    writer.submit(save_npz, measdir+"/caldata", caldata)
+    if save_rawdata:
+        writer.submit(store.flush)
+    writer.flush() # all the data on disk before the LOs are set as finished
     print("done")
 
-    print("Printing data...")
-    print_singlelo_data(measdir)
-    print("done")
+    if print_plots == 'inline':
+        print("Printing data...")
+        print_singlelo_data(measdir)
+        print("done")
+
+    return caldata
 
 def get_caldata(measdir, rf_freqs, tone_sideband):
     """
     Sweep a tone through a sideband and get the calibration data.
     The calibration data is the power of each tone in both inputs (a and b)
     and the cross-correlation of both inputs as a complex number (ab*).
-    The full sprecta measured for each tone is saved to data for debugging
-    purposes.
+    If save_rawdata is True, the full sprecta measured for each tone is saved 
+    to data for debugging purposes. Otherwise only the test channel is read.
+    Up to n_accs accumulations are averaged for each tone (see average_accs),
+    and the standard error of the magnitude ratio and angle difference of 
+    the inputs is computed from the spread of the ab ratio between them.
     :param measdir: directory where to save the raw data.
     :param rf_freqs: frequencies of the tones to perform the sweep (GHz).
     :param tone_sideband: sideband of the injected test tone. Either USB or LSB
-    :return: calibration data: a2, b2, and ab.
+    :return: calibration data: a2, b2, and ab, and errors: standard error of
+        magnitude ratio (lineal) and angle difference (degrees), and number
+        of averaged accumulations at the test channels (nan if only one
+        accumulation was averaged).
     """
     a2_arr = []; b2_arr = []; ab_arr = []
-    for i, chnl in enumerate(test_channels):
+    mag_err_arr = []; ang_err_arr = []; nacc_arr = []
+
+    # get the tones already measured in a resumed run
+    sweepname  = os.path.basename(measdir) + "/" + tone_sideband
+    done_tones = journal.get_tones(sweepname)
+    lo1_freq, lo2_freq = get_meas_los(os.path.basename(measdir))
+    for chnl, values in done_tones:
+        a2, b2, ab_re, ab_im, mag_err, ang_err, nacc = values
+        a2_arr.append(a2); b2_arr.append(b2); ab_arr.append(ab_re + 1j*ab_im)
+        mag_err_arr.append(mag_err); ang_err_arr.append(ang_err)
+        nacc_arr.append(int(nacc))
+
+    def get_ratio(a2, b2, ab):
+        if tone_sideband=='usb':
+            return np.conj(ab) / a2 # (ab*)* /aa* = a*b / aa* = b/a
+        else: # tone_sideband=='lsb
+            return ab / b2 # ab* / bb* = a/b
+
+    sweep_chnls = test_channels[len(done_tones):]
+    set_freq = get_freq_setter(rf_generator, rf_freqs, sweep_chnls)
+
+    def set_tone(chnl):
         # set test tone
-        freq = rf_freqs[chnl]
-        rf_generator.ask("freq " + str(freq) + " ghz; *opc?")
-        time.sleep(pause_time)
-
-        # read data
-        a2    = cd.read_interleave_data(roach, bram_a2,    bram_addr_width, 
-                                        bram_word_width,   pow_data_type)
-        b2    = cd.read_interleave_data(roach, bram_b2,    bram_addr_width, 
-                                        bram_word_width,   pow_data_type)
-        ab_re = cd.read_interleave_data(roach, bram_ab_re, bram_addr_width, 
-                                        bram_word_width,   crosspow_data_type)
-        ab_im = cd.read_interleave_data(roach, bram_ab_im, bram_addr_width, 
-                                        bram_word_width,   crosspow_data_type)
+        set_freq(chnl)
+        return start_clean_acc(roach)
+
+    def read_tone(chnl, acc_start):
+        # read and average data
+        if save_rawdata:
+            read_acc = lambda: read_caldata(roach)
+            k = chnl # index of test channel in data
+        else:
+            read_acc = lambda: read_sparse_caldata(roach, [chnl])
+            k = 0
+        stats, ratio_stats = average_accs(roach, read_acc, acc_start,
+            lambda a2, b2, ab: get_ratio(a2[k], b2[k], ab[k]),
+            lambda a2, b2, ab: ab[k])
+
+        # standard error of the ratio split evenly between magnitude
+        # and angle
+        ratio_err = ratio_stats.std_err() / np.sqrt(2)
+        mag_err   = ratio_err
+        ang_err   = np.degrees(ratio_err / np.abs(ratio_stats.mean))
+        if ratio_stats.n < 2:
+            mag_err = ang_err = np.nan
+
+        a2, b2, ab = [stat.mean for stat in stats]
+        return a2, b2, ab, k, mag_err, ang_err, ratio_stats.n
+
+    def process_tone(i, chnl, data):
+        # index of the tone in the full sweep
+        i += len(done_tones)
+
+        # get test channel data
+        a2, b2, ab, k, mag_err, ang_err, nacc = data
+        a2_chnl = a2[k]; b2_chnl = b2[k]; ab_chnl = ab[k]
 
         # append data to arrays
-        a2_arr.append(a2[chnl])
-        b2_arr.append(b2[chnl])
-        ab_arr.append(ab_re[chnl] + 1j*ab_im[chnl])
-
-        # scale and dBFS data for plotting
-        a2_plot = cd.scale_and_dBFS_specdata(a2, acc_len, dBFS)
-        b2_plot = cd.scale_and_dBFS_specdata(b2, acc_len, dBFS)
+        a2_arr.append(a2_chnl)
+        b2_arr.append(b2_chnl)
+        ab_arr.append(ab_chnl)
+        mag_err_arr.append(mag_err)
+        ang_err_arr.append(ang_err)
+        nacc_arr.append(nacc)
+
+        # save data in the writer thread, the raw data first so that the 
+        # journal only has complete tones
+        if save_rawdata:
+            writer.submit(store.write, lo1_freq, lo2_freq, tone_sideband, chnl, 
+                dict(a2=a2, b2=b2, ab_re=ab.real, ab_im=ab.imag))
+        writer.submit(journal.add_tone, sweepname, chnl, 
+            [a2_chnl, b2_chnl, ab_chnl.real, ab_chnl.imag, mag_err, ang_err, nacc])
 
         # compute input ratios for plotting
-        if tone_sideband=='usb':
-            ab_ratios = np.divide(np.conj(ab_arr), a2_arr) # (ab*)* /aa* = a*b / aa* = b/a
-        else: # tone_sideband=='lsb
-            ab_ratios = np.divide(ab_arr, b2_arr) # ab* / bb* = a/b
+        ab_ratios = get_ratio(np.array(a2_arr), np.array(b2_arr), np.array(ab_arr))
 
         # plot data
         if show_plots:
-            lines[0].set_data(if_freqs, a2_plot)
-            lines[1].set_data(if_freqs, b2_plot)
+            # plot full spectra if available, otherwise only the test channels
+            if save_rawdata:
+                lines[0].set_data(if_freqs, 
+                    cd.scale_and_dBFS_specdata(a2, acc_len, dBFS))
+                lines[1].set_data(if_freqs, 
+                    cd.scale_and_dBFS_specdata(b2, acc_len, dBFS))
+            else:
+                lines[0].set_data(if_test_freqs[:i+1], 
+                    cd.scale_and_dBFS_specdata(np.array(a2_arr), acc_len, dBFS))
+                lines[1].set_data(if_test_freqs[:i+1], 
+                    cd.scale_and_dBFS_specdata(np.array(b2_arr), acc_len, dBFS))
             lines[2].set_data(if_test_freqs[:i+1], np.abs(ab_ratios))
             lines[3].set_data(if_test_freqs[:i+1], np.angle(ab_ratios, deg=True))
             fig.canvas.draw()
             fig.canvas.flush_events()
         
-        # save data
-        rawdata_dir = measdir+"/rawdata_tone_" + tone_sideband
-        np.savez(rawdata_dir + "/chnl_" + str(chnl), 
-            a2=a2, b2=b2, ab_re=ab_re, ab_im=ab_im)
+        if save_rawdata and print_plots == 'inline':
+            # print raw spectral data
+            print_spec_data(measdir + "/rawdata_tone_" + tone_sideband, chnl,
+                a2, b2)
 
-        # print raw spectral data
-        print_spec_data(rawdata_dir, chnl)
+    sweep_tones(sweep_chnls, set_tone, read_tone, process_tone)
 
     # compute interpolations
     a2_arr = np.interp(if_freqs, if_test_freqs, a2_arr)
     b2_arr = np.interp(if_freqs, if_test_freqs, b2_arr)
-    ab_arr = np.interp(if_freqs, if_test_freqs, ab_arr)
+    ab_arr = interp_complex(if_freqs, if_test_freqs, ab_arr, ab_interp)
 
-    return a2_arr, b2_arr, ab_arr
+    return a2_arr, b2_arr, ab_arr, [mag_err_arr, ang_err_arr, nacc_arr]
 
-def print_spec_data(rawdata_dir, chnl):
+def plot_spec_data(chnl, a2, b2):
     """
-    Print the saved data to .pdf images for an easy check.
-    :param rawdata_dir: directory where to read the data and print the plot.
+    Plot the spectra of a tone.
     :param chnl: channel where the tone is injected.
+    :param a2: a2 spectrum.
+    :param b2: b2 spectrum.
+    :return: list of (name, figure) tuples.
     """
-    # get data
-    specdata = np.load(rawdata_dir + "/chnl_" + str(chnl) + ".npz")
-    a2 = specdata['a2']
-    b2 = specdata['b2']
+    figs = []
 
     # compute power levels
     pow_a2 = cd.scale_and_dBFS_specdata(a2, acc_len, dBFS)
     pow_b2 = cd.scale_and_dBFS_specdata(b2, acc_len, dBFS)
 
     # plot spec usb
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_a2, 'b')
     plt.ylim((-85, 5))
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')     
-    plt.savefig(rawdata_dir+'/chnl_' + str(chnl) + '_a2.pdf')
-    plt.close()
+    figs.append(('chnl_' + str(chnl) + '_a2', fig))
 
     # plot spec lsb
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_b2, 'r')
     plt.ylim((-85, 5))
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')     
-    plt.savefig(rawdata_dir+'/chnl_' + str(chnl) + '_b2.pdf')
-    plt.close()
+    figs.append(('chnl_' + str(chnl) + '_b2', fig))
 
-def print_singlelo_data(measdir):
+    return figs
+
+def print_spec_data(rawdata_dir, chnl, a2, b2):
     """
-    Print the saved data to .pdf images for an easy check.
+    Print the spectra of a tone to .pdf images for an easy check.
+    :param rawdata_dir: directory where to print the plot.
+    :param chnl: channel where the tone is injected.
+    :param a2: a2 spectrum.
+    :param b2: b2 spectrum.
+    """
+    save_figures(plot_spec_data(chnl, a2, b2), rawdata_dir)
+
+def plot_singlelo_data(measdir):
+    """
+    Plot the saved data of a single measurement.
     :param measdir: directory where to read the data of single measurement
-    and save the image (sub directory of main cal_datadir).
+    (sub directory of main cal_datadir).
+    :return: list of (name, figure) tuples.
     """
+    figs = []
+
     # get data
     caldata = np.load(measdir + "/caldata.npz")
     a2_toneusb = caldata['a2_toneusb']; a2_tonelsb = caldata['a2_tonelsb']
@@ -342,63 +489,69 @@ def print_singlelo_data(measdir):
     srr_lsb = b2_tonelsb / a2_tonelsb
 
     # print power level signal
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_a2_toneusb, 'b', label="USB toneUSB")
     plt.plot(if_freqs, pow_b2_tonelsb, 'r', label="LSB toneLSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')
     plt.legend()
-    plt.savefig(measdir+'/power_lev_sig.pdf')
-    plt.close()
+    figs.append(('power_lev_sig', fig))
     
     # print power level image
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_a2_tonelsb, 'b', label="USB toneLSB")
     plt.plot(if_freqs, pow_b2_toneusb, 'r', label="LSB toneUSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')
     plt.legend()
-    plt.savefig(measdir+'/power_lev_img.pdf')
-    plt.close()
+    figs.append(('power_lev_img', fig))
     
     # print magnitude ratios
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, np.abs(ab_ratios_usb), 'b', label="USB")
     plt.plot(if_freqs, np.abs(ab_ratios_lsb), 'r', label="LSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Mag ratio [lineal]')     
     plt.legend()
-    plt.savefig(measdir+'/mag_ratios.pdf')
-    plt.close()
+    figs.append(('mag_ratios', fig))
     
     # print angle difference
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, np.angle(ab_ratios_usb, deg=True), 'b', label="USB")
     plt.plot(if_freqs, np.angle(ab_ratios_lsb, deg=True), 'r', label="LSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Angle diff [degrees]')     
     plt.legend()
-    plt.savefig(measdir+'/angle_diff.pdf')
-    plt.close()
+    figs.append(('angle_diff', fig))
 
     # print srr analog
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, 10*np.log10(srr_usb), 'b', label="USB")
     plt.plot(if_freqs, 10*np.log10(srr_lsb), 'r', label="LSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('SRR [dB]')     
     plt.legend()
-    plt.savefig(measdir+'/srr_analog.pdf')
-    plt.close()
+    figs.append(('srr_analog', fig))
 
-def print_multilo_data():
+    return figs
+
+def print_singlelo_data(measdir):
     """
-    Print the saved data from all LO settings to .pdf image.
+    Print the saved data to .pdf images for an easy check.
+    :param measdir: directory where to read the data of single measurement
+    and save the image (sub directory of main cal_datadir).
+    """
+    save_figures(plot_singlelo_data(measdir), measdir)
+
+def plot_multilo_data():
+    """
+    Plot the saved data from all LO settings.
+    :return: list of (name, figure) tuples.
     """
     # create power level signal figure 
     fig1, ax1 = plt.subplots(1,1)
@@ -487,12 +640,17 @@ def print_multilo_data():
             plt.plot(rf_freqs_usb, 10*np.log10(srr_usb), color=color)
             plt.plot(rf_freqs_lsb, 10*np.log10(srr_lsb), color=color)
 
-    # print figures
-    fig1.savefig(cal_datadir+'/power_lev_sig.pdf')
-    fig2.savefig(cal_datadir+'/power_lev_img.pdf')
-    fig3.savefig(cal_datadir+'/mag_ratios.pdf')
-    fig4.savefig(cal_datadir+'/angle_diff.pdf')
-    fig5.savefig(cal_datadir+'/srr_analog.pdf')
+    return [('power_lev_sig', fig1),
+            ('power_lev_img', fig2),
+            ('mag_ratios', fig3),
+            ('angle_diff', fig4),
+            ('srr_analog', fig5)]
+
+def print_multilo_data():
+    """
+    Print the saved data from all LO settings to .pdf image.
+    """
+    save_figures(plot_multilo_data(), cal_datadir)
 
 def compress_data(datadir):
     """
@@ -507,4 +665,13 @@ def compress_data(datadir):
     shutil.rmtree(datadir)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Tone calibration of the digital sideband separating receiver with \
+            multiple LOs.")
+    parser.add_argument("-r", "--resume", dest="resume", default=None,
+        help="Data directory of an interrupted run to resume. The finished \
+            LO settings and tones are skipped.")
+    args = parser.parse_args()
+    if args.resume is not None:
+        cal_datadir = args.resume.rstrip("/")
     main()
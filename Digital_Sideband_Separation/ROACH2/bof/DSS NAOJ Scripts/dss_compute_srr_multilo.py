@@ -3,11 +3,21 @@
 # multiple LO values and multiple LO stages.
 
 # imports
-import os, time, tarfile, shutil, json
+import os, time, tarfile, shutil, json, argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import calandigital as cd
 from dss_load_constants import dss_load_constants
+from dss_interpolation import ConstantsModel
+from dss_readout import read_srrdata, read_sparse_srrdata
+from dss_accumulation import start_clean_acc, wait_new_acc, wait_tone_settled
+from dss_sweep import sweep_tones, get_freq_setter
+from dss_journal import RunJournal, make_dir
+from dss_store import RawDataStore, get_meas_los
+from dss_writer import AsyncWriter, save_npz
+from dss_print_plots import print_run_data, save_figures
+from dss_report import make_run_report
+from dss_instrument import CachedInstrument, wait_all
 from dss_multilo_parameters import *
 
 def main():
@@ -15,6 +25,7 @@ def main():
 
     make_pre_measurements_actions()
     make_dss_multilo_measurements()
+    turn_off_instruments()
     make_post_measurements_actions()
 
     print("Finished. Total time: " + str(int(time.time() - start_time)) + "[s]")
@@ -28,22 +39,31 @@ def make_pre_measurements_actions():
     - setting initial registers in FPGA
     - turning on generator power
     """
-    global roach, rf_generator, lo1_generator, lo2_generator, caldir, fig, lines
+    global roach, rf_generator, lo1_generator, lo2_generator, caldir, fig, lines, \
+        journal, consts_model, store, writer
 
     roach = cd.initialize_roach(roach_ip)
-    lo1_generator = rm.open_resource(lo1_generator_name)
-    lo2_generator = rm.open_resource(lo2_generator_name)
-    rf_generator  = rm.open_resource(rf_generator_name)
+    lo1_generator = CachedInstrument(rm.open_resource(lo1_generator_name))
+    lo2_generator = CachedInstrument(rm.open_resource(lo2_generator_name))
+    rf_generator  = CachedInstrument(rm.open_resource(rf_generator_name))
 
-    print("Extracting compressed calibration data...")
     caldir = caltar[:-7]
-    tarfile.open(caltar).extractall(path=caldir)
-    print("done.")
+    if not os.path.exists(caldir): # may be already extracted in parallel runs
+        print("Extracting compressed calibration data...")
+        tarfile.open(caltar).extractall(path=caldir)
+        print("done.")
+    if load_consts and interp_consts:
+        print("Building constants model of the calibrated LOs...")
+        consts_model = ConstantsModel(caldir)
+        print("done.")
 
     print("Setting up plotting and data saving elements...")
     if show_plots:
         fig, lines = create_figure()
     make_data_directory()
+    journal = RunJournal(srr_datadir, journal_name, journal_setup)
+    store = open_rawdata_store()
+    writer = AsyncWriter(write_queue_len)
     print("done")
 
     print("Setting accumulation register to " + str(acc_len) + "...")
@@ -55,62 +75,68 @@ def make_pre_measurements_actions():
     print("done")
 
     print("Setting instruments power and outputs...")
-    lo1_generator.write("power " + str(lo1_power))
-    lo1_generator.write("freq:mult " + str(lo1_mult))
-    lo2_generator.write("power " + str(lo2_power))
-    rf_generator.write("power " + str(rf_power))
-    rf_generator.write("freq:mult " + str(rf_mult))
-    lo1_generator.write("outp on")
-    lo2_generator.write("outp on")
-    rf_generator.write("outp on")
+    wait_all([
+        lo1_generator.write_async("power " + str(lo1_power)),
+        lo1_generator.write_async("freq:mult " + str(lo1_mult)),
+        lo2_generator.write_async("power " + str(lo2_power)),
+        rf_generator.write_async("power " + str(rf_power)),
+        rf_generator.write_async("freq:mult " + str(rf_mult)),
+        lo1_generator.write_async("outp on"),
+        lo2_generator.write_async("outp on"),
+        rf_generator.write_async("outp on")])
     print("done")
 
 def make_dss_multilo_measurements():
     """
     Makes the measurements for srr computation with multiple LOs.
     """
-    for lo1_freq in lo1_freqs:
-        # set lo1 frequency
-        lo1_generator.ask("freq " + str(lo1_freq) + " ghz; *opc?")
+    for lo1_freq, lo2_freq in lo_grid:
+        # print setting
+        print("Current LOs: LO1:" + str(lo1_freq) + "GHz," +
+                          " LO2:" + str(lo2_freq) + "GHz")
         
-        for lo2_freq in lo2_freqs:
-            # set lo2 frequency
-            lo2_generator.ask("freq " + str(lo2_freq) + " ghz; *opc?")
-
-            # print setting
-            print("Current LOs: LO1:" + str(lo1_freq) + "GHz," +
-                              " LO2:" + str(lo2_freq) + "GHz")
-            
-            # make measurement subdirectory
-            measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
-                                str(lo2_freq) + "ghz"
-            measdir = srr_datadir + "/" + measname
-            os.mkdir(measdir)
-            os.mkdir(measdir + "/rawdata_tone_usb")
-            os.mkdir(measdir + "/rawdata_tone_lsb")
-            
-            # compute rf frequencies
-            rf_freqs_usb = lo1_freq + lo2_freq + (if_freqs/1e3) # GHz
-            rf_freqs_lsb = lo1_freq - lo2_freq - (if_freqs/1e3) # GHz
-
-            # loading calibration constants
-            if load_consts:
-                print("Loading constants..."); load_time = time.time()
+        # make measurement subdirectory
+        measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
+                            str(lo2_freq) + "ghz"
+        measdir = srr_datadir + "/" + measname
+        if journal.is_finished(measname):
+            print("Measurement already finished, skipping.")
+            continue
+        make_dir(measdir)
+        if save_rawdata:
+            make_dir(measdir + "/rawdata_tone_usb")
+            make_dir(measdir + "/rawdata_tone_lsb")
+        
+        # compute rf frequencies
+        rf_freqs_usb = lo1_freq + lo2_freq + (if_freqs/1e3) # GHz
+        rf_freqs_lsb = lo1_freq - lo2_freq - (if_freqs/1e3) # GHz
+
+        # set the LOs and the first tone of the sweep at the same time, the
+        # unchanged settings are not sent (see CachedInstrument)
+        settings = [
+            lo1_generator.ask_async("freq " + str(lo1_freq) + " ghz; *opc?"),
+            lo2_generator.ask_async("freq " + str(lo2_freq) + " ghz; *opc?"),
+            rf_generator.ask_async("freq " + str(rf_freqs_usb[test_channels[0]]) +
+                " ghz; *opc?")]
+
+        # loading calibration constants (while the instruments settle)
+        if load_consts:
+            print("Loading constants..."); load_time = time.time()
+            if interp_consts:
+                consts_model.load_constants(roach, lo1_freq, lo2_freq)
+            else:
                 dss_load_constants(roach, caldir + "/" + measname)
-                print("done")
+            print("done")
 
-            # make measurement
-            make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb)
+        wait_all(settings)
 
-    print_multilo_data()
+        # make measurement
+        make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb)
+        journal.set_finished(measname)
 
-def make_post_measurements_actions():
+def turn_off_instruments():
     """
-    Makes all the actions required after measurements:
-    - turn off sources
-    - compress data
-    - remove calibration data
-    - write srr data name in file
+    Turn off the sources and close the instruments communication.
     """
     print("Turning off instruments...")
     #lo1_generator.write("freq:mult 1")
@@ -121,6 +147,27 @@ def make_post_measurements_actions():
     rm.close()
     print("done")
 
+def make_post_measurements_actions():
+    """
+    Makes all the actions required after measurements:
+    - print data of all LOs
+    - compress data
+    - remove calibration data
+    - write srr data name in file
+    """
+    if print_plots == 'inline':
+        print("Printing data of all LOs...")
+        print_multilo_data()
+        print("done")
+    elif print_plots == 'post':
+        print("Printing data of all LOs and tones...")
+        print_run_data(srr_datadir)
+        print("done")
+    elif print_plots == 'report':
+        print("Making report of all LOs...")
+        make_run_report(srr_datadir)
+        print("done")
+
     print("Compressing data...")
     compress_data(srr_datadir)
     print("done")
@@ -171,7 +218,11 @@ def create_figure():
 def make_data_directory():
     """
     Make directory where to save all the srr data.
+    If the directory already exists the run is resumed.
     """
+    if os.path.exists(srr_datadir):
+        print("Using existing data directory " + srr_datadir + "...")
+        return
     os.mkdir(srr_datadir)
 
     # make .json file with test info
@@ -183,6 +234,8 @@ def make_data_directory():
     testinfo["nchannels"]          = nchannels
     testinfo["acc len"]            = acc_len
     testinfo["chnl step"]          = chnl_step
+    testinfo["save rawdata"]       = save_rawdata
+    testinfo["settle tone"]        = settle_tone
     testinfo["lo1 generator name"] = lo1_generator_name
     testinfo["lo2 generator name"] = lo2_generator_name
     testinfo["lo1 freqs ghz"]      = str(lo1_freqs)
@@ -192,11 +245,27 @@ def make_data_directory():
     testinfo["rf generator name"]  = rf_generator_name
     testinfo["rf power dbm"]       = rf_power
     testinfo["load consts"]        = load_consts
+    testinfo["interp consts"]      = interp_consts
     testinfo["caltar"]             = caltar
 
     with open(srr_datadir + "/testinfo.json", "w") as f:
         json.dump(testinfo, f, indent=4, sort_keys=True)
 
+    # create the raw data store here, before the parallel setups open it
+    if save_rawdata:
+        open_rawdata_store().close()
+
+def open_rawdata_store():
+    """
+    Open the store of the full spectra of the tones (see dss_store.py), or
+    create it in a new run.
+    :return: RawDataStore object, or None if save_rawdata is False.
+    """
+    if not save_rawdata:
+        return None
+    return RawDataStore(srr_datadir + "/rawdata", ["usb", "lsb"], lo1_freqs,
+        lo2_freqs, test_channels, nchannels)
+
 def make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb):
     """
     Makes the measurements for srr computation for a single set of LOs.
@@ -216,47 +285,84 @@ def make_dss_measurements(measdir, rf_freqs_usb, rf_freqs_lsb):
     print("done (" +str(int(time.time() - sweep_time)) + "[s])")
 
     print("Saving data...")
-    np.savez(measdir+"/srrdata",
+    writer.submit(save_npz, measdir+"/srrdata", dict(
         usb_toneusb=usb_toneusb, lsb_toneusb=lsb_toneusb,
-        usb_tonelsb=usb_tonelsb, lsb_tonelsb=lsb_tonelsb)
+        usb_tonelsb=usb_tonelsb, lsb_tonelsb=lsb_tonelsb))
+    if save_rawdata:
+        writer.submit(store.flush)
+    writer.flush() # all the data on disk before the LOs are set as finished
     print("done")
 
-    print("Printing data...")
-    print_singlelo_data(measdir)
-    print("done")
+    if print_plots == 'inline':
+        print("Printing data...")
+        print_singlelo_data(measdir)
+        print("done")
 
 def get_srrdata(measdir, rf_freqs, tone_sideband):
     """
     Sweep a tone through a sideband and get the srr data.
     The srr data is the power of each tone after applying the calibration
     constants for each sideband (usb and lsb).
-    The full sprecta measured for each tone is saved to data for debugging
-    purposes.
+    If save_rawdata is True, the full sprecta measured for each tone is saved 
+    to data for debugging purposes. Otherwise only the test channel is read.
     :param measdir: directory where to save the raw data.
     :param rf_freqs: frequencies of the tones to perform the sweep.
     :param tone_sideband: sideband of the injected test tone. Either USB or LSB
     :return: srr data: usb and lsb.
     """
     usb_arr = []; lsb_arr = []
-    for i, chnl in enumerate(test_channels):
+
+    # get the tones already measured in a resumed run
+    sweepname  = os.path.basename(measdir) + "/" + tone_sideband
+    done_tones = journal.get_tones(sweepname)
+    lo1_freq, lo2_freq = get_meas_los(os.path.basename(measdir))
+    for chnl, values in done_tones:
+        usb_arr.append(values[0]); lsb_arr.append(values[1])
+
+    sweep_chnls = test_channels[len(done_tones):]
+    set_freq = get_freq_setter(rf_generator, rf_freqs, sweep_chnls)
+
+    def set_tone(chnl):
         # set test tone
-        freq = rf_freqs[chnl]
-        rf_generator.ask("freq " + str(freq) + " ghz; *opc?") 
-        time.sleep(pause_time)
+        set_freq(chnl) 
+        return start_clean_acc(roach)
 
+    def read_tone(chnl, acc_start):
         # read data
-        usb = cd.read_interleave_data(roach, bram_usb, bram_addr_width, 
-                                      bram_word_width, pow_data_type)
-        lsb = cd.read_interleave_data(roach, bram_lsb, bram_addr_width, 
-                                      bram_word_width, pow_data_type)
+        if save_rawdata:
+            read_acc = lambda: read_srrdata(roach)
+            k = chnl # index of test channel in data
+        else:
+            read_acc = lambda: read_sparse_srrdata(roach, [chnl])
+            k = 0
+        if settle_tone:
+            get_tone = lambda usb, lsb: usb[k] if tone_sideband=='usb' else lsb[k]
+            return wait_tone_settled(roach, read_acc, acc_start, get_tone)[1]
+        wait_new_acc(roach, *acc_start)
+        return read_acc()
+
+    def process_tone(i, chnl, data):
+        # index of the tone in the full sweep
+        i += len(done_tones)
+
+        # get test channel data
+        usb, lsb = data
+        if save_rawdata:
+            usb_chnl = usb[chnl]; lsb_chnl = lsb[chnl]
+        else:
+            usb_chnl = usb[0];    lsb_chnl = lsb[0]
 
         # append data to arrays
-        usb_arr.append(usb[chnl])
-        lsb_arr.append(lsb[chnl])
+        usb_arr.append(usb_chnl)
+        lsb_arr.append(lsb_chnl)
 
-        # scale and dBFS data for plotting
-        usb_plot = cd.scale_and_dBFS_specdata(usb, acc_len, dBFS)
-        lsb_plot = cd.scale_and_dBFS_specdata(lsb, acc_len, dBFS)
+        # save data in the writer thread, the raw data first so that the 
+        # journal only has complete tones (copied, as the arrays are 
+        # overwritten by the next read)
+        if save_rawdata:
+            writer.submit(store.write, lo1_freq, lo2_freq, tone_sideband, chnl, 
+                dict(usb=np.copy(usb), lsb=np.copy(lsb)))
+        writer.submit(journal.add_tone, sweepname, chnl, [usb_chnl, lsb_chnl])
 
         # compute srr for plotting
         if tone_sideband=='usb':
@@ -268,20 +374,27 @@ def get_srrdata(measdir, rf_freqs, tone_sideband):
             # define sb plot line
             line_sb = lines[2] if tone_sideband=='usb' else lines[3]
 
-        # plot data
-            lines[0].set_data(if_freqs, usb_plot)
-            lines[1].set_data(if_freqs, lsb_plot)
+            # plot full spectra if available, otherwise only the test channels
+            if save_rawdata:
+                lines[0].set_data(if_freqs, 
+                    cd.scale_and_dBFS_specdata(usb, acc_len, dBFS))
+                lines[1].set_data(if_freqs, 
+                    cd.scale_and_dBFS_specdata(lsb, acc_len, dBFS))
+            else:
+                lines[0].set_data(if_test_freqs[:i+1], 
+                    cd.scale_and_dBFS_specdata(np.array(usb_arr), acc_len, dBFS))
+                lines[1].set_data(if_test_freqs[:i+1], 
+                    cd.scale_and_dBFS_specdata(np.array(lsb_arr), acc_len, dBFS))
             line_sb.set_data(if_test_freqs[:i+1], 10*np.log10(srr))
             fig.canvas.draw()
             fig.canvas.flush_events()
         
-        # save data
-        rawdata_dir = measdir+"/rawdata_tone_" + tone_sideband
-        np.savez(rawdata_dir + "/chnl_" + str(chnl), 
-            usb=usb, lsb=lsb)
+        if save_rawdata and print_plots == 'inline':
+            # print raw spectral data
+            print_spec_data(measdir + "/rawdata_tone_" + tone_sideband, chnl,
+                usb, lsb)
 
-        # print raw spectral data
-        print_spec_data(rawdata_dir, chnl)
+    sweep_tones(sweep_chnls, set_tone, read_tone, process_tone)
 
     # compute interpolations
     usb_arr = np.interp(if_freqs, if_test_freqs, usb_arr)
@@ -289,47 +402,59 @@ def get_srrdata(measdir, rf_freqs, tone_sideband):
 
     return usb_arr, lsb_arr
 
-def print_spec_data(rawdata_dir, chnl):
+def plot_spec_data(chnl, usb, lsb):
     """
-    Print the saved data to .pdf images for an easy check.
-    :param rawdata_dir: directory where to read the data and print the plot.
+    Plot the spectra of a tone.
     :param chnl: channel where the tone is injected.
+    :param usb: usb spectrum.
+    :param lsb: lsb spectrum.
+    :return: list of (name, figure) tuples.
     """
-    # get data
-    specdata = np.load(rawdata_dir + "/chnl_" + str(chnl) + ".npz")
-    usb = specdata['usb']
-    lsb = specdata['lsb']
+    figs = []
 
     # compute power levels
     pow_usb = cd.scale_and_dBFS_specdata(usb, acc_len, dBFS)
     pow_lsb = cd.scale_and_dBFS_specdata(lsb, acc_len, dBFS)
 
     # plot spec usb
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_usb, 'b')
     plt.ylim((-85, 5))
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')     
-    plt.savefig(rawdata_dir+'/chnl_' + str(chnl) + '_usb.pdf')
-    plt.close()
+    figs.append(('chnl_' + str(chnl) + '_usb', fig))
 
     # plot spec lsb
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_lsb, 'r')
     plt.ylim((-85, 5))
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')     
-    plt.savefig(rawdata_dir+'/chnl_' + str(chnl) + '_lsb.pdf')
-    plt.close()
+    figs.append(('chnl_' + str(chnl) + '_lsb', fig))
 
-def print_singlelo_data(measdir):
+    return figs
+
+def print_spec_data(rawdata_dir, chnl, usb, lsb):
     """
-    Print the saved data to .pdf images for an easy check.
+    Print the spectra of a tone to .pdf images for an easy check.
+    :param rawdata_dir: directory where to print the plot.
+    :param chnl: channel where the tone is injected.
+    :param usb: usb spectrum.
+    :param lsb: lsb spectrum.
+    """
+    save_figures(plot_spec_data(chnl, usb, lsb), rawdata_dir)
+
+def plot_singlelo_data(measdir):
+    """
+    Plot the saved data of a single measurement.
     :param measdir: directory where to read the data of single measurement
-    and save the image (sub directory of main srr_datadir).
+    (sub directory of main srr_datadir).
+    :return: list of (name, figure) tuples.
     """
+    figs = []
+
     # get data
     srrdata = np.load(measdir + "/srrdata.npz")
     usb_toneusb = srrdata['usb_toneusb']; lsb_toneusb = srrdata['lsb_toneusb']
@@ -346,41 +471,49 @@ def print_singlelo_data(measdir):
     srr_lsb = lsb_tonelsb / usb_tonelsb
 
     # plot power level signal
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_usb_toneusb, 'b', label="USB toneUSB")
     plt.plot(if_freqs, pow_lsb_tonelsb, 'r', label="LSB toneLSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')     
     plt.legend()
-    plt.savefig(measdir+'/power_lev_sig.pdf')
-    plt.close()
+    figs.append(('power_lev_sig', fig))
 
     # plot power level image
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_usb_tonelsb, 'b', label="USB toneLSB")
     plt.plot(if_freqs, pow_lsb_toneusb, 'r', label="LSB toneUSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')     
     plt.legend()
-    plt.savefig(measdir+'/power_lev_img.pdf')
-    plt.close()
+    figs.append(('power_lev_img', fig))
             
     # print SRR
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, 10*np.log10(srr_usb), 'b', label="USB")
     plt.plot(if_freqs, 10*np.log10(srr_lsb), 'r', label="LSB")
     plt.grid()                 
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('SRR [dB]')     
     plt.legend()
-    plt.savefig(measdir+'/srr.pdf')
-    plt.close()
-    
-def print_multilo_data():
+    figs.append(('srr', fig))
+
+    return figs
+
+def print_singlelo_data(measdir):
     """
-    Print the saved data from all LO settings to .pdf image.
+    Print the saved data to .pdf images for an easy check.
+    :param measdir: directory where to read the data of single measurement
+    and save the image (sub directory of main srr_datadir).
+    """
+    save_figures(plot_singlelo_data(measdir), measdir)
+
+def plot_multilo_data():
+    """
+    Plot the saved data from all LO settings.
+    :return: list of (name, figure) tuples.
     """
     # create power level signal figure
     fig1, ax1 = plt.subplots(1,1)
@@ -443,10 +576,15 @@ def print_multilo_data():
             ax3.plot(rf_freqs_usb, 10*np.log10(srr_usb), color=color)
             ax3.plot(rf_freqs_lsb, 10*np.log10(srr_lsb), color=color)
             
-    # print figures
-    fig1.savefig(srr_datadir+'/power_lev_sig.pdf')
-    fig2.savefig(srr_datadir+'/power_lev_img.pdf')
-    fig3.savefig(srr_datadir+'/srr_digital.pdf')
+    return [('power_lev_sig', fig1),
+            ('power_lev_img', fig2),
+            ('srr_digital', fig3)]
+
+def print_multilo_data():
+    """
+    Print the saved data from all LO settings to .pdf image.
+    """
+    save_figures(plot_multilo_data(), srr_datadir)
 
 def compress_data(datadir):
     """
@@ -461,4 +599,13 @@ def compress_data(datadir):
     shutil.rmtree(datadir)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="SRR computation of the digital sideband separating receiver with \
+            multiple LOs.")
+    parser.add_argument("-r", "--resume", dest="resume", default=None,
+        help="Data directory of an interrupted run to resume. The finished \
+            LO settings and tones are skipped.")
+    args = parser.parse_args()
+    if args.resume is not None:
+        srr_datadir = args.resume.rstrip("/")
     main()
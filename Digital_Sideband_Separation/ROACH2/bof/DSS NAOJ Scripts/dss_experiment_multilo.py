@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# Script for calibration and SRR computation of digital sideband separating
+# receiver with multiple LO values and multiple LO stages, in a single pass.
+# For every LO setting the tone calibration is made, the constants are
+# computed and loaded from the data in memory, and the SRR is measured right
+# away, so every LO setting is tuned only once and no calibration tarball is
+# needed. The calibration and SRR data are saved in the cal and srr
+# subdirectories of exp_datadir (same layout as dss_calibrate_multilo.py and
+# dss_compute_srr_multilo.py), compressed into a single file.
+
+# imports
+import time, argparse
+import numpy as np
+import dss_calibrate_multilo as cal
+import dss_compute_srr_multilo as srr
+from dss_load_constants import load_caldata_constants
+from dss_journal import RunJournal, make_dir
+from dss_instrument import wait_all
+from dss_print_plots import print_run_data
+from dss_report import make_run_report
+from dss_multilo_parameters import *
+
+def main():
+    start_time = time.time()
+
+    make_pre_measurements_actions()
+    make_dss_multilo_measurements()
+    cal.turn_off_instruments()
+    make_post_measurements_actions()
+
+    print("Finished. Total time: " + str(int(time.time() - start_time)) + "[s]")
+
+def make_pre_measurements_actions():
+    """
+    Makes all the actions in preparation for the measurements:
+    - make the experiment data directory
+    - initialize ROACH and instruments, and set the calibration registers
+      (done by the calibration script)
+    - share ROACH and instruments with the srr script, and set the
+      synthesis registers
+    """
+    make_dir(exp_datadir)
+    cal.cal_datadir = exp_datadir + "/cal"
+    srr.srr_datadir = exp_datadir + "/srr"
+    srr.caltar      = cal.cal_datadir # calibration used, saved in testinfo
+
+    cal.make_pre_measurements_actions()
+
+    srr.roach         = cal.roach
+    srr.lo1_generator = cal.lo1_generator
+    srr.lo2_generator = cal.lo2_generator
+    srr.rf_generator  = cal.rf_generator
+
+    print("Setting up srr plotting and data saving elements...")
+    if show_plots:
+        srr.fig, srr.lines = srr.create_figure()
+    srr.make_data_directory()
+    srr.journal = RunJournal(srr.srr_datadir, journal_name, journal_setup)
+    srr.store   = srr.open_rawdata_store()
+    srr.writer  = cal.writer
+    print("done")
+
+    print("Setting synthesis accumulation register to " + str(acc_len) + "...")
+    cal.roach.write_int(syn_acc_len_reg, acc_len)
+    print("done")
+
+def make_dss_multilo_measurements():
+    """
+    Makes the calibration and srr measurements with multiple LOs.
+    """
+    for lo1_freq, lo2_freq in lo_grid:
+        # print setting
+        print("Current LOs: LO1:" + str(lo1_freq) + "GHz," +
+                          " LO2:" + str(lo2_freq) + "GHz")
+
+        measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
+                            str(lo2_freq) + "ghz"
+        if srr.journal.is_finished(measname):
+            print("Measurement already finished, skipping.")
+            continue
+
+        # compute rf frequencies
+        rf_freqs_usb = lo1_freq + lo2_freq + (if_freqs/1e3) # GHz
+        rf_freqs_lsb = lo1_freq - lo2_freq - (if_freqs/1e3) # GHz
+
+        # set the LOs and the first tone of the sweep at the same time, the
+        # unchanged settings are not sent (see CachedInstrument)
+        wait_all([
+            cal.lo1_generator.ask_async("freq " + str(lo1_freq) + " ghz; *opc?"),
+            cal.lo2_generator.ask_async("freq " + str(lo2_freq) + " ghz; *opc?"),
+            cal.rf_generator.ask_async("freq " + 
+                str(rf_freqs_usb[test_channels[0]]) + " ghz; *opc?")])
+
+        # calibration
+        caldir = cal.cal_datadir + "/" + measname
+        if cal.journal.is_finished(measname):
+            caldata = np.load(caldir + "/caldata.npz")
+        else:
+            make_measurement_dir(caldir)
+            caldata = cal.make_dss_measurements(caldir, rf_freqs_usb,
+                rf_freqs_lsb)
+            cal.journal.set_finished(measname)
+
+        # loading calibration constants
+        if load_consts:
+            print("Loading constants...")
+            load_caldata_constants(cal.roach, caldata)
+            print("done")
+
+        # srr
+        srrdir = srr.srr_datadir + "/" + measname
+        make_measurement_dir(srrdir)
+        srr.make_dss_measurements(srrdir, rf_freqs_usb, rf_freqs_lsb)
+        srr.journal.set_finished(measname)
+
+def make_measurement_dir(measdir):
+    """
+    Make the directory of a single LO measurement.
+    :param measdir: measurement directory.
+    """
+    make_dir(measdir)
+    if save_rawdata:
+        make_dir(measdir + "/rawdata_tone_usb")
+        make_dir(measdir + "/rawdata_tone_lsb")
+
+def make_post_measurements_actions():
+    """
+    Makes all the actions required after measurements:
+    - print calibration and srr data of all LOs
+    - compress data
+    - write experiment data name in file
+    """
+    if print_plots == 'inline':
+        print("Printing data of all LOs...")
+        cal.print_multilo_data()
+        srr.print_multilo_data()
+        print("done")
+    elif print_plots == 'post':
+        print("Printing data of all LOs and tones...")
+        print_run_data(cal.cal_datadir)
+        print_run_data(srr.srr_datadir)
+        print("done")
+    elif print_plots == 'report':
+        print("Making reports of all LOs...")
+        make_run_report(cal.cal_datadir)
+        make_run_report(srr.srr_datadir)
+        print("done")
+
+    print("Compressing data...")
+    cal.compress_data(exp_datadir)
+    print("done")
+
+    # Write file to save last experiment directory
+    f = open("last_exptar.txt", "w")
+    f.write(exp_datadir+".tar.gz")
+    f.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Calibration and SRR computation of the digital sideband \
+            separating receiver with multiple LOs, in a single pass.")
+    parser.add_argument("-r", "--resume", dest="resume", default=None,
+        help="Data directory of an interrupted run to resume. The finished \
+            LO settings and tones are skipped.")
+    args = parser.parse_args()
+    if args.resume is not None:
+        exp_datadir = args.resume.rstrip("/")
+    main()
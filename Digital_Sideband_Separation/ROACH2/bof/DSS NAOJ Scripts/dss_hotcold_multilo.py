@@ -5,10 +5,15 @@
 # http://legacy.nrao.edu/alma/memos/html-memos/alma357/memo357.pdf
 
 # imports
-import os, time, tarfile, shutil, json
+import os, time, tarfile, shutil, json, argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import calandigital as cd
+from dss_readout import read_interleave_brams
+from dss_journal import RunJournal, make_dir
+from dss_instrument import CachedInstrument, wait_all
+from dss_print_plots import print_run_data, save_figures
+from dss_report import make_run_report
 from dss_multilo_parameters import *
 
 def main():
@@ -16,6 +21,7 @@ def main():
 
     make_pre_measurements_actions()
     make_dss_multilo_measurements()
+    turn_off_instruments()
     make_post_measurements_actions()
 
     print("Finished. Total time: " + str(int(time.time() - start_time)) + "[s]")
@@ -28,17 +34,18 @@ def make_pre_measurements_actions():
     - setting initial registers in FPGA
     - turning on generator power
     """
-    global roach, lo1_generator, lo2_generator, chopper, fig, lines
+    global roach, lo1_generator, lo2_generator, chopper, fig, lines, journal
 
     roach = cd.initialize_roach(roach_ip)
-    lo1_generator = rm.open_resource(lo1_generator_name)
-    lo2_generator = rm.open_resource(lo2_generator_name)
+    lo1_generator = CachedInstrument(rm.open_resource(lo1_generator_name))
+    lo2_generator = CachedInstrument(rm.open_resource(lo2_generator_name))
     chopper       = rm.open_resource(chopper_name)
 
     print("Setting up plotting and data saving elements...")
     if show_plots:
         fig, lines = create_figure()
     make_data_directory()
+    journal = RunJournal(hotcold_datadir, journal_name, journal_setup)
     print("done")
 
     print("Setting accumulation register to " + str(acc_len) + "...")
@@ -50,11 +57,12 @@ def make_pre_measurements_actions():
     print("done")
     
     print("Setting instruments power and outputs...")
-    lo1_generator.write("power " + str(lo1_power))
-    lo1_generator.write("freq mult " + str(lo1_mult))
-    lo2_generator.write("power " + str(lo2_power))
-    lo1_generator.write("outp on")
-    lo2_generator.write("outp on")
+    wait_all([
+        lo1_generator.write_async("power " + str(lo1_power)),
+        lo1_generator.write_async("freq mult " + str(lo1_mult)),
+        lo2_generator.write_async("power " + str(lo2_power)),
+        lo1_generator.write_async("outp on"),
+        lo2_generator.write_async("outp on")])
     print("done")
     
     print("Initialize chopper...")
@@ -65,40 +73,58 @@ def make_dss_multilo_measurements():
     """
     Makes the hot cold measurements for dss with multiple LOs.
     """
-    for lo1_freq in lo1_freqs:
-        # set lo1 frequency
-        lo1_generator.ask("freq " + str(lo1_freq) + " ghz; *opc?")
+    for lo1_freq, lo2_freq in lo_grid:
+        # print setting
+        print("Current LOs: LO1:" + str(lo1_freq) + "GHz," +
+                          " LO2:" + str(lo2_freq) + "GHz")
         
-        for lo2_freq in lo2_freqs:
-            # set lo2 frequency
-            lo2_generator.ask("freq " + str(lo2_freq) + "ghz; *opc?")
-
-            # print setting
-            print("Current LOs: LO1:" + str(lo1_freq) + "GHz," +
-                              " LO2:" + str(lo2_freq) + "GHz")
-            
-            # make measurement subdirectory
-            measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
-                                str(lo2_freq) + "ghz"
-            measdir = hotcold_datadir + "/" + measname
-            os.mkdir(measdir)
-            
-            # make measurement
-            make_dss_measurements(measdir)
-
-    print_multilo_data()
+        # make measurement subdirectory
+        measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
+                            str(lo2_freq) + "ghz"
+        measdir = hotcold_datadir + "/" + measname
+        if journal.is_finished(measname):
+            print("Measurement already finished, skipping.")
+            continue
+        make_dir(measdir)
+
+        # set the LOs at the same time, the unchanged settings are not sent
+        # (see CachedInstrument)
+        wait_all([
+            lo1_generator.ask_async("freq " + str(lo1_freq) + " ghz; *opc?"),
+            lo2_generator.ask_async("freq " + str(lo2_freq) + " ghz; *opc?")])
+        
+        # make measurement
+        make_dss_measurements(measdir)
+        journal.set_finished(measname)
 
-def make_post_measurements_actions():
+def turn_off_instruments():
     """
-    Makes all the actions required after measurements:
-    - turn off sources
-    - compress data
+    Turn off the sources.
     """
     print("Turning off instruments...")
     lo1_generator.write("outp off")
     lo2_generator.write("outp off")
     print("done")
 
+def make_post_measurements_actions():
+    """
+    Makes all the actions required after measurements:
+    - print data of all LOs
+    - compress data
+    """
+    if print_plots == 'inline':
+        print("Printing data of all LOs...")
+        print_multilo_data()
+        print("done")
+    elif print_plots == 'post':
+        print("Printing data of all LOs and tones...")
+        print_run_data(hotcold_datadir)
+        print("done")
+    elif print_plots == 'report':
+        print("Making report of all LOs...")
+        make_run_report(hotcold_datadir)
+        print("done")
+
     print("Compressing data...")
     compress_data(hotcold_datadir)
     print("done")
@@ -133,7 +159,11 @@ def create_figure():
 def make_data_directory():
     """
     Make directory where to save all the hot cold data.
+    If the directory already exists the run is resumed.
     """
+    if os.path.exists(hotcold_datadir):
+        print("Using existing data directory " + hotcold_datadir + "...")
+        return
     os.mkdir(hotcold_datadir)
 
     # make .json file with test info
@@ -183,10 +213,8 @@ def make_dss_measurements(measdir):
 
     print("Getting spectral data cold...")
     time.sleep(pause_time)
-    a2_cold = cd.read_interleave_data(roach, bram_a2,    bram_addr_width, 
-                                      bram_word_width,   pow_data_type)
-    b2_cold = cd.read_interleave_data(roach, bram_b2,    bram_addr_width, 
-                                      bram_word_width,   pow_data_type)
+    a2_cold, b2_cold = read_interleave_brams(roach, [bram_a2, bram_b2], 
+        bram_addr_width, bram_word_width, [pow_data_type, pow_data_type])
     print("done")
         
     print("Setting setting chopper to cold...")
@@ -195,10 +223,8 @@ def make_dss_measurements(measdir):
 
     print("Getting spectral data hot...")
     time.sleep(pause_time)
-    a2_hot = cd.read_interleave_data(roach, bram_a2,    bram_addr_width, 
-                                     bram_word_width,   pow_data_type)
-    b2_hot = cd.read_interleave_data(roach, bram_b2,    bram_addr_width, 
-                                     bram_word_width,   pow_data_type)
+    a2_hot, b2_hot = read_interleave_brams(roach, [bram_a2, bram_b2], 
+        bram_addr_width, bram_word_width, [pow_data_type, pow_data_type])
     print("done")
 
     # scale and dBFS data for plotting
@@ -221,16 +247,20 @@ def make_dss_measurements(measdir):
         a2_cold=a2_cold, b2_cold=b2_cold, a2_hot=a2_hot, b2_hot=b2_hot)
     print("done")
 
-    print("Printing data...")
-    print_singlelo_data(measdir)
-    print("done")
+    if print_plots == 'inline':
+        print("Printing data...")
+        print_singlelo_data(measdir)
+        print("done")
 
-def print_singlelo_data(measdir):
+def plot_singlelo_data(measdir):
     """
-    Print the saved data to .pdf images for an easy: check.
+    Plot the saved data of a single measurement.
     :param measdir: directory where to read the data of single measurement
-    and save the image (sub directory of main hotcold_datadir).
+    (sub directory of main hotcold_datadir).
+    :return: list of (name, figure) tuples.
     """
+    figs = []
+
     # get data
     hotcold_data = np.load(measdir + "/hotcold_data.npz")
     a2_cold = hotcold_data['a2_cold']; b2_cold = hotcold_data['b2_cold']
@@ -243,7 +273,7 @@ def print_singlelo_data(measdir):
     pow_b2_hot  = cd.scale_and_dBFS_specdata(b2_hot,  acc_len, dBFS)
 
     # print power level
-    plt.figure()
+    fig = plt.figure()
     plt.plot(if_freqs, pow_a2_cold, 'blue',     label="USB cold")
     plt.plot(if_freqs, pow_b2_cold, 'darkblue', label="LSB cold")
     plt.plot(if_freqs, pow_a2_hot,  'red',      label="USB hot")
@@ -252,12 +282,22 @@ def print_singlelo_data(measdir):
     plt.xlabel('Frequency [MHz]')
     plt.ylabel('Power [dBFS]')
     plt.legend()
-    plt.savefig(measdir+'/power_lev.pdf')
-    plt.close()
+    figs.append(('power_lev', fig))
 
-def print_multilo_data():
+    return figs
+
+def print_singlelo_data(measdir):
     """
-    Print the saved data from all LO settings to .pdf image.
+    Print the saved data to .pdf images for an easy check.
+    :param measdir: directory where to read the data of single measurement
+    and save the image (sub directory of main hotcold_datadir).
+    """
+    save_figures(plot_singlelo_data(measdir), measdir)
+
+def plot_multilo_data():
+    """
+    Plot the saved data from all LO settings.
+    :return: list of (name, figure) tuples.
     """
     # create power level figure
     fig1, ax1 = plt.subplots(1,1)
@@ -300,8 +340,13 @@ def print_multilo_data():
             plt.plot(rf_freqs_usb, pow_a2_hot,  'red',      label="USB hot")
             plt.plot(rf_freqs_lsb, pow_b2_hot,  'darkred',  label="LSB hot")
             
-    # print figures
-    fig1.savefig(hotcold_datadir+'/power_lev.pdf')
+    return [('power_lev', fig1)]
+
+def print_multilo_data():
+    """
+    Print the saved data from all LO settings to .pdf image.
+    """
+    save_figures(plot_multilo_data(), hotcold_datadir)
 
 def move_chopper90_cw():
     """
@@ -330,4 +375,13 @@ def compress_data(datadir):
     shutil.rmtree(datadir)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Hot cold measurement of the digital sideband separating receiver \
+            with multiple LOs.")
+    parser.add_argument("-r", "--resume", dest="resume", default=None,
+        help="Data directory of an interrupted run to resume. The finished \
+            LO settings and tones are skipped.")
+    args = parser.parse_args()
+    if args.resume is not None:
+        hotcold_datadir = args.resume.rstrip("/")
     main()
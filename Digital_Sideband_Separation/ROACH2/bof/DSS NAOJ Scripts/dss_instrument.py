@@ -0,0 +1,125 @@
+# Instrument layer for the signal generators. It remembers the last setting
+# sent to each instrument, so that commands that don't change it are not
+# sent again, and it allows to send commands without waiting for the reply.
+
+# imports
+from multiprocessing.pool import ThreadPool
+
+# settings commands whose value is remembered, longest first so that
+# "freq:mult 18" is not taken as a "freq" setting
+state_cmds = sorted(["freq", "freq:mult", "freq mult", "freq:mode", "power",
+    "outp"], key=len, reverse=True)
+
+def parse_setting(cmd):
+    """
+    Split a settings command into its name and value.
+    :param cmd: command (e.g. "freq 4 ghz").
+    :return: (name, value) tuple, with the spaces of the value removed (so
+        "4 ghz" and "4ghz" are the same value), or None if it is not a
+        settings command.
+    """
+    cmd = cmd.strip()
+    for state_cmd in state_cmds:
+        if cmd.lower().startswith(state_cmd + " "):
+            value = cmd[len(state_cmd):].replace(" ", "").lower()
+            return state_cmd, value
+    return None
+
+class CachedInstrument():
+    """
+    Wrapper of a pyvisa resource that caches the settings confirmed by the
+    instrument (after the write or ask returned), and skips the messages
+    whose settings are all already in the cache. Messages can have several
+    commands separated by "; ", and *opc? is answered with 1 when the
+    message is skipped. Any other command (e.g. list sweep triggers)
+    clears the cache, as it may change the settings. All the commands are
+    sent in order from a single background thread, so ask_async can be used
+    to do other work while the instrument processes a command.
+    """
+    def __init__(self, resource):
+        """
+        :param resource: pyvisa resource of the instrument.
+        """
+        self.resource = resource
+        self.cache    = {}
+        self.pool     = ThreadPool(1)
+
+    def send(self, message, query):
+        """
+        Send a message unless all its settings are cached. Runs in the
+        instrument thread.
+        :param message: message to send.
+        :param query: if True read the reply.
+        :return: reply of the instrument if query is True.
+        """
+        cmds = [cmd for cmd in message.split("; ") if cmd.strip().lower() != "*opc?"]
+        settings = [parse_setting(cmd) for cmd in cmds]
+        if None not in settings and \
+            all([self.cache.get(name) == value for name, value in settings]):
+            return "1" if query else None
+
+        if query:
+            reply = self.resource.ask(message)
+        else:
+            reply = self.resource.write(message)
+
+        if None in settings:
+            self.cache = {}
+        else:
+            self.cache.update(settings)
+        return reply
+
+    def write(self, message):
+        """
+        Send a message, and wait for it to be written.
+        :param message: message to send.
+        """
+        return self.pool.apply(self.send, (message, False))
+
+    def ask(self, message):
+        """
+        Send a message and wait for the reply.
+        :param message: message to send.
+        :return: reply of the instrument.
+        """
+        return self.pool.apply(self.send, (message, True))
+
+    def write_async(self, message):
+        """
+        Send a message without waiting for it to be written.
+        :param message: message to send.
+        :return: AsyncResult object, its get() method waits for the write.
+        """
+        return self.pool.apply_async(self.send, (message, False))
+
+    def ask_async(self, message):
+        """
+        Send a message without waiting for the reply.
+        :param message: message to send.
+        :return: AsyncResult object, its get() method returns the reply.
+        """
+        return self.pool.apply_async(self.send, (message, True))
+
+    def clear_cache(self):
+        """
+        Forget the cached settings, e.g. if the instrument was changed by
+        hand.
+        """
+        self.pool.apply(self.cache.clear)
+
+    def close(self):
+        """
+        Wait for the pending commands and close the resource.
+        """
+        self.pool.close()
+        self.pool.join()
+        self.resource.close()
+
+def wait_all(async_results):
+    """
+    Wait for a group of asynchronous commands, e.g. sent to different
+    instruments so that they are processed (and settle) at the same time.
+    :param async_results: list of AsyncResult objects of the commands.
+    :return: list of replies.
+    """
+    return [result.get() for result in async_results]
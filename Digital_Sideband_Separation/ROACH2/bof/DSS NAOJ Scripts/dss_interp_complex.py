@@ -0,0 +1,48 @@
+# Interpolation of complex calibration data measured at a few tones, in
+# magnitude and unwrapped phase. It doesn't import the parameters, so it is
+# shared by the multi LO calibration, constants and LO grid interpolation 
+# modules, and by the single LO calibration script.
+
+# imports
+import numpy as np
+import scipy.interpolate
+
+def interp_complex(freqs, tone_freqs, tone_values, kind='linear'):
+    """
+    Interpolate complex data measured at a few tones in magnitude and
+    unwrapped phase, instead of in real and imaginary parts as np.interp,
+    which makes magnitude dips where the phase rotates between tones.
+    Outside the tones the values of the edge tones are used, as np.interp.
+    :param freqs: frequencies where to interpolate (MHz).
+    :param tone_freqs: sorted frequencies of the tones (MHz).
+    :param tone_values: complex values at the tones, the last axis are the
+        tones. Leading axes (e.g. LO settings) are interpolated at once.
+    :param kind: 'linear', 'cubic' (cubic spline) or 'pchip' (monotonic
+        cubic, no overshoot).
+    :return: complex interpolated array, with the tones axis replaced by
+        freqs.
+    """
+    tone_freqs = np.asarray(tone_freqs, dtype=float)
+    if len(tone_freqs) < 2:
+        raise ValueError("At least 2 tones are needed to interpolate, got " +
+            str(len(tone_freqs)) + ".")
+    freqs = np.clip(freqs, tone_freqs[0], tone_freqs[-1])
+    mag   = np.abs(tone_values)
+    phase = np.unwrap(np.angle(tone_values), axis=-1)
+
+    if kind == 'linear':
+        i1 = np.clip(np.searchsorted(tone_freqs, freqs), 1, len(tone_freqs)-1)
+        i0 = i1 - 1
+        t = (freqs - tone_freqs[i0]) / (tone_freqs[i1] - tone_freqs[i0])
+        mag   = (1-t)*mag[..., i0]   + t*mag[..., i1]
+        phase = (1-t)*phase[..., i0] + t*phase[..., i1]
+    elif kind == 'cubic':
+        mag   = scipy.interpolate.CubicSpline(tone_freqs, mag,   axis=-1)(freqs)
+        phase = scipy.interpolate.CubicSpline(tone_freqs, phase, axis=-1)(freqs)
+    elif kind == 'pchip':
+        mag   = scipy.interpolate.PchipInterpolator(tone_freqs, mag,   axis=-1)(freqs)
+        phase = scipy.interpolate.PchipInterpolator(tone_freqs, phase, axis=-1)(freqs)
+    else:
+        raise ValueError("Unknown interpolation kind " + str(kind) + ".")
+
+    return mag * np.exp(1j*phase)
@@ -0,0 +1,211 @@
+#!/usr/bin/python
+# Calibration constants for LO settings that were not measured. The constants
+# of the measured LO grid of a calibration are arranged in a (LO1, LO2,
+# channel) complex array, and the constants of any LO pair inside the grid
+# are interpolated from it, in magnitude and unwrapped phase. The 
+# interpolation error is estimated from the curvature of the magnitude and 
+# phase of the constants across the grid, and reported as the SRR that it 
+# limits.
+
+# imports
+import os, re, argparse
+import numpy as np
+from dss_load_constants import compute_consts, load_comp_constants
+from dss_interp_complex import interp_complex
+from dss_multilo_parameters import *
+
+measname_re = re.compile(r'^lo1_(.+)ghz_lo2_(.+)ghz$')
+
+class ConstantsModel():
+    """
+    Constants of a multi LO calibration, interpolated linearly in magnitude
+    and unwrapped phase in the (LO1, LO2) grid for every channel, so there 
+    are no magnitude dips where the phase rotates between LOs. The measured
+    LO settings must form a full grid (every lo1 with every lo2), as made by
+    the multi LO scripts.
+    """
+    def __init__(self, caldir):
+        """
+        :param caldir: directory with the (extracted) multi LO calibration
+            data, with one lo1_*ghz_lo2_*ghz subdirectory per LO setting.
+        """
+        meas = {}
+        for measname in os.listdir(caldir):
+            match = measname_re.match(measname)
+            if match is None or not os.path.exists(caldir + "/" + measname +
+                "/caldata.npz"):
+                continue
+            lo_pair = (float(match.group(1)), float(match.group(2)))
+            meas[lo_pair] = measname
+
+        self.lo1_freqs = np.array(sorted(set([lo1 for lo1, lo2 in meas])))
+        self.lo2_freqs = np.array(sorted(set([lo2 for lo1, lo2 in meas])))
+        if len(meas) == 0:
+            raise ValueError("No calibration data found in " + caldir + ".")
+        if len(meas) != len(self.lo1_freqs) * len(self.lo2_freqs):
+            raise ValueError("The LO settings of " + caldir + " are not a " +
+                "full grid.")
+
+        # stack the calibration data of all the LOs, and compute the 
+        # constants of the whole grid at once
+        caldata_list = [np.load(caldir + "/" + meas[(lo1, lo2)] + "/caldata.npz")
+            for lo1 in self.lo1_freqs for lo2 in self.lo2_freqs]
+        shape = (len(self.lo1_freqs), len(self.lo2_freqs), -1)
+        caldata = {}
+        for key in ['a2_toneusb', 'b2_toneusb', 'ab_toneusb', 
+                    'a2_tonelsb', 'b2_tonelsb', 'ab_tonelsb']:
+            caldata[key] = np.reshape([data[key] for data in caldata_list], shape)
+        self.consts_lsb, self.consts_usb = compute_consts(caldata)
+
+        # curvature of the magnitude and phase of the constants along each 
+        # LO axis
+        self.curv_usb = [get_complex_curvature(self.lo1_freqs, self.consts_usb, 0),
+                         get_complex_curvature(self.lo2_freqs, self.consts_usb, 1)]
+        self.curv_lsb = [get_complex_curvature(self.lo1_freqs, self.consts_lsb, 0),
+                         get_complex_curvature(self.lo2_freqs, self.consts_lsb, 1)]
+
+    def get_consts(self, lo1, lo2):
+        """
+        Interpolate the constants of an LO setting.
+        :param lo1: lo1 frequency (GHz).
+        :param lo2: lo2 frequency (GHz).
+        :return: usb and lsb constants arrays.
+        """
+        consts_list = []
+        for consts in [self.consts_usb, self.consts_lsb]:
+            consts = interp_lo_axis(self.lo1_freqs, consts, lo1) # (lo2, channel)
+            consts_list.append(interp_lo_axis(self.lo2_freqs, consts, lo2))
+        return consts_list[0], consts_list[1]
+
+    def estimate_srr(self, lo1, lo2):
+        """
+        Estimate the SRR limited by the interpolation error of the constants
+        of an LO setting, as 20*log10(2|c|/|dc|), where c is the constant and
+        dc its error. The error of a linear interpolation between x0 and x1
+        is |f''|(x-x0)(x1-x)/2 for the magnitude and phase f of c, with f''
+        estimated from the measured grid (see get_curvature), and 
+        |dc|^2 = dmag^2 + (|c|*dphase)^2. The axes where the LO setting is on
+        the grid add no error, so the SRR is inf at measured LO settings, and
+        nan only if an interpolated axis has less than 3 values.
+        :param lo1: lo1 frequency (GHz).
+        :param lo2: lo2 frequency (GHz).
+        :return: estimated usb and lsb SRR arrays (dB).
+        """
+        consts_usb, consts_lsb = self.get_consts(lo1, lo2)
+        dist1 = get_interval_dist(self.lo1_freqs, lo1)
+        dist2 = get_interval_dist(self.lo2_freqs, lo2)
+
+        srr_list = []
+        for consts, curv in [(consts_usb, self.curv_usb), (consts_lsb, self.curv_lsb)]:
+            mag_err = 0; phase_err = 0
+            for dist, (curv_mag, curv_phase) in zip([dist1, dist2], curv):
+                # skip the axes on the grid, their curvature may be nan
+                if dist == 0:
+                    continue
+                mag_err   = mag_err   + curv_mag   * dist / 2
+                phase_err = phase_err + curv_phase * dist / 2
+            err = np.sqrt(mag_err**2 + (np.abs(consts)*phase_err)**2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                srr_list.append(20*np.log10(2*np.abs(consts) / err))
+
+        return srr_list[0], srr_list[1]
+
+    def load_constants(self, roach, lo1, lo2):
+        """
+        Load the interpolated constants of an LO setting into roach, and
+        print the minimum estimated SRR.
+        :param roach: FpgaClient object to communicate with roach.
+        :param lo1: lo1 frequency (GHz).
+        :param lo2: lo2 frequency (GHz).
+        """
+        consts_usb, consts_lsb = self.get_consts(lo1, lo2)
+        srr_usb, srr_lsb = self.estimate_srr(lo1, lo2)
+        print("Interpolated constants, estimated minimum SRR: USB " +
+            str(np.min(srr_usb)) + "dB, LSB " + str(np.min(srr_lsb)) + "dB")
+
+        load_comp_constants(roach, consts_usb, bram_consts_usb_re, bram_consts_usb_im)
+        load_comp_constants(roach, consts_lsb, bram_consts_lsb_re, bram_consts_lsb_im)
+
+def interp_lo_axis(freqs, consts, freq):
+    """
+    Interpolate the constants at an LO frequency along their first axis, in
+    magnitude and unwrapped phase (see interp_complex). Frequencies outside
+    the axis are clipped to its edges, with a warning.
+    :param freqs: sorted array of grid frequencies of the axis.
+    :param consts: array of constants, the first axis is the LO axis.
+    :param freq: frequency to interpolate.
+    :return: interpolated constants array, without the LO axis.
+    """
+    if freq < freqs[0] or freq > freqs[-1]:
+        print("Warning: " + str(freq) + "GHz outside of the calibrated LOs (" +
+            str(freqs[0]) + "-" + str(freqs[-1]) + "GHz), using the closest.")
+    if len(freqs) == 1:
+        return consts[0]
+    return interp_complex(freq, freqs, np.moveaxis(consts, 0, -1))
+
+def get_interval_dist(freqs, freq):
+    """
+    Get the product of the distances of a frequency to the ends of its
+    interval in the grid, (x-x0)(x1-x), which scales the linear
+    interpolation error. It is 0 at grid frequencies and outside the grid.
+    :param freqs: sorted array of grid frequencies.
+    :param freq: frequency to interpolate.
+    :return: distance product (GHz^2).
+    """
+    freq = np.clip(freq, freqs[0], freqs[-1])
+    if np.any(np.isclose(freqs, freq)):
+        return 0
+    i1 = np.searchsorted(freqs, freq)
+    return (freq - freqs[i1-1]) * (freqs[i1] - freq)
+
+def get_curvature(freqs, consts, axis):
+    """
+    Estimate the magnitude of the second derivative of the constants along
+    an LO axis, for every channel. Each interior grid point is predicted
+    from its two neighbors, and the prediction error is divided by the
+    distances to them: c''/2 ~ |c_k - pred_k| / (h_left*h_right). The
+    maximum over the grid is returned, as a conservative estimate.
+    :param freqs: sorted array of grid frequencies of the axis.
+    :param consts: (lo1, lo2, channel) real array (e.g. magnitude or phase
+        of the constants).
+    :param axis: 0 for lo1, 1 for lo2.
+    :return: array with |c''| per channel (nan if less than 3 frequencies).
+    """
+    if len(freqs) < 3:
+        return np.full(consts.shape[-1], np.nan)
+    consts = np.moveaxis(consts, axis, 0)
+    x = np.reshape(freqs, (-1,) + (1,)*(consts.ndim-1))
+    h_left  = x[1:-1] - x[:-2]
+    h_right = x[2:]   - x[1:-1]
+    pred = (consts[:-2]*h_right + consts[2:]*h_left) / (h_left + h_right)
+    curv = 2*np.abs(consts[1:-1] - pred) / (h_left*h_right)
+    return np.max(np.reshape(curv, (-1, consts.shape[-1])), axis=0)
+
+def get_complex_curvature(freqs, consts, axis):
+    """
+    Estimate the curvature of the magnitude and of the unwrapped phase of
+    the constants along an LO axis, see get_curvature.
+    :param freqs: sorted array of grid frequencies of the axis.
+    :param consts: (lo1, lo2, channel) complex array of constants.
+    :param axis: 0 for lo1, 1 for lo2.
+    :return: arrays with |mag''| and |phase''| per channel.
+    """
+    return get_curvature(freqs, np.abs(consts), axis), \
+           get_curvature(freqs, np.unwrap(np.angle(consts), axis=axis), axis)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Estimate the SRR of the interpolated calibration \
+            constants at an LO setting.")
+    parser.add_argument("-cd", "--caldir", dest="caldir", required=True,
+        help="Directory with the multi LO calibration data.")
+    parser.add_argument("--lo1", dest="lo1", type=float, required=True,
+        help="LO1 frequency in GHz.")
+    parser.add_argument("--lo2", dest="lo2", type=float, required=True,
+        help="LO2 frequency in GHz.")
+    args = parser.parse_args()
+
+    model = ConstantsModel(args.caldir)
+    srr_usb, srr_lsb = model.estimate_srr(args.lo1, args.lo2)
+    print("Estimated minimum SRR: USB " + str(np.min(srr_usb)) + "dB, LSB " +
+        str(np.min(srr_lsb)) + "dB")
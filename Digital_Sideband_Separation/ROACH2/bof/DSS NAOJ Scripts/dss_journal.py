@@ -0,0 +1,102 @@
+# Run journal of the multi LO measurements. It records the finished LO
+# settings and tone channels of a run, so that an interrupted run can be
+# resumed from the last finished point with the --resume option of the
+# scripts. Parallel runs (dss_multilo_parallel.py) keep one journal per
+# setup in the same data directory.
+
+# imports
+import os, json, glob
+
+class RunJournal():
+    """
+    Persistent record of a run, saved as a .json file in the data directory.
+    It stores the names of the finished measurements (LO settings), and the
+    data of the finished tones of every sweep. The file is rewritten after
+    every update, first into a temporary file that then replaces the
+    journal, so it is never left half written if the run is interrupted.
+    The tones are recorded from the writer thread (see dss_writer.py).
+    """
+    def __init__(self, datadir, name="journal", setup=None):
+        """
+        :param datadir: data directory of the run. If it already has a
+            journal (resumed run), the journal is loaded.
+        :param name: name of the journal file (without extension).
+        :param setup: index of the setup in a parallel run, appended to the
+            name of the file. None for a single setup run.
+        """
+        self.datadir  = datadir
+        self.name     = name
+        self.filename = datadir + "/" + name + \
+            ("" if setup is None else str(setup)) + ".json"
+        if os.path.exists(self.filename):
+            with open(self.filename, "r") as f:
+                self.entries = json.load(f)
+        else:
+            self.entries = {"finished measurements": [], "sweeps": {}}
+            self.save()
+
+    def save(self):
+        """
+        Write the journal to disk.
+        """
+        tmpname = self.filename + ".tmp"
+        with open(tmpname, "w") as f:
+            json.dump(self.entries, f, indent=4, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        getattr(os, 'replace', os.rename)(tmpname, self.filename)
+
+    def is_finished(self, measname):
+        """
+        :param measname: name of the measurement (LO setting).
+        :return: True if the measurement was finished. The journals of
+            the other setups of a parallel run are also checked, as the
+            LO grid may be split differently when the run is resumed.
+        """
+        if measname in self.entries["finished measurements"]:
+            return True
+        for filename in glob.glob(self.datadir + "/" + self.name + "*.json"):
+            if filename == self.filename:
+                continue
+            with open(filename, "r") as f:
+                if measname in json.load(f)["finished measurements"]:
+                    return True
+        return False
+
+    def set_finished(self, measname):
+        """
+        Record a finished measurement. Its sweeps are no longer needed.
+        :param measname: name of the measurement (LO setting).
+        """
+        self.entries["finished measurements"].append(measname)
+        for sweepname in list(self.entries["sweeps"]):
+            if sweepname.startswith(measname + "/"):
+                del self.entries["sweeps"][sweepname]
+        self.save()
+
+    def get_tones(self, sweepname):
+        """
+        :param sweepname: name of the sweep (measurement/sideband).
+        :return: list of [channel, values] of the finished tones of the
+            sweep, in the order they were measured.
+        """
+        return self.entries["sweeps"].get(sweepname, [])
+
+    def add_tone(self, sweepname, chnl, values):
+        """
+        Record a finished tone of a sweep.
+        :param sweepname: name of the sweep (measurement/sideband).
+        :param chnl: channel of the tone.
+        :param values: list of float values measured for the tone.
+        """
+        tones = self.entries["sweeps"].setdefault(sweepname, [])
+        tones.append([int(chnl), [float(value) for value in values]])
+        self.save()
+
+def make_dir(dirname):
+    """
+    Make a directory if it doesn't exist yet (it exists in resumed runs).
+    :param dirname: directory to make.
+    """
+    if not os.path.exists(dirname):
+        os.mkdir(dirname)
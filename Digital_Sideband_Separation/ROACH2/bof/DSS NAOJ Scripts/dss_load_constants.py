@@ -2,6 +2,8 @@
 import argparse, tarfile, time
 import numpy as np
 import calandigital as cd
+from dss_model_fit import synthesize_consts
+from dss_interp_complex import interp_complex
 from dss_multilo_parameters import *
 
 if __name__ == '__main__':
@@ -29,19 +31,34 @@ def dss_load_constants(roach, caldir):
     :param roach: FpgaClient object to communicate with roach.
     :param caldir: directory with the calibration data.
     """
-    consts_lsb, consts_usb = compute_consts(caldir)
+    caldata = np.load(caldir+'/caldata.npz')
+    load_caldata_constants(roach, caldata)
+
+def load_caldata_constants(roach, caldata):
+    """
+    Load digital sideband separation constants computed from calibration
+    data already in memory (e.g. just measured).
+    :param roach: FpgaClient object to communicate with roach.
+    :param caldata: dictionary (or loaded .npz file) with the calibration
+        data arrays, as saved in caldata.npz.
+    """
+    consts_lsb, consts_usb = compute_consts(caldata)
 
     load_comp_constants(roach, consts_usb, bram_consts_usb_re, bram_consts_usb_im)
     load_comp_constants(roach, consts_lsb, bram_consts_lsb_re, bram_consts_lsb_im)
 
-def compute_consts(caldir):
+def compute_consts(caldata):
     """
-    Compute constants using tone calibration info.
-    :param caldir: calibration directory.
+    Compute constants using tone calibration info. If fit_consts is True,
+    the constants of all the channels are synthesized from a model fitted
+    to the test channels, otherwise, if consts_interp is set, they are 
+    interpolated again from the test channels (e.g. for data saved with 
+    another interpolation).
+    :param caldata: dictionary (or loaded .npz file) with the calibration
+        data arrays. The arrays can have leading axes (e.g. LO settings),
+        the channels are the last axis.
     :return: calibration constants.
     """
-    caldata = np.load(caldir+'/caldata.npz')
-    
     # get arrays
     a2_toneusb = caldata['a2_toneusb']; a2_tonelsb = caldata['a2_tonelsb']
     b2_toneusb = caldata['b2_toneusb']; b2_tonelsb = caldata['b2_tonelsb']
@@ -52,6 +69,17 @@ def compute_consts(caldir):
     consts_usb =         -1 * ab_tonelsb  / b2_tonelsb #  ab*   / bb* = a/b
     consts_lsb = -1 * np.conj(ab_toneusb) / a2_toneusb # (ab*)* / aa* = a*b / aa* = b/a
 
+    # constants at the test channels
+    tone_consts_usb = consts_usb[..., test_channels]
+    tone_consts_lsb = consts_lsb[..., test_channels]
+
+    if fit_consts:
+        consts_usb = synthesize_consts(if_test_freqs, tone_consts_usb, if_freqs)
+        consts_lsb = synthesize_consts(if_test_freqs, tone_consts_lsb, if_freqs)
+    elif consts_interp is not None:
+        consts_usb = interp_complex(if_freqs, if_test_freqs, tone_consts_usb, consts_interp)
+        consts_lsb = interp_complex(if_freqs, if_test_freqs, tone_consts_lsb, consts_interp)
+
     return consts_lsb, consts_usb
 
 def load_comp_constants(roach, consts, bram_re, bram_im):
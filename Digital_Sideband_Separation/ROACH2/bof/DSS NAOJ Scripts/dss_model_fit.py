@@ -0,0 +1,81 @@
+# Synthesis of the calibration constants of all the channels from a sparse
+# tone sweep, by fitting a parametric model of the complex ratio between the 
+# inputs of the dss model. In the model, the phase is a linear delay 
+# (as in compute_adc_delay of synchronize_adc5g.py) plus a constant phase and
+# a low order polynomial for the ripple, and the magnitude is a low order 
+# polynomial of its log.
+
+# imports
+import numpy as np
+from dss_multilo_parameters import *
+
+def estimate_delay_slope(freqs, ratios):
+    """
+    Estimate the phase slope of the delay between the inputs. Instead of
+    unwrapping the phase, which is ambiguous with sparse tones, the delay
+    is searched in steps of 0.01 samples up to fit_max_delay samples,
+    maximizing the coherent sum of the ratios with the delay removed. The
+    search is limited to the delays that are not ambiguous with the tones
+    spacing (phase step between tones below pi).
+    :param freqs: frequencies of the ratios (MHz).
+    :param ratios: complex ratios of the inputs.
+    :return: phase slope of the delay (rad/MHz).
+    """
+    max_delay = min(fit_max_delay, bandwidth / np.max(np.diff(freqs)))
+    delays = np.arange(-max_delay, max_delay, 0.01) # samples
+    slopes = 2*np.pi * delays / (2*bandwidth) # dphi/df = 2pi * delay / Fs
+    phasors = ratios / np.abs(ratios)
+    coherence = np.abs(np.dot(np.exp(-1j*np.outer(slopes, freqs)), phasors))
+    return slopes[np.argmax(coherence)]
+
+def fit_ratio_model(freqs, ratios):
+    """
+    Fit the model of the ratio between the inputs to the measured tones.
+    The orders of the polynomials are fit_mag_order and fit_phase_order,
+    reduced if there are not enough tones.
+    :param freqs: frequencies of the measured tones (MHz).
+    :param ratios: complex ratios of the inputs at the tones.
+    :return: model parameters: delay phase slope (rad/MHz), and polynomial
+        coefficients of the log magnitude and of the residual phase, in
+        normalized frequency (see eval_ratio_model).
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    ratios = np.asarray(ratios)
+    x = 2*freqs/bandwidth - 1 # normalized frequency, -1 to 1 in the band
+
+    slope = estimate_delay_slope(freqs, ratios)
+    phase_resid = np.unwrap(np.angle(ratios * np.exp(-1j*slope*freqs)))
+    phase_poly = np.polyfit(x, phase_resid, min(fit_phase_order, len(x)-1))
+    mag_poly   = np.polyfit(x, np.log(np.abs(ratios)), min(fit_mag_order, len(x)-1))
+
+    return slope, mag_poly, phase_poly
+
+def eval_ratio_model(params, freqs):
+    """
+    Evaluate the model of the ratio between the inputs.
+    :param params: model parameters returned by fit_ratio_model.
+    :param freqs: frequencies where to evaluate the model (MHz).
+    :return: complex ratios array.
+    """
+    slope, mag_poly, phase_poly = params
+    freqs = np.asarray(freqs, dtype=float)
+    x = 2*freqs/bandwidth - 1
+    return np.exp(np.polyval(mag_poly, x)) * \
+        np.exp(1j*(slope*freqs + np.polyval(phase_poly, x)))
+
+def synthesize_consts(tone_freqs, tone_consts, freqs):
+    """
+    Synthesize the calibration constants of all the channels from the
+    constants measured at a few tones, by fitting the ratio model.
+    :param tone_freqs: frequencies of the measured tones (MHz).
+    :param tone_consts: complex constants at the measured tones, the last
+        axis are the tones (leading axes, e.g. LO settings, are fitted
+        one by one).
+    :param freqs: frequencies of the channels to synthesize (MHz).
+    :return: complex constants array at freqs.
+    """
+    tone_consts = np.asarray(tone_consts)
+    if tone_consts.ndim > 1:
+        return np.array([synthesize_consts(tone_freqs, consts, freqs)
+            for consts in tone_consts])
+    return eval_ratio_model(fit_ratio_model(tone_freqs, tone_consts), freqs)
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# Script to run a multi LO script (calibration, SRR or hot cold) in several
+# setups in parallel. Each setup is a ROACH board with its own receiver and
+# instruments (see parallel_setups in dss_multilo_parameters.py). The LO
+# grid is split between the setups, and every setup saves its measurements
+# in the same data directory, so the result is the same as a single setup
+# run (e.g. dss_load_constants reads the calibration with no changes).
+# Usage example:
+#   python dss_multilo_parallel.py dss_calibrate_multilo
+
+# imports
+import os, time, tarfile, argparse, importlib, multiprocessing
+import numpy as np
+from dss_multilo_parameters import *
+
+# data directory parameter of each script
+datadir_names = {"dss_calibrate_multilo"   : "cal_datadir",
+                 "dss_compute_srr_multilo" : "srr_datadir",
+                 "dss_hotcold_multilo"     : "hotcold_datadir"}
+
+def main():
+    start_time = time.time()
+
+    script = importlib.import_module(args.script)
+    datadir_name = datadir_names[args.script]
+    if args.resume is not None:
+        setattr(script, datadir_name, args.resume.rstrip("/"))
+    datadir = getattr(script, datadir_name)
+
+    print("Making data directory...")
+    script.make_data_directory()
+    print("done")
+
+    if args.script == "dss_compute_srr_multilo":
+        # extract the calibration once, before the setups use it
+        script.caldir = caltar[:-7]
+        if not os.path.exists(script.caldir):
+            print("Extracting compressed calibration data...")
+            tarfile.open(caltar).extractall(path=script.caldir)
+            print("done")
+
+    subgrids = split_lo_grid(lo_grid, len(parallel_setups))
+    workers = []
+    for i, (setup, subgrid) in enumerate(zip(parallel_setups, subgrids)):
+        if not subgrid:
+            continue
+        print("Setup " + str(i) + " (" + str(setup["roach_ip"]) + "): " +
+            str(len(subgrid)) + " LO settings.")
+        worker = multiprocessing.Process(target=run_setup,
+            args=(args.script, datadir_name, datadir, setup, subgrid, i))
+        worker.start()
+        workers.append(worker)
+
+    for worker in workers:
+        worker.join()
+
+    if any([worker.exitcode != 0 for worker in workers]):
+        print("Some setups failed. Rerun with --resume '" + datadir +
+            "' to finish the missing LO settings.")
+        return
+
+    script.make_post_measurements_actions()
+
+    print("Finished. Total time: " + str(int(time.time() - start_time)) + "[s]")
+
+def split_lo_grid(grid, nsetups):
+    """
+    Split the LO grid in contiguous parts, one per setup, so that every
+    setup changes its lo1 frequency as few times as possible.
+    :param grid: list of (lo1, lo2) frequencies.
+    :param nsetups: number of setups.
+    :return: list of LO subgrids, one per setup.
+    """
+    indices = np.array_split(np.arange(len(grid)), nsetups)
+    return [[grid[i] for i in setup_indices] for setup_indices in indices]
+
+def run_setup(script_name, datadir_name, datadir, setup, subgrid, setup_index):
+    """
+    Make the measurements of a subgrid of LOs in one setup. Runs in its own
+    process, where the script parameters are replaced by the ones of the
+    setup.
+    :param script_name: name of the multi LO script module.
+    :param datadir_name: name of the data directory parameter of the script.
+    :param datadir: data directory shared by all the setups.
+    :param setup: dictionary with the parameters of the setup.
+    :param subgrid: list of (lo1, lo2) frequencies to measure.
+    :param setup_index: index of the setup, for the name of its journal.
+    """
+    script = importlib.import_module(script_name)
+    setattr(script, datadir_name, datadir)
+    for key, value in setup.items():
+        setattr(script, key, value)
+    script.lo_grid       = subgrid
+    script.journal_setup = setup_index
+    script.show_plots    = False
+
+    script.make_pre_measurements_actions()
+    script.make_dss_multilo_measurements()
+    script.turn_off_instruments()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a multi LO script of the digital sideband separating \
+            receiver in several setups in parallel.")
+    parser.add_argument("script", choices=sorted(datadir_names),
+        help="Multi LO script to run.")
+    parser.add_argument("-r", "--resume", dest="resume", default=None,
+        help="Data directory of an interrupted run to resume. The finished \
+            LO settings and tones are skipped.")
+    args = parser.parse_args()
+    main()
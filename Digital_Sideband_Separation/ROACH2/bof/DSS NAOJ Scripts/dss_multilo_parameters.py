@@ -1,7 +1,7 @@
 # File with all the basic parameters for multi LO scripts
 
 # imports
-import datetime, pyvisa
+import os, datetime, pyvisa
 import numpy as np
 
 # communication parameters
@@ -13,7 +13,7 @@ lo2_generator_name = "GPIB0::5::INSTR"
 rf_generator_name  = "GPIB0::11::INSTR"
 chopper_name       = "GPIB0::1::INSTR"
 rm = pyvisa.ResourceManager('@py')
-#rm = pyvisa.ResourceManager('@sim')
+#rm = pyvisa.ResourceManager('dss_instruments_sim.yaml@sim') # needs pyvisa-sim
 
 # model parameters
 adc_bits           = 8
@@ -21,6 +21,9 @@ bandwidth          = 1080 # MHz
 cal_acc_len_reg    = 'cal_acc_len'
 syn_acc_len_reg    = 'syn_acc_len'
 cnt_rst_reg        = 'cnt_rst'
+acc_cnt_reg        = None # the dss models have no accumulation counter, so the
+                          # scripts wait on the accumulation time. Set to the
+                          # counter register if the model is rebuilt with one
 bram_addr_width    = 8  # bits
 bram_word_width    = 64 # bits
 pow_data_type      = '>u8'
@@ -77,21 +80,97 @@ lo2_power       = 16 # dBm
 rf_mult         = 18
 rf_power        = 15 # dBm
 acc_len         = 2**16
-chnl_step       = 512
+chnl_step       = 512   # fixed grid of test channels. The adaptive sweep of 
+                        # the single LO calibration (dss_adaptive.py) is not 
+                        # available here: the raw data store, the journals 
+                        # and the constants of the runs use this grid
 chnl_step_sync  = 32
 date_time       =  datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 cal_datadir     = "dss_cal "     + date_time
 srr_datadir     = "dss_srr "     + date_time
 hotcold_datadir = "dss_hotcold " + date_time
-pause_time      = 0.5 # should be > (1/bandwidth * FFT_size * acc_len * 2) in 
-                      # order  for the spectra to be fully computed after a 
-                      # tone change
+exp_datadir     = "dss_exp "     + date_time # calibration and srr in one pass
+pause_time      = 0.5 # used when the wait is not related to the accumulations 
+                      # (e.g. moving the chopper). After a tone change the 
+                      # scripts wait for a new accumulation (acc_cnt_reg) or 
+                      # for acc_time if the counter is not available
+acc_restart     = True  # restart the accumulation with cnt_rst_reg after 
+                        # every tone change, to wait only one accumulation
+acc_margin      = 0.05  # s, added to the accumulation time when there is no
+                        # counter, to cover the pipeline and bram write 
+                        # latency after an accumulation ends
+settle_tone     = False # after a tone change, wait also until the test channel
+                        # agrees in two successive accumulations, for 
+                        # generators that are still settling after *opc?
+settle_pow_tol  = 0.01  # relative power difference to consider a tone settled
+settle_ang_tol  = 0.5   # phase difference [deg] to consider a tone settled
+settle_max_time = 5     # s, maximum wait for a tone to settle
+pipeline_sweep  = True  # set the next tone while the current one is being 
+                        # processed (saved, plotted)
+list_sweep      = False # load the tones of every sweep in the rf generator 
+                        # list memory, and set them with bus triggers. The 
+                        # trigger doesn't wait for the generator to settle, 
+                        # use settle_tone with slow generators
+n_accs          = 1     # maximum number of accumulations averaged per tone 
+                        # in the calibration. Their standard error is saved
+target_err      = None  # stop averaging a tone when the relative standard
+                        # error of its ab ratio is below this value (e.g. 1e-3
+                        # ~ 0.07% in magnitude and 0.04 deg). None: n_accs
+save_rawdata    = False # if True read, save and print the full spectra of 
+                        # every tone for debugging. Otherwise only the test 
+                        # channel is read from the brams
+write_queue_len = 32    # maximum number of writes (raw data, journal tones)
+                        # waiting for the writer thread (dss_writer.py). 
+                        # When it is full the sweep waits for the disk
+print_plots     = 'report' # when to print the .pdf plots of the tones (with 
+                           # save_rawdata) and LOs: 'inline' during the 
+                           # measurements, 'post' after the measurements in 
+                           # parallel processes (dss_print_plots.py), 
+                           # 'report' a single report of the run after the
+                           # measurements (dss_report.py, it also makes the 
+                           # reports of the LOs offline), or None (offline)
+print_processes = None     # number of processes to print the plots, None: 
+                           # number of cpus
+report_format   = 'pdf'    # run reports format: 'pdf' (multipage) or 'html'
+report_dpi      = 100      # resolution of the report pages
 load_consts     = True
+fit_consts      = False # synthesize the constants of all the channels from a
+                        # model fitted to the test channels (dss_model_fit.py:
+                        # delay, phase and magnitude polynomials), so that few
+                        # tones are needed (e.g. chnl_step = 128, 16 tones)
+fit_mag_order   = 4     # order of the log magnitude polynomial of the fit
+fit_phase_order = 4     # order of the phase ripple polynomial of the fit
+fit_max_delay   = 8     # samples, maximum delay between inputs of the fit
+ab_interp       = 'linear' # interpolation of the calibration crosspower 
+                           # between the test channels, in magnitude and 
+                           # unwrapped phase: 'linear', 'cubic' or 'pchip'
+consts_interp   = None  # if not fit_consts, interpolate the constants again 
+                        # from the test channels when they are loaded 
+                        # ('linear', 'cubic' or 'pchip'). None: use the 
+                        # saved interpolation (ab_interp)
+interp_consts   = False # interpolate the constants of every LO setting from 
+                        # the calibrated LO grid (dss_interpolation.py), so 
+                        # the srr LOs don't need to be calibrated
+journal_name    = "journal" # name of the run journal file (see dss_journal.py)
+journal_setup   = None # index of the setup in a parallel run, appended to 
+                       # journal_name (set by dss_multilo_parallel.py)
 #caltar          = 'dss_cal 2020-03-24 14:09:21.tar.gz'
-caltar          = open('last_caltar.txt', 'r').read().rstrip()
+caltar          = open('last_caltar.txt', 'r').read().rstrip() \
+    if os.path.exists('last_caltar.txt') else None # None before the first
+                                                   # calibration
 show_plots      = True
 
+# parallel setups (see dss_multilo_parallel.py), each one is a roach board
+# with its own receiver and instruments. The LO grid is split between them
+parallel_setups = [
+    {"roach_ip"           : roach_ip,
+     "lo1_generator_name" : lo1_generator_name,
+     "lo2_generator_name" : lo2_generator_name,
+     "rf_generator_name"  : rf_generator_name,
+     "chopper_name"       : chopper_name}]
+
 # derivative parameters
+lo_grid       = [(lo1, lo2) for lo1 in lo1_freqs for lo2 in lo2_freqs] # GHz
 nchannels     = 2**bram_addr_width * len(bram_a2)
 if_freqs      = np.linspace(0, bandwidth, nchannels, endpoint=False) # MHz
 test_channels = range(1, nchannels, chnl_step)
@@ -99,6 +178,7 @@ sync_channels = range(1, nchannels, chnl_step_sync)
 if_test_freqs = if_freqs[test_channels] # MHz
 if_sync_freqs = if_freqs[sync_channels] # MHz
 dBFS          = 6.02*adc_bits + 1.76 + 10*np.log10(nchannels)
+acc_time      = 2*nchannels * acc_len / (2*bandwidth*1e6) # s, FFT_size*acc_len/fs
 
 # stability parameters
 stab_chnl    = 1537
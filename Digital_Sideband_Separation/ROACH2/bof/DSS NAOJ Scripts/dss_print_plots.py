@@ -0,0 +1,226 @@
+#!/usr/bin/python
+# Script to print the .pdf plots of a multi LO run (calibration, SRR or hot
+# cold) from its saved data, in parallel processes with the Agg backend. It
+# is run by the multi LO scripts after the measurements when print_plots is
+# 'post', and it can be run offline on a data directory or tarball.
+# Usage example:
+#   python dss_print_plots.py "dss_cal 2020-03-24 14:09:21.tar.gz"
+
+# imports
+import os, time, tarfile, argparse, importlib, multiprocessing
+import matplotlib.pyplot as plt
+from dss_store import RawDataStore, measname_re, get_meas_los
+from dss_journal import make_dir
+from dss_multilo_parallel import datadir_names
+from dss_multilo_parameters import *
+
+# script that printed the data of every measurement data file
+data_files = {"caldata.npz"      : "dss_calibrate_multilo",
+              "srrdata.npz"      : "dss_compute_srr_multilo",
+              "hotcold_data.npz" : "dss_hotcold_multilo"}
+
+# raw data fields of the tone spectra plots (print_spec_data) of every script
+spec_fields = {"dss_calibrate_multilo"   : ["a2", "b2"],
+               "dss_compute_srr_multilo" : ["usb", "lsb"]}
+
+def main():
+    start_time = time.time()
+
+    def print_data(rundir):
+        print("Printing data of " + rundir + "...")
+        print_run_data(rundir, args.nprocs)
+        print("done")
+    for_each_run(args.datadirs, print_data)
+
+    print("Finished. Total time: " + str(int(time.time() - start_time)) + "[s]")
+
+def for_each_run(datadirs, func):
+    """
+    Call a function with every run of a list of data directories or .tar.gz
+    files. The .tar.gz files are extracted before, and compressed again
+    after.
+    :param datadirs: list of data directories or .tar.gz files.
+    :param func: function to call, with the run directory as argument.
+    """
+    # imported here, as the script imports this module
+    from dss_calibrate_multilo import compress_data
+
+    for datadir in datadirs:
+        datadir = datadir.rstrip("/")
+        tarname = None
+        if datadir.endswith(".tar.gz"):
+            tarname, datadir = datadir, datadir[:-7]
+            print("Extracting " + tarname + "...")
+            tarfile.open(tarname).extractall(path=datadir)
+            print("done")
+
+        for rundir in get_rundirs(datadir):
+            func(rundir)
+
+        if tarname is not None:
+            print("Compressing data...")
+            compress_data(datadir)
+            print("done")
+
+def get_rundirs(datadir):
+    """
+    Get the run directories of a data directory. Experiment runs have the
+    calibration and srr runs in subdirectories.
+    :param datadir: data directory.
+    :return: list of run directories.
+    """
+    if get_measnames(datadir):
+        return [datadir]
+    return [datadir + "/" + subdir for subdir in ["cal", "srr"]
+        if os.path.isdir(datadir + "/" + subdir)]
+
+def get_measnames(datadir):
+    """
+    Get the measurements (LO settings) of a data directory.
+    :param datadir: data directory of the run.
+    :return: sorted list of measurement names.
+    """
+    return sorted([measname for measname in os.listdir(datadir)
+        if measname_re.match(measname)])
+
+def get_script_name(datadir):
+    """
+    Get the multi LO script that made a run, from its data files.
+    :param datadir: data directory of the run.
+    :return: name of the script module.
+    """
+    for measname in get_measnames(datadir):
+        for data_file, script_name in data_files.items():
+            if os.path.exists(datadir + "/" + measname + "/" + data_file):
+                return script_name
+    raise ValueError("No multi LO data found in " + datadir + ".")
+
+def parse_freq(freq):
+    """
+    Parse an LO frequency of a measurement name, so that str() gives the same
+    name again (e.g. "405" and "405.0" are different measurements).
+    :param freq: frequency string.
+    :return: int or float frequency.
+    """
+    return int(freq) if freq.isdigit() else float(freq)
+
+def get_run_jobs(datadir):
+    """
+    Get the plotting jobs of a run: the spectra of every tone (if the raw
+    data was saved), the data of every LO setting, and the data of all the
+    LOs.
+    :param datadir: data directory of the run (extracted).
+    :return: script name, lo1 and lo2 frequencies of the run (the
+        arguments of init_worker), and list of jobs (see get_job_figures).
+    """
+    script_name = get_script_name(datadir)
+    measnames = get_measnames(datadir)
+    lo_pairs = [measname_re.match(measname).groups() for measname in measnames]
+    lo1_freqs = sorted(set([parse_freq(lo1) for lo1, lo2 in lo_pairs]))
+    lo2_freqs = sorted(set([parse_freq(lo2) for lo1, lo2 in lo_pairs]))
+
+    jobs = []
+    storedir = datadir + "/rawdata"
+    if script_name in spec_fields and os.path.exists(storedir + "/index.json"):
+        store = RawDataStore(storedir)
+        for measname in measnames:
+            lo1, lo2 = get_meas_los(measname)
+            for sideband in ["usb", "lsb"]:
+                chnls = store.read_sweep(lo1, lo2, sideband)[0]
+                jobs += [("print_spec_data", measname, sideband, chnl)
+                    for chnl in chnls]
+        store.close()
+    jobs += [("print_singlelo_data", measname) for measname in measnames]
+    jobs.append(("print_multilo_data",))
+
+    return script_name, lo1_freqs, lo2_freqs, jobs
+
+def print_run_data(datadir, nprocs=None):
+    """
+    Print all the plots of a run to .pdf files. Every job is printed by a
+    process of a pool, with the plotting functions of the script that made
+    the run.
+    :param datadir: data directory of the run (extracted).
+    :param nprocs: number of processes, None for the number of cpus.
+    """
+    script_name, lo1_freqs, lo2_freqs, jobs = get_run_jobs(datadir)
+    pool = multiprocessing.Pool(nprocs, init_worker,
+        (script_name, datadir, lo1_freqs, lo2_freqs))
+    pool.map(print_job, jobs, chunksize=1)
+    pool.close()
+    pool.join()
+
+def init_worker(script_name, datadir, lo1_freqs, lo2_freqs):
+    """
+    Initialize a printing process: set the Agg backend (no window), and set
+    the data directory and LOs of the run in the script module.
+    :param script_name: name of the multi LO script module.
+    :param datadir: data directory of the run.
+    :param lo1_freqs: lo1 frequencies of the run (GHz).
+    :param lo2_freqs: lo2 frequencies of the run (GHz).
+    """
+    global script, store
+    script = importlib.import_module(script_name)
+    script.plt.switch_backend('Agg')
+    setattr(script, datadir_names[script_name], datadir)
+    script.lo1_freqs = lo1_freqs
+    script.lo2_freqs = lo2_freqs
+
+    store = None
+    if os.path.exists(datadir + "/rawdata/index.json"):
+        store = RawDataStore(datadir + "/rawdata")
+
+def get_job_figures(job):
+    """
+    Make the figures of a plotting job. Runs in a plotting process.
+    :param job: tuple with the name of the printing function of the script
+        and its arguments: ("print_spec_data", measname, sideband, chnl),
+        ("print_singlelo_data", measname) or ("print_multilo_data",).
+    :return: directory where the figures are printed, and list of (name,
+        figure) tuples.
+    """
+    datadir = getattr(script, datadir_names[script.__name__])
+    if job[0] == "print_spec_data":
+        measname, sideband, chnl = job[1:]
+        lo1, lo2 = get_meas_los(measname)
+        data = store.read(lo1, lo2, sideband, chnl)
+        return datadir + "/" + measname + "/rawdata_tone_" + sideband, \
+            script.plot_spec_data(chnl,
+                *[data[field] for field in spec_fields[script.__name__]])
+    elif job[0] == "print_singlelo_data":
+        measdir = datadir + "/" + job[1]
+        return measdir, script.plot_singlelo_data(measdir)
+    else:
+        return datadir, script.plot_multilo_data()
+
+def print_job(job):
+    """
+    Print the figures of a plotting job to .pdf files. Runs in a printing
+    process.
+    :param job: plotting job (see get_job_figures).
+    """
+    dirname, figs = get_job_figures(job)
+    make_dir(dirname)
+    save_figures(figs, dirname)
+
+def save_figures(figs, dirname):
+    """
+    Save figures to .pdf files and close them.
+    :param figs: list of (name, figure) tuples.
+    :param dirname: directory where to save the files.
+    """
+    for name, fig in figs:
+        fig.savefig(dirname + "/" + name + ".pdf")
+        plt.close(fig)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the .pdf plots of multi LO runs of the digital \
+            sideband separating receiver from their saved data.")
+    parser.add_argument("datadirs", nargs="+",
+        help="Data directories or .tar.gz files of the runs.")
+    parser.add_argument("-n", "--nprocs", dest="nprocs", type=int,
+        default=print_processes,
+        help="Number of printing processes (default: number of cpus).")
+    args = parser.parse_args()
+    main()
@@ -0,0 +1,126 @@
+# Functions to read the spectral data of the dss model with as few
+# network round trips as possible.
+
+# imports
+import os, sys
+import numpy as np
+from dss_multilo_parameters import *
+# bram readers shared with the other projects
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../../../../ROACH_Readout"))
+from roach_readout import read_brams, InterleaveReader, read_readers
+
+def read_interleave_brams(roach, bram_sets, awidth, dwidth, dtypes):
+    """
+    Read a group of interleaved bram sets in a single batch of pipelined
+    requests. Equivalent to calling cd.read_interleave_data for each
+    set of brams, but all brams are requested at the same time.
+    The returned arrays are new, use read_readers with InterleaveReader 
+    objects to reuse the output arrays in repeated reads.
+    :param roach: FpgaClient object to communicate with roach.
+    :param bram_sets: list of lists of bram names. Each list is a set of
+        brams that are interleaved into a single spectrum.
+    :param awidth: width of bram address in bits.
+    :param dwidth: width of bram data in bits.
+    :param dtypes: list of data types, one per bram set.
+    :return: list of interleaved data arrays, one per bram set.
+    """
+    readers = [InterleaveReader(brams, awidth, dwidth, dtype) 
+        for brams, dtype in zip(bram_sets, dtypes)]
+    return read_readers(roach, readers)
+
+def get_chnl_addrs(chnls, brams):
+    """
+    Map spectral channels to their position in a set of interleaved brams.
+    Channel i is stored in bram i % len(brams) at word address 
+    i // len(brams).
+    :param chnls: list of channel indices.
+    :param brams: list of interleaved bram names.
+    :return: list of (bram name, word address) tuples.
+    """
+    nbrams = len(brams)
+    return [(brams[chnl % nbrams], chnl // nbrams) for chnl in chnls]
+
+def read_sparse_brams(roach, bram_sets, chnls, dwidth, dtypes):
+    """
+    Read only the words of the given channels from a group of interleaved
+    bram sets, in a single batch of pipelined requests.
+    :param roach: FpgaClient object to communicate with roach.
+    :param bram_sets: list of lists of bram names. Each list is a set of
+        brams that are interleaved into a single spectrum.
+    :param chnls: list of channel indices to read.
+    :param dwidth: width of bram data in bits.
+    :param dtypes: list of data types, one per bram set.
+    :return: list of data arrays (one value per channel), one per bram set.
+    """
+    wordbytes = dwidth // 8
+    reads = [(bram, wordbytes, addr*wordbytes) for brams in bram_sets 
+        for bram, addr in get_chnl_addrs(chnls, brams)]
+    rawdata_list = read_brams(roach, reads)
+
+    data_list = []
+    for dtype in dtypes:
+        rawdata_set  = rawdata_list[:len(chnls)]
+        rawdata_list = rawdata_list[len(chnls):]
+        data = np.frombuffer(b''.join(rawdata_set), dtype=dtype).astype(np.float64)
+        data_list.append(data)
+
+    return data_list
+
+def read_caldata(roach):
+    """
+    Read the calibration data of the model (power of both inputs and
+    the crosspower) in one call. The a2 and b2 arrays are overwritten by 
+    the next call.
+    :param roach: FpgaClient object to communicate with roach.
+    :return: a2, b2 and complex ab data arrays.
+    """
+    a2, b2, ab_re, ab_im = read_readers(roach, caldata_readers)
+
+    return a2, b2, ab_re + 1j*ab_im
+
+def read_srrdata(roach):
+    """
+    Read the synthesized data of the model (power of usb and lsb outputs)
+    in one call. The arrays are overwritten by the next call.
+    :param roach: FpgaClient object to communicate with roach.
+    :return: usb and lsb data arrays.
+    """
+    usb, lsb = read_readers(roach, srrdata_readers)
+
+    return usb, lsb
+
+def read_sparse_caldata(roach, chnls):
+    """
+    Read the calibration data of the model only at the given channels.
+    :param roach: FpgaClient object to communicate with roach.
+    :param chnls: list of channel indices to read.
+    :return: a2, b2 and complex ab data arrays (one value per channel).
+    """
+    a2, b2, ab_re, ab_im = read_sparse_brams(roach,
+        [bram_a2, bram_b2, bram_ab_re, bram_ab_im], chnls, bram_word_width,
+        [pow_data_type, pow_data_type, crosspow_data_type, crosspow_data_type])
+
+    return a2, b2, ab_re + 1j*ab_im
+
+def read_sparse_srrdata(roach, chnls):
+    """
+    Read the synthesized data of the model only at the given channels.
+    :param roach: FpgaClient object to communicate with roach.
+    :param chnls: list of channel indices to read.
+    :return: usb and lsb data arrays (one value per channel).
+    """
+    usb, lsb = read_sparse_brams(roach, [bram_usb, bram_lsb], chnls, 
+        bram_word_width, [pow_data_type, pow_data_type])
+
+    return usb, lsb
+
+# readers of the calibration and synthesized data
+caldata_readers = [
+    InterleaveReader(bram_a2,    bram_addr_width, bram_word_width, pow_data_type),
+    InterleaveReader(bram_b2,    bram_addr_width, bram_word_width, pow_data_type),
+    InterleaveReader(bram_ab_re, bram_addr_width, bram_word_width, crosspow_data_type),
+    InterleaveReader(bram_ab_im, bram_addr_width, bram_word_width, crosspow_data_type)]
+srrdata_readers = [
+    InterleaveReader(bram_usb,   bram_addr_width, bram_word_width, pow_data_type),
+    InterleaveReader(bram_lsb,   bram_addr_width, bram_word_width, pow_data_type)]
@@ -0,0 +1,294 @@
+#!/usr/bin/python
+# Reports of the multi LO runs. Instead of one .pdf file per plot, the plots
+# of a run are gathered in a report of the run (data of all the LOs and of
+# every LO setting), and optionally in a report per LO setting (its data and
+# the spectra of every tone, from the raw data store). A report is a
+# multipage .pdf file or an .html page with embedded .png images. The pages
+# are rendered as .png only when a report needs them, in parallel processes
+# (see dss_print_plots.py), and cached in the report_cache.npz file of the
+# run, so the reports of other LO settings or formats are quick to make. The
+# cache is discarded when the data files of the run change, and it is
+# removed before the run is compressed, so the archives don't store every
+# page twice.
+# Usage examples:
+#   python dss_report.py "dss_cal 2020-03-24 14:09:21.tar.gz"
+#   python dss_report.py "dss_cal 2020-03-24 14:09:21" -f html \
+#       --lo lo1_405ghz_lo2_4ghz
+
+# imports
+import os, io, glob, time, base64, hashlib, argparse, multiprocessing
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+import dss_print_plots as pp
+from dss_multilo_parameters import *
+
+cache_name = "report_cache.npz"
+
+def main():
+    start_time = time.time()
+
+    def make_reports(rundir, keep_cache):
+        print("Making reports of " + rundir + "...")
+        report = RunReport(rundir, args.nprocs)
+        report.write_run_report(args.format)
+        measnames = report.measnames if args.all_los else args.los
+        for measname in measnames:
+            if measname in report.measnames:
+                report.write_lo_report(measname, args.format)
+        if not keep_cache:
+            report.clear_cache()
+        print("done")
+
+    for datadir in args.datadirs:
+        # the cache is kept only in extracted directories, the .tar.gz
+        # files are compressed again after the reports
+        keep_cache = not datadir.rstrip("/").endswith(".tar.gz")
+        pp.for_each_run([datadir],
+            lambda rundir: make_reports(rundir, keep_cache))
+
+    print("Finished. Total time: " + str(int(time.time() - start_time)) + "[s]")
+
+class RunReport():
+    """
+    Pages of the plots of a run, rendered on demand and cached. Every
+    plotting job of the run (see get_job_figures of dss_print_plots.py) gives
+    one page per figure.
+    """
+    def __init__(self, datadir, nprocs=None):
+        """
+        :param datadir: data directory of the run (extracted).
+        :param nprocs: number of rendering processes, None for the number of
+            cpus.
+        """
+        self.datadir = datadir
+        self.nprocs  = nprocs
+        self.script_name, self.lo1_freqs, self.lo2_freqs, self.jobs = \
+            pp.get_run_jobs(datadir)
+        self.measnames = pp.get_measnames(datadir)
+        self.data_key  = get_data_key(datadir)
+        self.cache = load_cache(datadir + "/" + cache_name, self.data_key)
+
+    def get_pages(self, jobs):
+        """
+        Get the pages of plotting jobs. The jobs that are not in the cache
+        are rendered, and the cache is saved.
+        :param jobs: list of plotting jobs.
+        :return: list of (title, png data) pages.
+        """
+        missing = [job for job in jobs if get_job_key(job) not in self.cache]
+        if missing:
+            pool = multiprocessing.Pool(self.nprocs, pp.init_worker,
+                (self.script_name, self.datadir, self.lo1_freqs, self.lo2_freqs))
+            rendered = pool.map(render_job, missing, chunksize=1)
+            pool.close()
+            pool.join()
+            for job, pages in zip(missing, rendered):
+                self.cache[get_job_key(job)] = pages
+            save_cache(self.datadir + "/" + cache_name, self.cache,
+                self.data_key)
+
+        pages = []
+        for job in jobs:
+            pages += [(get_page_title(job, name), png)
+                for name, png in self.cache[get_job_key(job)]]
+        return pages
+
+    def clear_cache(self):
+        """
+        Remove the cache file of the run (the pages stay in memory).
+        """
+        if os.path.exists(self.datadir + "/" + cache_name):
+            os.remove(self.datadir + "/" + cache_name)
+
+    def write_run_report(self, fmt='pdf'):
+        """
+        Write the report of the run: the data of all the LOs, and the data of
+        every LO setting.
+        :param fmt: 'pdf' or 'html'.
+        """
+        jobs = [job for job in self.jobs if job[0] != "print_spec_data"]
+        write_report(self.datadir + "/report." + fmt, self.get_pages(jobs),
+            os.path.basename(self.datadir))
+
+    def write_lo_report(self, measname, fmt='pdf'):
+        """
+        Write the report of an LO setting: its data, and the spectra of every
+        tone if the raw data was saved.
+        :param measname: name of the measurement (LO setting).
+        :param fmt: 'pdf' or 'html'.
+        """
+        jobs = [job for job in self.jobs if len(job) > 1 and job[1] == measname]
+        write_report(self.datadir + "/" + measname + "/report." + fmt,
+            self.get_pages(jobs), os.path.basename(self.datadir) + " " + measname)
+
+def render_job(job):
+    """
+    Render the figures of a plotting job as .png images. Runs in a rendering
+    process.
+    :param job: plotting job (see get_job_figures of dss_print_plots.py).
+    :return: list of (name, png data) tuples.
+    """
+    pages = []
+    for name, fig in pp.get_job_figures(job)[1]:
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=report_dpi)
+        plt.close(fig)
+        pages.append((name, buf.getvalue()))
+    return pages
+
+def get_job_key(job):
+    """
+    :param job: plotting job.
+    :return: key of the job in the cache.
+    """
+    return "|".join([str(arg) for arg in job])
+
+def get_page_title(job, name):
+    """
+    :param job: plotting job.
+    :param name: name of the figure.
+    :return: title of the page of a figure.
+    """
+    if job[0] == "print_spec_data":
+        return job[1] + " tone " + job[2].upper() + ": " + name
+    elif job[0] == "print_singlelo_data":
+        return job[1] + ": " + name
+    else:
+        return "All LOs: " + name
+
+def get_data_key(datadir):
+    """
+    Get a key of the state of the data files of a run (measurement data
+    and raw data store), from their names, sizes and modification times.
+    :param datadir: data directory of the run.
+    :return: key string, it changes when any data file changes.
+    """
+    filenames = [datadir + "/" + measname + "/" + data_file
+        for measname in pp.get_measnames(datadir) for data_file in pp.data_files]
+    filenames += glob.glob(datadir + "/rawdata/*")
+    stats = [(filename[len(datadir):], os.path.getsize(filename),
+        int(os.path.getmtime(filename))) for filename in sorted(filenames)
+        if os.path.exists(filename)]
+    return hashlib.md5(str(stats).encode()).hexdigest()
+
+def load_cache(filename, data_key):
+    """
+    Load the page cache of a run. The cache is discarded if it was made with
+    other data.
+    :param filename: cache file.
+    :param data_key: key of the current data of the run (see get_data_key).
+    :return: dictionary with the list of (name, png data) pages of every
+        job key.
+    """
+    cache = {}
+    if not os.path.exists(filename):
+        return cache
+    with np.load(filename) as cachedata:
+        if "data_key" not in cachedata.files or \
+            str(cachedata["data_key"]) != data_key:
+            return cache
+        # entries are saved as "job key#page number#figure name"
+        for entry in cachedata.files:
+            if entry == "data_key":
+                continue
+            key, i, name = entry.rsplit("#", 2)
+            cache.setdefault(key, []).append((int(i), name,
+                cachedata[entry].tobytes()))
+    for key in cache:
+        cache[key] = [(name, png) for i, name, png in sorted(cache[key])]
+    return cache
+
+def save_cache(filename, cache, data_key):
+    """
+    Save the page cache of a run.
+    :param filename: cache file.
+    :param cache: dictionary with the list of (name, png data) pages of
+        every job key.
+    :param data_key: key of the data of the run (see get_data_key).
+    """
+    cachedata = {"data_key" : np.array(data_key)}
+    for key, pages in cache.items():
+        for i, (name, png) in enumerate(pages):
+            cachedata[key + "#" + str(i) + "#" + name] = \
+                np.frombuffer(png, dtype=np.uint8)
+    tmpname = filename[:-4] + "_tmp.npz"
+    np.savez(tmpname, **cachedata)
+    getattr(os, 'replace', os.rename)(tmpname, filename)
+
+def write_report(filename, pages, title):
+    """
+    Write a report file.
+    :param filename: report file, .pdf or .html.
+    :param pages: list of (title, png data) pages.
+    :param title: title of the report.
+    """
+    if filename.endswith(".html"):
+        write_html_report(filename, pages, title)
+    else:
+        write_pdf_report(filename, pages)
+
+def write_pdf_report(filename, pages):
+    """
+    Write a multipage .pdf report, one image per page with its title. The
+    pages are not pyplot figures, so no window is opened in the scripts.
+    :param filename: report file.
+    :param pages: list of (title, png data) pages.
+    """
+    with PdfPages(filename) as pdf:
+        for title, png in pages:
+            image = plt.imread(io.BytesIO(png), format='png')
+            height, width = image.shape[:2]
+            fig = Figure(figsize=(width/float(report_dpi),
+                height/float(report_dpi) + 0.4))
+            fig.figimage(image)
+            fig.text(0.5, 0.99, title, ha='center', va='top')
+            pdf.savefig(fig, dpi=report_dpi)
+
+def write_html_report(filename, pages, title):
+    """
+    Write an .html report, with the images embedded as thumbnails.
+    :param filename: report file.
+    :param pages: list of (title, png data) pages.
+    :param title: title of the report.
+    """
+    with open(filename, "w") as f:
+        f.write("<html>\n<head><title>" + title + "</title></head>\n<body>\n")
+        f.write("<h1>" + title + "</h1>\n")
+        for page_title, png in pages:
+            f.write('<figure style="display:inline-block; width:32%; margin:0">')
+            f.write('<img style="width:100%" src="data:image/png;base64,' +
+                base64.b64encode(png).decode('ascii') + '"/>')
+            f.write("<figcaption>" + page_title + "</figcaption></figure>\n")
+        f.write("</body>\n</html>\n")
+
+def make_run_report(datadir):
+    """
+    Make the report of a run in report_format, used by the multi LO scripts
+    after the measurements when print_plots is 'report'. The cache is
+    removed, as the run is compressed next.
+    :param datadir: data directory of the run.
+    """
+    report = RunReport(datadir, print_processes)
+    report.write_run_report(report_format)
+    report.clear_cache()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Make the reports of multi LO runs of the digital \
+            sideband separating receiver from their saved data.")
+    parser.add_argument("datadirs", nargs="+",
+        help="Data directories or .tar.gz files of the runs.")
+    parser.add_argument("-f", "--format", dest="format", default=report_format,
+        choices=["pdf", "html"], help="Format of the reports.")
+    parser.add_argument("--lo", dest="los", action="append", default=[],
+        help="Also make the report of this LO setting (measurement name, e.g. \
+            lo1_405ghz_lo2_4ghz). Can be repeated.")
+    parser.add_argument("--all-los", dest="all_los", action="store_true",
+        help="Also make the reports of all the LO settings.")
+    parser.add_argument("-n", "--nprocs", dest="nprocs", type=int,
+        default=print_processes,
+        help="Number of rendering processes (default: number of cpus).")
+    args = parser.parse_args()
+    main()
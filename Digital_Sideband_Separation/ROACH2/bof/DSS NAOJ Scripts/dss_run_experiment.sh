@@ -1,3 +1,5 @@
 #!/bin/bash
 ./dss_calibrate_multilo.py
 ./dss_compute_srr_multilo.py
+# or both in a single pass over the LOs (one data file, no calibration tarball):
+#./dss_experiment_multilo.py
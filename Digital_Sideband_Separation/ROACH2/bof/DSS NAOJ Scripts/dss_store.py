@@ -0,0 +1,249 @@
+#!/usr/bin/python
+# Raw data store of the multi LO measurements. Instead of one .npz file per
+# tone (rawdata_tone_{usb,lsb}/chnl_N.npz), the full spectra of all the tones
+# of a run are saved in a single directory, with one preallocated .npy file
+# per field indexed by (lo1, lo2, sideband, tone, channel). The files are
+# memory mapped and every tone is written in place, so no file is created
+# during the measurements. Old data directories can be converted with:
+#   python dss_store.py -d "dss_cal 2020-03-24 14:09:21"
+
+# imports
+import os, re, json, glob, argparse
+import numpy as np
+
+sidebands   = ["usb", "lsb"]
+measname_re = re.compile(r'^lo1_(.+)ghz_lo2_(.+)ghz$')
+chnlfile_re = re.compile(r'^chnl_(\d+)\.npz$')
+
+class RawDataStore():
+    """
+    Store of the full spectra measured for every tone of a run. It is a
+    directory with an index.json file (LO frequencies, tone channels and
+    fields), one float64 .npy file per field with shape (lo1, lo2, sideband,
+    tone, channel), and a written.npy file that marks the stored tones.
+    Different processes (e.g. parallel setups) can write different tones of
+    the same store at the same time.
+    """
+    def __init__(self, storedir, fields=None, lo1_freqs=None, lo2_freqs=None,
+        chnls=None, nchannels=None):
+        """
+        Open a store, or create it if it doesn't exist. The space of all the
+        tones is allocated at creation (as sparse files where supported).
+        :param storedir: directory of the store.
+        :param fields: names of the data arrays of every tone (e.g. ["usb",
+            "lsb"]). Only needed to create the store.
+        :param lo1_freqs: lo1 frequencies of the run (GHz). Only needed to
+            create the store.
+        :param lo2_freqs: lo2 frequencies of the run (GHz). Only needed to
+            create the store.
+        :param chnls: channels of the tones of every sweep. Only needed to
+            create the store.
+        :param nchannels: number of channels of the spectra. Only needed to
+            create the store.
+        """
+        self.storedir = storedir
+        indexname = storedir + "/index.json"
+        if not os.path.exists(indexname):
+            create_store(storedir, fields, lo1_freqs, lo2_freqs, chnls,
+                nchannels)
+
+        with open(indexname, "r") as f:
+            index = json.load(f)
+        self.fields    = index["fields"]
+        self.lo1_freqs = np.array(index["lo1 freqs ghz"])
+        self.lo2_freqs = np.array(index["lo2 freqs ghz"])
+        self.chnls     = list(index["chnls"])
+        self.nchannels = index["nchannels"]
+
+        self.data = {}
+        for field in self.fields:
+            self.data[field] = np.lib.format.open_memmap(
+                storedir + "/" + field + ".npy", mode="r+")
+        self.written = np.lib.format.open_memmap(storedir + "/written.npy",
+            mode="r+")
+
+    def get_index(self, lo1, lo2, sideband, chnl):
+        """
+        Get the position of a tone in the store arrays.
+        :param lo1: lo1 frequency (GHz).
+        :param lo2: lo2 frequency (GHz).
+        :param sideband: sideband of the tone, "usb" or "lsb".
+        :param chnl: channel of the tone.
+        :return: (lo1, lo2, sideband, tone) index tuple.
+        """
+        i = get_freq_index(self.lo1_freqs, lo1)
+        j = get_freq_index(self.lo2_freqs, lo2)
+        return i, j, sidebands.index(sideband.lower()), self.chnls.index(chnl)
+
+    def write(self, lo1, lo2, sideband, chnl, data):
+        """
+        Write the spectra of a tone in place.
+        :param lo1: lo1 frequency (GHz).
+        :param lo2: lo2 frequency (GHz).
+        :param sideband: sideband of the tone, "usb" or "lsb".
+        :param chnl: channel of the tone.
+        :param data: dictionary with one spectrum per field.
+        """
+        index = self.get_index(lo1, lo2, sideband, chnl)
+        for field in self.fields:
+            self.data[field][index] = data[field]
+        self.written[index] = True
+
+    def read(self, lo1, lo2, sideband, chnl):
+        """
+        Read the spectra of a tone.
+        :param lo1: lo1 frequency (GHz).
+        :param lo2: lo2 frequency (GHz).
+        :param sideband: sideband of the tone, "usb" or "lsb".
+        :param chnl: channel of the tone.
+        :return: dictionary with one spectrum per field (memory mapped, copy
+            them to keep them after the store is closed).
+        """
+        index = self.get_index(lo1, lo2, sideband, chnl)
+        if not self.written[index]:
+            raise ValueError("Tone in channel " + str(chnl) + " (" + sideband +
+                ") of LO1:" + str(lo1) + "GHz, LO2:" + str(lo2) + "GHz " +
+                "is not in the store.")
+        return dict([(field, self.data[field][index]) for field in self.fields])
+
+    def read_sweep(self, lo1, lo2, sideband):
+        """
+        Read the spectra of all the tones of a sweep.
+        :param lo1: lo1 frequency (GHz).
+        :param lo2: lo2 frequency (GHz).
+        :param sideband: sideband of the sweep, "usb" or "lsb".
+        :return: list of the channels of the stored tones, and dictionary
+            with a (tone, channel) array per field.
+        """
+        i, j, s, t = self.get_index(lo1, lo2, sideband, self.chnls[0])
+        stored = np.where(self.written[i, j, s])[0]
+        chnls = [self.chnls[t] for t in stored]
+        return chnls, dict([(field, self.data[field][i, j, s][stored])
+            for field in self.fields])
+
+    def flush(self):
+        """
+        Write the modified data to disk.
+        """
+        for field in self.fields:
+            self.data[field].flush()
+        self.written.flush()
+
+    def close(self):
+        """
+        Flush and close the store.
+        """
+        self.flush()
+        self.data = {}
+        self.written = None
+
+def create_store(storedir, fields, lo1_freqs, lo2_freqs, chnls, nchannels):
+    """
+    Create the files of an empty store. The index is written last, so a store
+    is complete if it has an index.
+    :param storedir: directory of the store.
+    :param fields: names of the data arrays of every tone.
+    :param lo1_freqs: lo1 frequencies (GHz).
+    :param lo2_freqs: lo2 frequencies (GHz).
+    :param chnls: channels of the tones of every sweep.
+    :param nchannels: number of channels of the spectra.
+    """
+    if not os.path.exists(storedir):
+        os.mkdir(storedir)
+    shape = (len(lo1_freqs), len(lo2_freqs), len(sidebands), len(chnls))
+    for field in fields:
+        np.lib.format.open_memmap(storedir + "/" + field + ".npy", mode="w+",
+            dtype=np.float64, shape=shape + (nchannels,)).flush()
+    np.lib.format.open_memmap(storedir + "/written.npy", mode="w+",
+        dtype=np.bool_, shape=shape).flush()
+
+    index = {}
+    index["fields"]        = list(fields)
+    index["lo1 freqs ghz"] = [float(freq) for freq in lo1_freqs]
+    index["lo2 freqs ghz"] = [float(freq) for freq in lo2_freqs]
+    index["chnls"]         = [int(chnl) for chnl in chnls]
+    index["nchannels"]     = int(nchannels)
+    tmpname = storedir + "/index.json.tmp"
+    with open(tmpname, "w") as f:
+        json.dump(index, f, indent=4, sort_keys=True)
+    getattr(os, 'replace', os.rename)(tmpname, storedir + "/index.json")
+
+def get_freq_index(freqs, freq):
+    """
+    Get the index of a frequency in the frequencies of a store.
+    :param freqs: array of frequencies of the store (GHz).
+    :param freq: frequency to find (GHz).
+    :return: index of the frequency.
+    """
+    i = np.argmin(np.abs(freqs - freq))
+    if not np.isclose(freqs[i], freq):
+        raise ValueError("LO frequency " + str(freq) + "GHz is not in the " +
+            "store (" + str(list(freqs)) + ").")
+    return i
+
+def get_meas_los(measname):
+    """
+    Get the LO frequencies of a measurement from its name.
+    :param measname: name of the measurement (lo1_*ghz_lo2_*ghz).
+    :return: lo1 and lo2 frequencies (GHz).
+    """
+    match = measname_re.match(measname)
+    return float(match.group(1)), float(match.group(2))
+
+def convert_rawdata(datadir, remove=False):
+    """
+    Convert the raw data of a data directory with the old layout (one .npz
+    file per tone in lo1_*ghz_lo2_*ghz/rawdata_tone_{usb,lsb}) into a store
+    in datadir/rawdata.
+    :param datadir: data directory of the run (extracted).
+    :param remove: if True remove the .npz files after the conversion.
+    :return: RawDataStore object with the converted data.
+    """
+    # find the tone files
+    tonefiles = []
+    for measname in sorted(os.listdir(datadir)):
+        if measname_re.match(measname) is None:
+            continue
+        lo1, lo2 = get_meas_los(measname)
+        for sideband in sidebands:
+            rawdata_dir = datadir + "/" + measname + "/rawdata_tone_" + sideband
+            for filename in glob.glob(rawdata_dir + "/chnl_*.npz"):
+                chnl = int(chnlfile_re.match(os.path.basename(filename)).group(1))
+                tonefiles.append((lo1, lo2, sideband, chnl, filename))
+    if not tonefiles:
+        raise ValueError("No raw data found in " + datadir + ".")
+
+    # create the store with the layout of the files
+    with np.load(tonefiles[0][-1]) as tonedata:
+        fields    = sorted(tonedata.files)
+        nchannels = len(tonedata[fields[0]])
+    store = RawDataStore(datadir + "/rawdata", fields,
+        sorted(set([tone[0] for tone in tonefiles])),
+        sorted(set([tone[1] for tone in tonefiles])),
+        sorted(set([tone[3] for tone in tonefiles])), nchannels)
+
+    for lo1, lo2, sideband, chnl, filename in tonefiles:
+        with np.load(filename) as tonedata:
+            store.write(lo1, lo2, sideband, chnl, tonedata)
+    store.flush()
+
+    if remove:
+        for tonefile in tonefiles:
+            os.remove(tonefile[-1])
+
+    return store
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Convert the per tone raw data files of a multi LO run \
+            into a single raw data store.")
+    parser.add_argument("-d", "--datadir", dest="datadir", required=True,
+        help="Data directory of the run (extracted).")
+    parser.add_argument("--remove", dest="remove", action="store_true",
+        help="Remove the per tone .npz files after the conversion.")
+    args = parser.parse_args()
+
+    store = convert_rawdata(args.datadir.rstrip("/"), args.remove)
+    print("Converted " + str(int(np.sum(store.written))) + " tones into " +
+        store.storedir + ".")
+    store.close()
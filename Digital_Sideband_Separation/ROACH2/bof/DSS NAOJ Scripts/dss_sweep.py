@@ -0,0 +1,107 @@
+# Functions to perform tone sweeps with the dss model.
+
+# imports
+from multiprocessing.pool import ThreadPool
+from dss_multilo_parameters import *
+
+def sweep_tones(chnls, set_tone, read_tone, process_tone):
+    """
+    Sweep a tone through a list of channels. For each channel the tone is
+    set with set_tone(chnl), the data is read with read_tone(chnl, tone_info)
+    where tone_info is the value returned by set_tone, and the data is
+    processed (saved, plotted, etc.) with process_tone(i, chnl, data).
+    If pipeline_sweep is True, the tone of the next channel is set in a
+    background thread while the data of the current channel is processed,
+    so the processing overlaps with the generator retune and settling.
+    process_tone is always called from the calling thread and in the same
+    order as chnls, so the results are the same as in the sequential sweep.
+    :param chnls: list of channels where to inject the tone.
+    :param set_tone: function to set the tone in a channel.
+    :param read_tone: function to read the data once the tone is set.
+    :param process_tone: function to process the data of a tone.
+    """
+    if not pipeline_sweep:
+        for i, chnl in enumerate(chnls):
+            tone_info = set_tone(chnl)
+            data = read_tone(chnl, tone_info)
+            process_tone(i, chnl, data)
+        return
+
+    pool = ThreadPool(1)
+    try:
+        prev_tone = None
+        for i, chnl in enumerate(chnls):
+            tone_result = pool.apply_async(set_tone, (chnl,))
+            if prev_tone is not None:
+                process_tone(*prev_tone)
+            data = read_tone(chnl, tone_result.get())
+            prev_tone = (i, chnl, data)
+        if prev_tone is not None:
+            process_tone(*prev_tone)
+    finally:
+        pool.close()
+        pool.join()
+
+class ListSweep():
+    """
+    Tone frequencies of a sweep loaded in the list sweep memory of the signal
+    generator. The list is uploaded once, and every tone is set with a bus
+    trigger (*TRG), so the generator doesn't parse and relock to a new
+    frequency command for every tone. The tones must be set in the order of
+    the list. The last tone is set as a CW frequency, so the generator is
+    left in CW mode at the end of the sweep.
+    """
+    def __init__(self, generator, freqs):
+        """
+        :param generator: pyvisa resource of the signal generator.
+        :param freqs: list of tone frequencies in order (GHz).
+        """
+        self.generator = generator
+        self.freqs     = list(freqs)
+        self.index     = 0
+
+        freq_list = ",".join([repr(float(freq)*1e9) for freq in self.freqs])
+        generator.write("list:type list")
+        generator.write("list:freq " + freq_list)
+        generator.write("list:trig:sour bus")
+        generator.write("trig:sour imm")
+        generator.write("init:cont off")
+        generator.ask("freq:mode list; *opc?")
+
+    def next_tone(self):
+        """
+        Set the next tone of the list.
+        """
+        if self.index == len(self.freqs)-1:
+            self.generator.ask("freq " + str(self.freqs[-1]) + " ghz; " +
+                "freq:mode cw; *opc?")
+        elif self.index == 0:
+            self.generator.write("init")
+        else:
+            self.generator.write("*trg")
+        self.index += 1
+
+def get_freq_setter(generator, freqs, chnls):
+    """
+    Get the function to set the tone frequency of the channels of a sweep.
+    If list_sweep is True the frequencies are loaded in the generator list
+    memory (see ListSweep), and the channels must be set in order. 
+    Otherwise every frequency is set with a frequency command.
+    :param generator: pyvisa resource of the signal generator.
+    :param freqs: array of tone frequencies of every channel (GHz).
+    :param chnls: list of channels of the sweep, in order.
+    :return: function set_freq(chnl).
+    """
+    if not list_sweep or len(chnls) < 2:
+        def set_freq(chnl):
+            generator.ask("freq " + str(freqs[chnl]) + " ghz; *opc?")
+        return set_freq
+
+    chnls = list(chnls)
+    list_sweep_freqs = ListSweep(generator, [freqs[chnl] for chnl in chnls])
+    def set_freq(chnl):
+        if chnl != chnls[list_sweep_freqs.index]:
+            raise RuntimeError("Channel " + str(chnl) + " set out of the " +
+                "list sweep order.")
+        list_sweep_freqs.next_tone()
+    return set_freq
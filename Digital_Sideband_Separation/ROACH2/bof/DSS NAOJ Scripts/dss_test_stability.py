@@ -8,6 +8,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import calandigital as cd
 from dss_load_constants import dss_load_constants
+from dss_readout import read_readers, caldata_readers, srrdata_readers
+from dss_accumulation import wait_new_acc
+from dss_instrument import CachedInstrument
 from dss_multilo_parameters import *
 
 def main():
@@ -27,9 +30,9 @@ def make_pre_measurements_actions():
     global roach, rf_generator, lo1_generator, lo2_generator, fig, lines, axes
 
     roach = cd.initialize_roach(roach_ip)
-    lo1_generator = rm.open_resource(lo1_generator_name)
-    lo2_generator = rm.open_resource(lo2_generator_name)
-    rf_generator  = rm.open_resource(rf_generator_name)
+    lo1_generator = CachedInstrument(rm.open_resource(lo1_generator_name))
+    lo2_generator = CachedInstrument(rm.open_resource(lo2_generator_name))
+    rf_generator  = CachedInstrument(rm.open_resource(rf_generator_name))
 
     print("Setting up plotting and data saving elements...")
     if show_plots:
@@ -68,7 +71,7 @@ def make_dss_stability_measurements():
 
     freq = rf_freqs_usb[stab_chnl]
     rf_generator.ask("freq " + str(freq) + " ghz; *opc?")
-    time.sleep(pause_time)
+    wait_new_acc(roach)
 
     # load constants
     measname = "lo1_" + str(lo1_freq) + "ghz_lo2_" + \
@@ -187,23 +190,12 @@ def plot_stability_data():
     
     try:
         while True:
-            time.sleep(pause_time)
+            wait_new_acc(roach, nacc=1)
             time_arr.append(time.time()- start_time)
             # read cal data
-            a2    = cd.read_interleave_data(roach, bram_a2,    bram_addr_width, 
-                                            bram_word_width,   pow_data_type)
-            b2    = cd.read_interleave_data(roach, bram_b2,    bram_addr_width, 
-                                            bram_word_width,   pow_data_type)
-            ab_re = cd.read_interleave_data(roach, bram_ab_re, bram_addr_width, 
-                                            bram_word_width,   crosspow_data_type)
-            ab_im = cd.read_interleave_data(roach, bram_ab_im, bram_addr_width, 
-                                            bram_word_width,   crosspow_data_type)
-            
-            # read syn data
-            usb = cd.read_interleave_data(roach, bram_usb, bram_addr_width, 
-                                          bram_word_width, pow_data_type)
-            lsb = cd.read_interleave_data(roach, bram_lsb, bram_addr_width, 
-                                          bram_word_width, pow_data_type)
+            # read cal and syn data
+            a2, b2, ab_re, ab_im, usb, lsb = read_readers(roach,
+                caldata_readers + srrdata_readers)
 
             # scale and dBFS data for plotting
             a2_plot = cd.scale_and_dBFS_specdata(a2, acc_len, dBFS)
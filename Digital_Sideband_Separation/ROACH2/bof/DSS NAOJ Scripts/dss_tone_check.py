@@ -0,0 +1,26 @@
+# Check of the test tone of successive accumulations, to detect when it has
+# settled after a frequency change. It doesn't import the parameters, so it
+# is shared by the multi LO and the single LO scripts.
+
+# imports
+import numpy as np
+
+def is_tone_settled(prev_tone, tone, pow_tol, ang_tol):
+    """
+    Check if the tone values of two successive accumulations agree within
+    pow_tol (relative) in magnitude, and ang_tol (degrees) in angle. A zero
+    value (e.g. an empty channel) is settled only if the other value is zero
+    too, instead of giving nan differences that never settle.
+    :param prev_tone: complex tone value of the previous accumulation.
+    :param tone: complex tone value of the current accumulation.
+    :param pow_tol: relative magnitude difference to consider the tone settled.
+    :param ang_tol: angle difference [deg] to consider the tone settled.
+    :return: True if the tone is settled.
+    """
+    prev_mag = np.abs(prev_tone)
+    mag      = np.abs(tone)
+    if prev_mag == 0 or mag == 0:
+        return prev_mag == mag
+    pow_diff = np.abs(mag - prev_mag) / prev_mag
+    ang_diff = np.abs(np.angle(tone / prev_tone, deg=True))
+    return pow_diff <= pow_tol and ang_diff <= ang_tol
@@ -0,0 +1,82 @@
+# Background writer of the measurement data. The tone sweeps put the writes
+# of every tone (raw data store, run journal) in a bounded queue, and a
+# single thread does them in order, so the sweep doesn't wait for the disk.
+# The queue is emptied at the end of every LO setting, before the
+# measurement is recorded as finished in the journal.
+
+# imports
+import os, threading
+import numpy as np
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+class AsyncWriter():
+    """
+    Thread that makes the writes submitted to its queue, in the same order.
+    When the queue is full submit blocks until there is space, so a slow
+    disk slows down the sweep instead of filling the memory. An exception
+    in a write is raised again in the next submit or flush.
+    """
+    def __init__(self, maxsize):
+        """
+        :param maxsize: maximum number of pending writes.
+        """
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """
+        Make the writes of the queue. Runs in the writer thread.
+        """
+        while True:
+            func, args = self.queue.get()
+            try:
+                if self.error is None: # skip the writes after an error
+                    func(*args)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check_error(self):
+        """
+        Raise the exception of a failed write, if any.
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, func, *args):
+        """
+        Queue a write. The arrays of the arguments are not copied, they must
+        not be modified after they are submitted.
+        :param func: function that makes the write.
+        :param args: arguments of func.
+        """
+        self.check_error()
+        self.queue.put((func, args))
+
+    def flush(self):
+        """
+        Wait until all the queued writes are done.
+        """
+        self.queue.join()
+        self.check_error()
+
+def save_npz(filename, data):
+    """
+    Save arrays in a .npz file, and wait until the file is on disk (fsync),
+    so that it is not lost if the computer fails after the measurement is
+    recorded as finished.
+    :param filename: name of the file (without extension).
+    :param data: dictionary with the arrays to save.
+    """
+    with open(filename + ".npz", "wb") as f:
+        np.savez(f, **data)
+        f.flush()
+        os.fsync(f.fileno())
@@ -6,6 +6,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import scipy.stats
 import calandigital as cd
+from dss_readout import read_caldata
+from dss_accumulation import wait_new_acc
+from dss_instrument import CachedInstrument
 from dss_multilo_parameters import *
 
 def main():
@@ -28,9 +31,9 @@ def make_pre_measurements_actions():
     global roach, rf_generator, lo1_generator, lo2_generator, fig, lines
 
     roach = cd.initialize_roach(roach_ip)
-    lo1_generator = rm.open_resource(lo1_generator_name)
-    lo2_generator = rm.open_resource(lo2_generator_name)
-    rf_generator  = rm.open_resource(rf_generator_name)
+    lo1_generator = CachedInstrument(rm.open_resource(lo1_generator_name))
+    lo2_generator = CachedInstrument(rm.open_resource(lo2_generator_name))
+    rf_generator  = CachedInstrument(rm.open_resource(rf_generator_name))
 
     print("Setting up plotting elements...")
     fig, lines = create_figure()
@@ -161,22 +164,15 @@ def get_caldata(rf_freqs):
         # set test tone
         freq = rf_freqs[chnl]
         rf_generator.ask("freq " + str(freq) + " ghz; *opc?")
-        time.sleep(pause_time)
+        wait_new_acc(roach)
 
         # read data
-        a2    = cd.read_interleave_data(roach, bram_a2,    bram_addr_width, 
-                                        bram_word_width,   pow_data_type)
-        b2    = cd.read_interleave_data(roach, bram_b2,    bram_addr_width, 
-                                        bram_word_width,   pow_data_type)
-        ab_re = cd.read_interleave_data(roach, bram_ab_re, bram_addr_width, 
-                                        bram_word_width,   crosspow_data_type)
-        ab_im = cd.read_interleave_data(roach, bram_ab_im, bram_addr_width, 
-                                        bram_word_width,   crosspow_data_type)
+        a2, b2, ab = read_caldata(roach)
 
         # append data to arrays
         a2_arr.append(a2[chnl])
         b2_arr.append(b2[chnl])
-        ab_arr.append(ab_re[chnl] + 1j*ab_im[chnl])
+        ab_arr.append(ab[chnl])
 
         # scale and dBFS data for plotting
         a2_plot = cd.scale_and_dBFS_specdata(a2, acc_len, dBFS)
@@ -36,12 +36,11 @@ bram_ab_im = ['dout_ab_im0', 'dout_ab_im1', 'dout_ab_im2', 'dout_ab_im3',
 # experiment parameters
 lo_freq    = 10000 # MHz
 acc_len    = 2**16
+acc_margin = 0.05 # s, extra wait after an accumulation for the bram writes
 chnl_step  = 32
 rf_power   = -10 # dBm
 date_time  =  datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 datadir    = "dbm_cal_tone " + date_time
-pause_time = 0.5 # should be > (1/bandwidth * FFT_size * acc_len * 2) in order 
-                 # for the spectra to be fully computed after a tone change
 
 # derivative parameters
 nchannels     = 2**bram_addr_width * len(bram_a2)
@@ -49,6 +48,7 @@ if_freqs      = np.linspace(0, bandwidth, nchannels, endpoint=False)
 test_channels = range(1, nchannels, chnl_step)
 if_test_freqs = if_freqs[test_channels]
 dBFS          = 6.02*adc_bits + 1.76 + 10*np.log10(nchannels)
+acc_time      = 2*nchannels * acc_len / (2*bandwidth*1e6) # s, FFT_size*acc_len/fs
 
 ##########################
 # Experiment Starts Here #
@@ -196,7 +196,12 @@ def get_caldata(rf_freqs, sideband):
         # set test tone
         freq = rf_freqs[chnl]
         rf_generator.ask("freq " + str(freq*1e6) + ";*opc?") # freq must be in Hz
-        time.sleep(pause_time)
+        
+        # restart accumulation after the tone is set, so that the next
+        # accumulation is clean, and wait for it to finish
+        roach.write_int(cnt_rst_reg, 1)
+        roach.write_int(cnt_rst_reg, 0)
+        time.sleep(acc_time + acc_margin)
 
         # read data
         a2    = cd.read_interleave_data(roach, bram_a2,    bram_addr_width, 
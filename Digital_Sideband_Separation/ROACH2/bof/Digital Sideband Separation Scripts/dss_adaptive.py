@@ -0,0 +1,83 @@
+# Functions for an adaptive tone sweep. Instead of measuring a fixed grid of
+# test channels, the sweep starts from a coarse grid and adds tones only in
+# the intervals where the linear interpolation of the magnitude ratio or the
+# unwrapped phase difference between the inputs is estimated to be worse
+# than a tolerance (non-linear or noisy parts of the band).
+
+# imports
+import numpy as np
+from dss_parameters import *
+
+def get_interp_errors(x, y):
+    """
+    Estimate the maximum error of the linear interpolation of y in each
+    interval of x. The error of the linear interpolation in an interval of
+    width h is |y''| h^2 / 8, where y'' is estimated with the second divided
+    differences at the ends of the interval (noise also increases them).
+    :param x: sorted array of sample positions (at least 3).
+    :param y: array of sample values.
+    :return: array of estimated errors, one per interval.
+    """
+    h = np.diff(x)
+    slopes = np.diff(y) / h
+    d2 = np.abs(2 * np.diff(slopes) / (x[2:] - x[:-2]))
+
+    # second derivative at every sample, the edges use their neighbors
+    d2 = np.concatenate(([d2[0]], d2, [d2[-1]]))
+    d2_interval = np.maximum(d2[:-1], d2[1:])
+
+    return d2_interval * h**2 / 8
+
+def get_refine_chnls(chnls, ratios):
+    """
+    Get the channels to add to an adaptive sweep. A channel is added in the
+    middle of every interval where the estimated interpolation error of the
+    magnitude ratio (relative) is above adapt_mag_tol, or the error of the
+    unwrapped angle difference is above adapt_ang_tol (degrees). Intervals
+    narrower than 2*adapt_min_step channels are not refined.
+    :param chnls: sorted list of measured channels.
+    :param ratios: complex input ratios at the measured channels.
+    :return: list of channels to measure next (empty if finished).
+    """
+    if len(chnls) < 3:
+        return []
+    x = np.array(chnls)
+    ratios = np.array(ratios)
+
+    mag_errs = get_interp_errors(x, np.log(np.abs(ratios)))
+    ang_errs = get_interp_errors(x, np.degrees(np.unwrap(np.angle(ratios))))
+
+    refine = (mag_errs > adapt_mag_tol) | (ang_errs > adapt_ang_tol)
+    refine = refine & (np.diff(x) >= 2*adapt_min_step)
+
+    return list((x[:-1][refine] + x[1:][refine]) // 2)
+
+def sweep_adaptive(measure_tone, chnls):
+    """
+    Sweep a tone adaptively. The tone is measured in the coarse channels
+    first, and then new channels are added (see get_refine_chnls) until the
+    interpolation error estimate meets the tolerances, or adapt_max_tones
+    tones are measured.
+    :param measure_tone: function that measures the tone in a channel,
+        and returns the complex input ratio.
+    :param chnls: list of coarse channels to start the sweep.
+    :return: sorted list of measured channels, and list of their input
+        ratios.
+    """
+    ratios = {}
+    new_chnls = sorted(set(chnls))
+    while new_chnls:
+        if len(ratios) + len(new_chnls) > adapt_max_tones:
+            print("Maximum number of tones reached, stopping refinement.")
+            new_chnls = new_chnls[:adapt_max_tones - len(ratios)]
+        for chnl in new_chnls:
+            ratios[chnl] = measure_tone(chnl)
+        if len(ratios) >= adapt_max_tones:
+            break
+
+        sorted_chnls = sorted(ratios)
+        new_chnls = get_refine_chnls(sorted_chnls,
+            [ratios[chnl] for chnl in sorted_chnls])
+
+    sorted_chnls = sorted(ratios)
+    return sorted_chnls, [ratios[chnl] for chnl in sorted_chnls]
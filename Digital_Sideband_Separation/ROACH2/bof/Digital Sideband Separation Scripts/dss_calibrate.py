@@ -6,10 +6,17 @@
 # calibration constants with an srr computation script.
 
 # imports
-import os, time, tarfile, shutil, json
+import os, sys, time, tarfile, shutil, json
 import numpy as np
 import matplotlib.pyplot as plt
 import calandigital as cd
+from dss_readout import read_caldata
+from dss_settling import wait_tone_settled
+from dss_adaptive import sweep_adaptive
+# interpolation shared with the multi LO scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../DSS NAOJ Scripts"))
+from dss_interp_complex import interp_complex
 from dss_parameters import *
 
 def main():
@@ -146,6 +153,8 @@ def make_data_directory():
     testinfo["nchannels"]         = nchannels
     testinfo["acc len"]           = acc_len
     testinfo["chnl step"]         = chnl_step
+    testinfo["adaptive sweep"]    = adaptive_sweep
+    testinfo["ab interp"]         = ab_interp
     testinfo["lo freq ghz"]       = lo_freq
     testinfo["rf generator name"] = rf_generator_name
     testinfo["rf power dbm"]      = rf_power
@@ -163,34 +172,36 @@ def get_caldata(rf_freqs, tone_sideband):
     The calibration data is the power of each tone in both inputs (a and b)
     and the cross-correlation of both inputs as a complex number (ab*).
     The full sprecta measured for each tone is saved to data for debugging
-    purposes.
+    purposes. If adaptive_sweep is True the tones are placed adaptively 
+    starting from the coarse channels (see dss_adaptive.py), otherwise the
+    tone is swept through test_channels.
     :param rf_freqs: frequencies of the tones to perform the sweep (in GHz).
     :param tone_sideband: sideband of the injected test tone. Either USB or LSB
     :return: calibration data: a2, b2, and ab.
     """
     fig.canvas.set_window_title(tone_sideband.upper() + " Tone Sweep")
 
-    a2_arr = []; b2_arr = []; ab_arr = []
-    for i, chnl in enumerate(test_channels):
+    a2_dict = {}; b2_dict = {}; ab_dict = {}
+    def measure_tone(chnl):
         # set test tone
         freq = rf_freqs[chnl]
         rf_generator.ask("freq " + str(freq) + " ghz; *opc?")
-        time.sleep(pause_time)
 
         # read data
-        a2    = cd.read_interleave_data(roach, bram_a2,    bram_addr_width, 
-                                        bram_word_width,   pow_data_type)
-        b2    = cd.read_interleave_data(roach, bram_b2,    bram_addr_width, 
-                                        bram_word_width,   pow_data_type)
-        ab_re = cd.read_interleave_data(roach, bram_ab_re, bram_addr_width, 
-                                        bram_word_width,   crosspow_data_type)
-        ab_im = cd.read_interleave_data(roach, bram_ab_im, bram_addr_width, 
-                                        bram_word_width,   crosspow_data_type)
-
-        # append data to arrays
-        a2_arr.append(a2[chnl])
-        b2_arr.append(b2[chnl])
-        ab_arr.append(ab_re[chnl] + 1j*ab_im[chnl])
+        if settle_tone:
+            a2, b2, ab = wait_tone_settled(roach, lambda: read_caldata(roach),
+                lambda a2, b2, ab: ab[chnl])
+        else:
+            time.sleep(pause_time)
+            a2, b2, ab = read_caldata(roach)
+
+        # add data to measured channels
+        a2_dict[chnl] = a2[chnl]
+        b2_dict[chnl] = b2[chnl]
+        ab_dict[chnl] = ab[chnl]
+        chnls = sorted(ab_dict)
+        ab_arr = [ab_dict[c] for c in chnls]
+        b2_arr = [b2_dict[c] for c in chnls]
 
         # scale and dBFS data for plotting
         a2_plot = cd.scale_and_dBFS_specdata(a2, acc_len, dBFS)
@@ -202,19 +213,30 @@ def get_caldata(rf_freqs, tone_sideband):
         # plot data
         lines[0].set_data(if_freqs, a2_plot)
         lines[1].set_data(if_freqs, b2_plot)
-        lines[2].set_data(if_test_freqs[:i+1], np.abs(ab_ratios))
-        lines[3].set_data(if_test_freqs[:i+1], np.angle(ab_ratios, deg=True))
+        lines[2].set_data(if_freqs[chnls], np.abs(ab_ratios))
+        lines[3].set_data(if_freqs[chnls], np.angle(ab_ratios, deg=True))
         fig.canvas.draw()
         fig.canvas.flush_events()
         
         # save data
         np.savez(cal_datadir+"/rawdata_tone_" + tone_sideband + "/chnl_" + 
-        str(chnl), a2=a2, b2=b2, ab_re=ab_re, ab_im=ab_im)
+        str(chnl), a2=a2, b2=b2, ab_re=ab.real, ab_im=ab.imag)
+
+        return ab[chnl] / b2[chnl]
+
+    if adaptive_sweep:
+        sweep_adaptive(measure_tone, coarse_channels)
+    else:
+        for chnl in test_channels:
+            measure_tone(chnl)
+    chnls = sorted(ab_dict)
+    print(str(len(chnls)) + " tones measured.")
 
     # compute interpolations
-    a2_arr = np.interp(if_freqs, if_test_freqs, a2_arr)
-    b2_arr = np.interp(if_freqs, if_test_freqs, b2_arr)
-    ab_arr = np.interp(if_freqs, if_test_freqs, ab_arr)
+    a2_arr = np.interp(if_freqs, if_freqs[chnls], [a2_dict[c] for c in chnls])
+    b2_arr = np.interp(if_freqs, if_freqs[chnls], [b2_dict[c] for c in chnls])
+    ab_arr = interp_complex(if_freqs, if_freqs[chnls], [ab_dict[c] for c in chnls],
+        ab_interp)
 
     return a2_arr, b2_arr, ab_arr
 
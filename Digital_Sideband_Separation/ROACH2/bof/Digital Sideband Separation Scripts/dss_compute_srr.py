@@ -10,6 +10,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import calandigital as cd
 from dss_load_constants import dss_load_constants
+from dss_readout import read_srrdata
+from dss_settling import wait_tone_settled
 from dss_parameters import *
 
 def main():
@@ -176,13 +178,14 @@ def get_srrdata(rf_freqs, tone_sideband):
         # set test tone
         freq = rf_freqs[chnl]
         rf_generator.ask("freq " + str(freq) + " ghz; *opc?")
-        time.sleep(pause_time)
 
         # read data
-        usb = cd.read_interleave_data(roach, bram_usb, bram_addr_width, 
-                                      bram_word_width, pow_data_type)
-        lsb = cd.read_interleave_data(roach, bram_lsb, bram_addr_width, 
-                                      bram_word_width, pow_data_type)
+        if settle_tone:
+            usb, lsb = wait_tone_settled(roach, lambda: read_srrdata(roach),
+                lambda usb, lsb: usb[chnl] if tone_sideband=='usb' else lsb[chnl])
+        else:
+            time.sleep(pause_time)
+            usb, lsb = read_srrdata(roach)
 
         # append data to arrays
         usb_arr.append(usb[chnl])
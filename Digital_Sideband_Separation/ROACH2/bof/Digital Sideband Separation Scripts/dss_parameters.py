@@ -18,6 +18,9 @@ bandwidth          = 1080 # MHz
 cal_acc_len_reg    = 'cal_acc_len'
 syn_acc_len_reg    = 'syn_acc_len'
 cnt_rst_reg        = 'cnt_rst'
+acc_cnt_reg        = None # the dss models have no accumulation counter, so the
+                          # scripts wait on the accumulation time. Set to the
+                          # counter register if the model is rebuilt with one
 bram_addr_width    = 8  # bits
 bram_word_width    = 64 # bits
 pow_data_type      = '>u8'
@@ -66,6 +69,26 @@ srr_datadir = "dss_srr "     + date_time
 pause_time  = 0.5 # should be > (1/bandwidth * FFT_size * acc_len * 2) in 
                       # order  for the spectra to be fully computed after a 
                       # tone change
+settle_tone     = True # instead of pause_time, wait until the test channel
+                       # agrees in two successive accumulations
+acc_restart     = True # restart the accumulation with cnt_rst_reg after 
+                       # every tone change, to wait only one accumulation
+acc_margin      = 0.05 # s, added to the accumulation time when there is no
+                       # counter, to cover the pipeline and bram write 
+                       # latency after an accumulation ends
+settle_pow_tol  = 0.01 # relative power difference to consider the tone settled
+settle_ang_tol  = 0.5  # phase difference [deg] to consider the tone settled
+settle_max_time = 5    # s, maximum wait for the tone to settle
+adaptive_sweep  = False # start from a coarse grid (chnl_step) and add tones
+                        # only where the interpolation error estimate of the
+                        # input ratios is above the tolerances (dss_adaptive.py)
+adapt_mag_tol   = 0.002 # relative magnitude ratio interpolation error
+adapt_ang_tol   = 0.2   # angle difference interpolation error [deg]
+adapt_min_step  = 4     # channels, minimum separation between tones
+adapt_max_tones = 512   # maximum number of tones per sweep
+ab_interp       = 'linear' # interpolation of the crosspower between the test
+                           # channels, in magnitude and unwrapped phase: 
+                           # 'linear', 'cubic' or 'pchip'
 load_consts = True
 load_ideal  = False
 caltar      = 'dss_cal 2020-03-21 22:20:25.tar.gz'
@@ -74,7 +97,9 @@ caltar      = 'dss_cal 2020-03-21 22:20:25.tar.gz'
 nchannels     = 2**bram_addr_width * len(bram_a2)
 if_freqs      = np.linspace(0, bandwidth, nchannels, endpoint=False) # MHz
 test_channels = range(1, nchannels, chnl_step)
+coarse_channels = sorted(set(test_channels) | {nchannels-1}) # include band edge
 if_test_freqs = if_freqs[test_channels] # MHz
 rf_freqs_usb  = lo_freq + (if_freqs/1e3) # GHz
 rf_freqs_lsb  = lo_freq - (if_freqs/1e3) # GHz
 dBFS          = 6.02*adc_bits + 1.76 + 10*np.log10(nchannels)
+acc_time      = 2*nchannels * acc_len / (2*bandwidth*1e6) # s, FFT_size*acc_len/fs
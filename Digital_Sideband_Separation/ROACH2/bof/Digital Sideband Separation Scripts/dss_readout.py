@@ -0,0 +1,53 @@
+# Functions to read the spectral data of the dss model with as few
+# network round trips as possible.
+
+# imports
+import os, sys
+from dss_parameters import *
+# bram readers shared with the other projects
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../../../../ROACH_Readout"))
+from roach_readout import InterleaveReader, read_readers
+
+def read_interleave_brams(roach, bram_sets, awidth, dwidth, dtypes):
+    """
+    Read a group of interleaved bram sets in a single batch of pipelined
+    requests. Equivalent to calling cd.read_interleave_data for each
+    set of brams, but all brams are requested at the same time.
+    :param roach: FpgaClient object to communicate with roach.
+    :param bram_sets: list of lists of bram names. Each list is a set of
+        brams that are interleaved into a single spectrum.
+    :param awidth: width of bram address in bits.
+    :param dwidth: width of bram data in bits.
+    :param dtypes: list of data types, one per bram set.
+    :return: list of interleaved data arrays, one per bram set.
+    """
+    readers = [InterleaveReader(brams, awidth, dwidth, dtype)
+        for brams, dtype in zip(bram_sets, dtypes)]
+    return read_readers(roach, readers)
+
+def read_caldata(roach):
+    """
+    Read the calibration data of the model (power of both inputs and
+    the crosspower) in one call.
+    :param roach: FpgaClient object to communicate with roach.
+    :return: a2, b2 and complex ab data arrays.
+    """
+    a2, b2, ab_re, ab_im = read_interleave_brams(roach,
+        [bram_a2, bram_b2, bram_ab_re, bram_ab_im],
+        bram_addr_width, bram_word_width,
+        [pow_data_type, pow_data_type, crosspow_data_type, crosspow_data_type])
+
+    return a2, b2, ab_re + 1j*ab_im
+
+def read_srrdata(roach):
+    """
+    Read the synthesized data of the model (power of usb and lsb outputs)
+    in one call.
+    :param roach: FpgaClient object to communicate with roach.
+    :return: usb and lsb data arrays.
+    """
+    usb, lsb = read_interleave_brams(roach, [bram_usb, bram_lsb],
+        bram_addr_width, bram_word_width, [pow_data_type, pow_data_type])
+
+    return usb, lsb
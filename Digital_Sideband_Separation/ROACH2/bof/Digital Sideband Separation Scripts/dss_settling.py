@@ -0,0 +1,39 @@
+# Functions to detect when the test tone has settled after a frequency 
+# change, by comparing the test channel in successive accumulations, 
+# instead of waiting a fixed pause time set for the slowest generator.
+# The accumulation aligned waits are the ones of the multi LO scripts 
+# (dss_accumulation.py), with the parameters of the single LO scripts.
+
+# imports
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../DSS NAOJ Scripts"))
+import dss_accumulation
+from dss_parameters import *
+
+# use the accumulation and settling parameters of the single LO scripts in
+# the shared functions
+for name in ["cnt_rst_reg", "acc_cnt_reg", "acc_time", "acc_restart",
+    "acc_margin", "settle_pow_tol", "settle_ang_tol", "settle_max_time"]:
+    setattr(dss_accumulation, name, globals()[name])
+
+def wait_tone_settled(roach, read_data, get_tone):
+    """
+    Wait until the test tone has settled after a frequency change. The
+    accumulation is restarted (or the one in progress discarded, see 
+    acc_restart), and then every new accumulation is read until the tone
+    at the test channel agrees with the previous accumulation within 
+    settle_pow_tol and settle_ang_tol (see wait_tone_settled of 
+    dss_accumulation.py). If the tone doesn't settle in settle_max_time, 
+    the last data is returned anyway with a warning.
+    :param roach: FpgaClient object to communicate with roach.
+    :param read_data: function that reads the data of an accumulation as a
+        tuple of arrays.
+    :param get_tone: function that gets the complex tone value at the test
+        channel from the data arrays. Its magnitude is compared as power 
+        and its angle as phase (e.g. the cross-power ab).
+    :return: data of the first accumulation after the tone has settled.
+    """
+    acc_start = dss_accumulation.start_clean_acc(roach)
+    return dss_accumulation.wait_tone_settled(roach, read_data, acc_start,
+        get_tone)[1]
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 # v2.2 para 10 detectores en paralelo
 
+import os, sys
 import corr
 import numpy as np
 import time
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../../../ROACH_Readout"))
+from roach_readout import ChangeDetector
 
 """
 Detector ACC v2.2 - ROACH 2
@@ -88,7 +92,7 @@ time.sleep(2)
 # read_ram: Reads a single ram block of user-defined bytesize 
 def read_ram(ram_name, bytesize):
 	raw_data = fpga.read(ram_name,bytesize)
-	ram_data = np.fromstring(raw_data,dtype='>u8')
+	ram_data = np.frombuffer(raw_data,dtype='>u8') # no copy of raw_data
 	return ram_data
 
 # acc_lim: Get some samples from ACC# register to get detection limit
@@ -253,50 +257,28 @@ fpga.write_int('theta10',2^32-1)
 time.sleep(2)
 
 # Animation function
+# Only the ACC rams with a new accumulation are read. Each detector has its
+# own accumulation, so each ram is checked separately. All the lines are
+# returned, so a full redraw (e.g. a resize) blits the lines of the long
+# accumulations too.
+acc_names = ['ACC1','ACC2','ACC3','ACC4','ACC5','ACC6','ACC7','ACC8','ACC9','ACC10']
+acc_lims_db = [acc_lim1_db,acc_lim2_db,acc_lim3_db,acc_lim4_db,acc_lim5_db,
+acc_lim6_db,acc_lim7_db,acc_lim8_db,acc_lim9_db,acc_lim10_db]
+# The check word of each ram is in the middle of the band (not the DC channel)
+detector = ChangeDetector(acc_names,check_nbytes=8,check_offset=2**8*8)
 def animate(i):
-    # Obtain data from registers
-    acc1 = np.array(read_ram('ACC1',2**9*8))
-    acc2 = np.array(read_ram('ACC2',2**9*8))
-    acc3 = np.array(read_ram('ACC3',2**9*8))
-    acc4 = np.array(read_ram('ACC4',2**9*8))
-    acc5 = np.array(read_ram('ACC5',2**9*8))
-    acc6 = np.array(read_ram('ACC6',2**9*8))
-    acc7 = np.array(read_ram('ACC7',2**9*8))
-    acc8 = np.array(read_ram('ACC8',2**9*8))
-    acc9 = np.array(read_ram('ACC9',2**9*8))
-    acc10 = np.array(read_ram('ACC10',2**9*8))
-    # Data in dB
-    acc_db1 = 10*np.log10(acc1)
-    acc_db2 = 10*np.log10(acc2)
-    acc_db3 = 10*np.log10(acc3)
-    acc_db4 = 10*np.log10(acc4)
-    acc_db5 = 10*np.log10(acc5)
-    acc_db6 = 10*np.log10(acc6)
-    acc_db7 = 10*np.log10(acc7)
-    acc_db8 = 10*np.log10(acc8)
-    acc_db9 = 10*np.log10(acc9)
-    acc_db10 = 10*np.log10(acc10)
-    #Asign data to arrays
-    line[0].set_data(acc_x,acc_db1)
-    line[1].set_data(acc_x,acc_db2)
-    line[2].set_data(acc_x,acc_db3)
-    line[3].set_data(acc_x,acc_db4)
-    line[4].set_data(acc_x,acc_db5)
-    line[5].set_data(acc_x,acc_db6)
-    line[6].set_data(acc_x,acc_db7)
-    line[7].set_data(acc_x,acc_db8)
-    line[8].set_data(acc_x,acc_db9)
-    line[9].set_data(acc_x,acc_db10)
-    line[10].set_data(acc_x,len(acc_x)*[acc_lim1_db])
-    line[11].set_data(acc_x,len(acc_x)*[acc_lim2_db])
-    line[12].set_data(acc_x,len(acc_x)*[acc_lim3_db])
-    line[13].set_data(acc_x,len(acc_x)*[acc_lim4_db])
-    line[14].set_data(acc_x,len(acc_x)*[acc_lim5_db])
-    line[15].set_data(acc_x,len(acc_x)*[acc_lim6_db])
-    line[16].set_data(acc_x,len(acc_x)*[acc_lim7_db])
-    line[17].set_data(acc_x,len(acc_x)*[acc_lim8_db])
-    line[18].set_data(acc_x,len(acc_x)*[acc_lim9_db])
-    line[19].set_data(acc_x,len(acc_x)*[acc_lim10_db])
+    changed = detector.get_changed(fpga)
+    for j in range(len(acc_names)):
+        # Skip ram if there is no new accumulation
+        if not changed[j]:
+            continue
+        # Obtain data from register
+        acc = read_ram(acc_names[j],2**9*8)
+        # Data in dB
+        acc_db = 10*np.log10(acc)
+        #Asign data to arrays
+        line[j].set_data(acc_x,acc_db)
+        line[j+10].set_data(acc_x,len(acc_x)*[acc_lims_db[j]])
     return line
 
 anim = animation.FuncAnimation(fig,animate,blit=True,interval=10,init_func=init,repeat=True)
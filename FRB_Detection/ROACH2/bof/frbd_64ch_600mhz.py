@@ -1,7 +1,11 @@
+import os, sys
 import calandigital as cd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../../../ROACH_Readout"))
+from roach_readout import RoachPool, ChangeDetector
 
 
 # communication parameters
@@ -9,6 +13,7 @@ from matplotlib.animation import FuncAnimation
 roach_ip = None
 #boffile  = 'frbd_64ch_600mhz.bof.gz'
 boffile  = None
+nconns   = 4 # connections used to read the brams in parallel
 
 # model parameters
 adc_bits  = 8
@@ -60,19 +65,34 @@ def main():
     roach.write_int(count_reg, 0)
     print("done.")
 
+    # connection pool for the parallel readout
+    roach_pool = RoachPool(roach_ip, nconns)
+    bram_reads = [(bram, 2**bram_addr_width * bram_word_width // 8, 0) 
+        for bram in bram_list]
+    # each DM has its own accumulation, so the brams are checked separately,
+    # with a check word in the middle of the band (not the DC channel)
+    detector = ChangeDetector(bram_list, check_nbytes=bram_word_width//8,
+        check_offset=2**(bram_addr_width-1) * bram_word_width//8)
+
     # animation definition
     def animate(_):
-        for line, bram in zip(lines, bram_list):
-            # get spectral data
-            frbdata = cd.read_data(roach, bram, 
-                bram_addr_width, bram_word_width,   
-                bram_data_type)
-            frbdata = 10*np.log10(frbdata+1)
-            line.set_data(range(len(frbdata)),frbdata)
+        # get spectral data of the brams with new accumulations only
+        changed = detector.get_changed(roach_pool)
+        new_lines = [line for line, new in zip(lines, changed) if new]
+        new_reads = [read for read, new in zip(bram_reads, changed) if new]
+        if new_reads:
+            rawdata_list = roach_pool.read_brams(new_reads)
+            for line, rawdata in zip(new_lines, rawdata_list):
+                frbdata = np.frombuffer(rawdata, dtype=bram_data_type)
+                frbdata = 10*np.log10(frbdata+1.0)
+                line.set_data(range(len(frbdata)),frbdata)
+        # return all the lines, so a full redraw (e.g. a resize) blits the
+        # lines of the long accumulations too
         return lines
 
     ani = FuncAnimation(fig, animate, blit=True)
     plt.show()
+    roach_pool.close()
 
 def create_figure():
     # create figure and axes
@@ -1,7 +1,10 @@
-import corr, time
+import os, sys, corr, time
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../../../ROACH_Readout"))
+from roach_readout import ChangeDetector
 
 # parameters
 roachip   = "192.168.0.11"
@@ -16,17 +19,36 @@ freqs     = np.linspace(0, bandwidth, fftsize, endpoint=False)
 dBFS      = 6.02*8 + 1.76 + 10*np.log10(fftsize) # 8 bits
 dtype     = np.dtype(dtypename)
 
+def reverse_bits(x, nbits):
+    y = 0
+    for _ in range(nbits):
+        y = (y << 1) + (x & 1)
+        x >>= 1
+    return int(y)
+
+# bit reversed order of the fft channels, computed only once
+bitrev_order = np.array([reverse_bits(i, int(np.log2(fftsize))) 
+    for i in range(fftsize)])
+# address of the channel used to detect new spectra, at a quarter of the
+# band (the DC channel, at address 0, may not change)
+check_addr = int(bitrev_order[fftsize//4])
+
 def main():
     roach = initialize_roach()
     #roach = DummyRoach()
     fig, lines = create_figure()
 
     # animation definition
+    detector = ChangeDetector(brams, check_nbytes=dtype.itemsize, 
+        check_offset=check_addr*dtype.itemsize)
     def animate(_):
-        for line, bram in zip(lines, brams):
-            data = read_data(roach, bram)
-            data = process_data(data)
-            line.set_data(freqs, data)
+        # read only the brams with a new spectrum, but return all the lines
+        # so a full redraw (e.g. a resize) blits both of them
+        for line, bram, new in zip(lines, brams, detector.get_changed(roach)):
+            if new:
+                data = read_data(roach, bram)
+                data = process_data(data)
+                line.set_data(freqs, data)
         return lines
 
     # create animation
@@ -61,31 +83,23 @@ def create_figure():
     return fig, lines
 
 def read_data(roach, bram):
-    wordbytes = dtype.alignment
+    # np.frombuffer returns a view of the raw data, no copy is made
+    wordbytes = dtype.itemsize
     rawdata = roach.read(bram, fftsize*wordbytes, 0)
     bramdata = np.frombuffer(rawdata, dtype=dtype)
 
     return bramdata
 
 def process_data(data):
-    # convert data into dBFS
-    data = 10*np.log10(data+1) - dBFS
-
-    # reorder data into canonical order
-    for i in range(len(data)):
-        j = reverse_bits(i, int(np.log2(fftsize)))
-        if i < j:
-            temp    = data[i]
-            data[i] = data[j]
-            data[j] = temp
-    return data
+    # reorder data into canonical order while converting it to float,
+    # then convert data into dBFS in place
+    data = data.take(bitrev_order).astype(np.float64)
+    data += 1
+    np.log10(data, out=data)
+    data *= 10
+    data -= dBFS
 
-def reverse_bits(x, nbits):
-    y = 0
-    for _ in range(nbits):
-        y = (y << 1) + (x & 1)
-        x >>= 1
-    return int(y)
+    return data
 
 class DummyRoach():
     def __init__(self):
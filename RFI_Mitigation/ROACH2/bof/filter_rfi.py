@@ -2,7 +2,7 @@
 # the spectrum of the primary signal, reference signal and
 # the filter output. Also add some user interface to control 
 # the filter and show additional plots.
-import time
+import os, sys, time
 import numexpr
 import numpy as np
 import matplotlib.pyplot as plt
@@ -11,6 +11,10 @@ import Tkinter as Tk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import calandigital as cd
 from kestfilt_parameters import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "../../../ROACH_Readout"))
+from roach_readout import InterleaveReader, RoachPool, ChangeDetector, \
+    read_readers
 
 def main():
     # initialization
@@ -32,15 +36,27 @@ def main():
     fig, lines = create_window(roach)
     print("done.")
 
+    # spectra readers, reused in every frame
+    spec_readers = [InterleaveReader(specbrams, spec_addr_width, 
+        spec_word_width, spec_data_type) for specbrams in specbrams_list]
+    # connection pool for the parallel readout
+    roach_pool = RoachPool(roach_ip, nconns)
+    # all spectra are accumulated together, check only one of them, at the
+    # middle of the band (word 0 is the DC channel, it may not change)
+    detector = ChangeDetector(specbrams_list[0][:1], acc_cnt_reg, 
+        spec_word_width//8, 2**(spec_addr_width-1) * spec_word_width//8)
+
     # animation function
     def animate(_):
-        for line, specbrams in zip(lines, specbrams_list):
-            # update acc_len
-            acc_len = roach.read_uint(acc_len_reg)
-            # get spectral data
-            specdata = cd.read_interleave_data(roach, 
-                specbrams, spec_addr_width, spec_word_width, 
-                spec_data_type)
+        # skip the readout if there is no new accumulation (all the lines
+        # are returned anyway, for the full redraws of the blitting)
+        if not any(detector.get_changed(roach_pool)):
+            return lines
+        # update acc_len
+        acc_len = roach.read_uint(acc_len_reg)
+        # get spectral data of all spectra
+        specdata_list = read_readers(roach_pool, spec_readers)
+        for line, specdata in zip(lines, specdata_list):
             specdata = cd.scale_and_dBFS_specdata(specdata,
                 acc_len, dBFS)
             line.set_data(freqs, specdata)
@@ -48,6 +64,7 @@ def main():
 
     anim = animation.FuncAnimation(fig, animate, blit=True)
     Tk.mainloop()
+    roach_pool.close()
 
 def create_window(roach):
     """
@@ -7,12 +7,14 @@ import numpy as np
 roach_ip   = '192.168.1.12'
 #roach_ip   = None
 #boffile    = 'kestfilt_4096ch_1080mhz.bof.gz'
+nconns     = 8 # connections used to read the brams in parallel
 
 # model parameters
 adc_bits        = 8
 bandwidth       = 540 # MHz
 acc_len_reg     = 'acc_len'
 cnt_rst_reg     = 'cnt_rst'
+acc_cnt_reg     = None # set if the model has an accumulation counter
 filter_on_reg   = 'filter_on'
 filter_gain_reg = 'filter_gain'
 filter_acc_reg  = 'filter_acc'
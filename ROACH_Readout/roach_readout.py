@@ -0,0 +1,251 @@
+# Functions and classes to read the spectral data of the models, shared by
+# the scripts of the different projects: pipelined bram reads, readers of
+# interleaved brams with preallocated outputs, a pool of katcp connections
+# for parallel reads, and a detector of new accumulations for the live
+# displays. The scripts add this directory to sys.path to import it.
+
+# imports
+import threading
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import katcp
+
+def read_brams(roach, reads):
+    """
+    Read a list of bram regions from roach. If the roach object supports
+    katcp callbacks all the read requests are sent at once (pipelined), and
+    the replies are collected as they arrive, so the total time is one
+    network round trip plus the transfer time, instead of one round trip
+    per bram. Otherwise (e.g. dummy roach) the regions are read one by one.
+    :param roach: FpgaClient object to communicate with roach.
+    :param reads: list of (bram name, number of bytes, byte offset) tuples.
+    :return: list of raw data strings, in the same order as reads.
+    """
+    if not hasattr(roach, 'callback_request'):
+        return [roach.read(bram, nbytes, offset) for bram, nbytes, offset in reads]
+
+    rawdata_list = [None] * len(reads)
+    pending      = [len(reads)]
+    lock         = threading.Lock()
+    done         = threading.Event()
+
+    def make_reply_cb(i):
+        def reply_cb(msg):
+            rawdata_list[i] = msg
+            with lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    done.set()
+        return reply_cb
+
+    for i, (bram, nbytes, offset) in enumerate(reads):
+        msg = katcp.Message.request('read', bram, str(offset), str(nbytes))
+        roach.callback_request(msg, reply_cb=make_reply_cb(i))
+
+    timeout = getattr(roach, '_timeout', 10) * len(reads)
+    if not done.wait(timeout):
+        raise RuntimeError("Timeout reading brams from roach.")
+
+    for i, msg in enumerate(rawdata_list):
+        if msg.arguments[0] != katcp.Message.OK:
+            raise RuntimeError("Unable to read bram " + reads[i][0] + ": " +
+                str(msg.arguments[1:]))
+    return [msg.arguments[1] for msg in rawdata_list]
+
+class InterleaveReader():
+    """
+    Reader for a set of interleaved brams. It owns a preallocated output
+    array, and the raw data of each bram is decoded with np.frombuffer
+    directly into its strided view of the output (data[i::nbrams]), with no
+    intermediate copies. The output array is overwritten by the next read,
+    so it must be copied if it has to be kept.
+    """
+    def __init__(self, brams, awidth, dwidth, dtype):
+        """
+        :param brams: list of interleaved bram names.
+        :param awidth: width of bram address in bits.
+        :param dwidth: width of bram data in bits.
+        :param dtype: data type in which interpret the bram data.
+        """
+        self.brams = brams
+        self.dtype = np.dtype(dtype)
+        self.reads = [(bram, 2**awidth * dwidth // 8, 0) for bram in brams]
+        self.data  = np.empty(2**awidth * len(brams))
+
+    def decode(self, rawdata_list):
+        """
+        Decode the raw data of the brams into the output array.
+        :param rawdata_list: list of raw data strings, one per bram.
+        :return: interleaved data array.
+        """
+        nbrams = len(self.brams)
+        for i, rawdata in enumerate(rawdata_list):
+            self.data[i::nbrams] = np.frombuffer(rawdata, dtype=self.dtype)
+        return self.data
+
+    def read(self, roach):
+        """
+        Read the brams from roach and decode them into the output array.
+        :param roach: FpgaClient or RoachPool object to communicate with roach.
+        :return: interleaved data array.
+        """
+        return read_readers(roach, [self])[0]
+
+def read_readers(roach, readers, cnt_reg=None):
+    """
+    Read the brams of a group of interleave readers as a single snapshot:
+    in parallel if roach is a RoachPool, otherwise in a single batch of
+    pipelined requests.
+    :param roach: FpgaClient or RoachPool object to communicate with roach.
+    :param readers: list of InterleaveReader objects.
+    :param cnt_reg: register that changes when the bram data is updated,
+        see RoachPool.read_brams. Only used with a RoachPool.
+    :return: list of interleaved data arrays, one per reader.
+    """
+    reads = [read for reader in readers for read in reader.reads]
+    if hasattr(roach, 'read_brams'):
+        rawdata_list = roach.read_brams(reads, cnt_reg)
+    else:
+        rawdata_list = read_brams(roach, reads)
+
+    data_list = []
+    for reader in readers:
+        nbrams = len(reader.brams)
+        data_list.append(reader.decode(rawdata_list[:nbrams]))
+        rawdata_list = rawdata_list[nbrams:]
+
+    return data_list
+
+class RoachPool():
+    """
+    Pool of katcp connections to a roach board, used to read several brams
+    in parallel. Each bram read is done by a worker thread on its own
+    connection, so the round trip and transfer time of the reads overlap,
+    instead of adding up as with a single connection.
+    """
+    def __init__(self, roach_ip, nconns=4):
+        """
+        :param roach_ip: IP address of the roach board.
+        :param nconns: number of connections (and worker threads) of the pool.
+        """
+        # imported here, so the scripts that don't use the pool don't need
+        # calandigital
+        import calandigital as cd
+
+        self.roach_ip = roach_ip
+        self.conns    = Queue.Queue()
+        for _ in range(nconns):
+            self.conns.put(cd.initialize_roach(roach_ip))
+        self.workers  = ThreadPool(nconns)
+
+    def read(self, bram, nbytes, offset=0):
+        """
+        Read a bram region using a free connection of the pool.
+        :param bram: bram name.
+        :param nbytes: number of bytes to read.
+        :param offset: byte offset of the region.
+        :return: raw data string.
+        """
+        roach = self.conns.get()
+        try:
+            return roach.read(bram, nbytes, offset)
+        finally:
+            self.conns.put(roach)
+
+    def read_uint(self, reg):
+        """
+        Read a register using a free connection of the pool.
+        :param reg: register name.
+        :return: register value.
+        """
+        roach = self.conns.get()
+        try:
+            return roach.read_uint(reg)
+        finally:
+            self.conns.put(roach)
+
+    def read_brams(self, reads, cnt_reg=None, retries=3):
+        """
+        Read a list of bram regions in parallel. The call returns when all
+        the regions have been read, so the data is a snapshot of the brams.
+        If cnt_reg is given (e.g. an accumulation counter) it is read before
+        and after the brams, and the brams are read again if the counter
+        changed in between (the data of the brams may come from different
+        accumulations), up to retries times. If the counter still changes in
+        the last read a warning is printed, and the data may not be a
+        snapshot.
+        :param reads: list of (bram name, number of bytes, byte offset) tuples.
+        :param cnt_reg: register that changes when the bram data is updated.
+        :param retries: maximum number of re-reads if cnt_reg changed.
+        :return: list of raw data strings, in the same order as reads.
+        """
+        for _ in range(retries+1):
+            if cnt_reg is not None:
+                cnt = self.read_uint(cnt_reg)
+            rawdata_list = self.workers.map(lambda read: self.read(*read), reads)
+            if cnt_reg is None or self.read_uint(cnt_reg) == cnt:
+                break
+        else:
+            print("Warning: " + cnt_reg + " changed in all the " +
+                str(retries+1) + " reads of the brams, the data may come " +
+                "from different accumulations.")
+        return rawdata_list
+
+    def close(self):
+        """
+        Stop the worker threads and close the connections of the pool.
+        """
+        self.workers.close()
+        self.workers.join()
+        while not self.conns.empty():
+            self.conns.get().stop()
+
+class ChangeDetector():
+    """
+    Detector of new data in a group of brams, so that live displays only
+    read the brams that were updated by a new accumulation. If the model
+    has an accumulation counter register it is used to detect new data,
+    otherwise a check word of each bram is used: a single word that changes
+    with every accumulation, which is much cheaper to read than the bram.
+    The check word must be a channel with noise in it, not the DC channel
+    or a saturated one, which can stay constant and freeze the display.
+    """
+    def __init__(self, brams, cnt_reg=None, check_nbytes=8, check_offset=0):
+        """
+        :param brams: list of bram names to monitor.
+        :param cnt_reg: accumulation counter register. If None the check
+            words of the brams are used.
+        :param check_nbytes: number of bytes of the check word.
+        :param check_offset: byte offset of the check word in the brams.
+        """
+        self.brams       = brams
+        self.cnt_reg     = cnt_reg
+        self.check_reads = [(bram, check_nbytes, check_offset) for bram in brams]
+        self.last_values = None
+
+    def get_changed(self, roach):
+        """
+        Check which brams have new data since the previous call. In the
+        first call all brams are considered new.
+        :param roach: FpgaClient or RoachPool object to communicate with roach.
+        :return: list of booleans, one per bram, True if the bram has new data.
+        """
+        if self.cnt_reg is not None:
+            values = [roach.read_uint(self.cnt_reg)] * len(self.brams)
+        elif hasattr(roach, 'read_brams'):
+            values = roach.read_brams(self.check_reads)
+        else:
+            values = read_brams(roach, self.check_reads)
+
+        if self.last_values is None:
+            changed = [True] * len(self.brams)
+        else:
+            changed = [value != last_value for value, last_value
+                in zip(values, self.last_values)]
+        self.last_values = values
+
+        return changed
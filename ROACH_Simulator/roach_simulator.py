@@ -0,0 +1,277 @@
+#!/usr/bin/python
+# Simulated ROACH katcp server, to run and benchmark the readout and sweep
+# scripts without hardware. It implements the subset of the tcpborphserver
+# katcp interface used by corr.katcp_wrapper.FpgaClient and calandigital:
+# read, write, wordread, wordwrite, bulkread (read_dram), listdev, listbof,
+# progdev, upload (upload_program_bof), status and ping. Each request is
+# delayed by a configurable latency and transfer time, and the spectral
+# brams are filled with synthetic spectra of the simulated model (see
+# sim_models.py).
+# Usage example (then use 'localhost' as roach_ip in the scripts):
+#   python roach_simulator.py --bof dss_2048ch_1520mhz.bof.gz --latency 0.5
+
+# imports
+import argparse, re, socket, struct, threading, time
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+from sim_models import get_model, models
+
+# katcp escape sequences of the message arguments
+escapes   = {b'\\': b'\\', b' ': b'_', b'\0': b'0', b'\n': b'n', b'\r': b'r',
+             b'\x1b': b'e', b'\t': b't'}
+unescapes = dict((value, key) for key, value in escapes.items())
+escape_re   = re.compile(b'[\\\\ \0\n\r\x1b\t]')
+unescape_re = re.compile(b'\\\\(.)')
+request_re  = re.compile(b'^\\?([a-zA-Z][a-zA-Z0-9-]*)(\\[([0-9]+)\\])?$')
+
+def escape_arg(arg):
+    """
+    Escape a message argument for the katcp wire format.
+    :param arg: argument as bytes.
+    :return: escaped argument.
+    """
+    if arg == b'':
+        return b'\\@'
+    return escape_re.sub(lambda m: b'\\' + escapes[m.group(0)], arg)
+
+def unescape_arg(arg):
+    """
+    Unescape a message argument from the katcp wire format.
+    :param arg: escaped argument as bytes.
+    :return: argument.
+    """
+    if arg == b'\\@':
+        return b''
+    return unescape_re.sub(lambda m: unescapes[m.group(1)], arg)
+
+def to_bytes(arg):
+    if isinstance(arg, bytes):
+        return arg
+    return str(arg).encode()
+
+class SimRoach():
+    """
+    Simulated ROACH board. It holds the programmed model and the link
+    parameters, and is shared by all the client connections.
+    """
+    def __init__(self, boffile, latency, bandwidth, shared_link):
+        """
+        :param boffile: bof file (model) programmed at start, or None.
+        :param latency: latency added to every request in ms.
+        :param bandwidth: bandwidth of the link in MB/s, used to compute the
+            transfer time of the data of the requests.
+        :param shared_link: if True the transfers of all connections are
+            serialized, as they share the same network link.
+        """
+        self.latency   = latency / 1e3
+        self.bandwidth = bandwidth * 1e6
+        self.model     = get_model(boffile) if boffile else None
+        self.lock      = threading.Lock() # protects the model devices
+        self.link_lock = threading.Lock() if shared_link else None
+
+    def transfer(self, nbytes):
+        """
+        Wait the latency and transfer time of a request.
+        :param nbytes: number of bytes transferred in the request.
+        """
+        time.sleep(self.latency)
+        transfer_time = nbytes / self.bandwidth
+        if self.link_lock is None:
+            time.sleep(transfer_time)
+        else:
+            with self.link_lock:
+                time.sleep(transfer_time)
+
+    def get_device(self, name):
+        if self.model is None:
+            raise ValueError("FPGA not programmed.")
+        name = name.decode()
+        if name not in self.model.devices:
+            raise ValueError("Unknown device " + name + ".")
+        return name, self.model.devices[name]
+
+    def read(self, name, offset, nbytes):
+        with self.lock:
+            name, device = self.get_device(name)
+            self.model.refresh(name)
+            return device.read(offset, nbytes)
+
+    def write(self, name, offset, data):
+        with self.lock:
+            name, device = self.get_device(name)
+            device.write(offset, data)
+            self.model.written(name)
+
+    def program(self, boffile):
+        model = get_model(boffile.decode())
+        if model is None:
+            raise ValueError("No simulated model for " + boffile.decode() + ".")
+        with self.lock:
+            self.model = model
+
+    # request handlers, they return the list of reply arguments (after ok)
+    # and the list of informs (list of arguments each)
+    def request_read(self, name, offset, nbytes):
+        data = self.read(name, int(offset), int(nbytes))
+        self.transfer(len(data))
+        return [data], []
+
+    def request_bulkread(self, name, offset, nbytes):
+        data = self.read(name, int(offset), int(nbytes))
+        self.transfer(len(data))
+        chunk = 2**16
+        informs = [[data[i:i+chunk]] for i in range(0, len(data), chunk)]
+        return [str(len(informs)).encode()], informs
+
+    def request_write(self, name, offset, data):
+        self.transfer(len(data))
+        self.write(name, int(offset), data)
+        return [], []
+
+    def request_wordread(self, name, offset=b'0'):
+        self.transfer(4)
+        data = self.read(name, 4*int(offset, 0), 4)
+        return [('0x%08x' % struct.unpack('>I', data)[0]).encode()], []
+
+    def request_wordwrite(self, name, offset, value):
+        self.transfer(4)
+        value = int(value, 0) % 2**32
+        data = struct.pack('>I', value)
+        self.write(name, 4*int(offset, 0), data)
+        return [], []
+
+    def request_listdev(self, *args):
+        self.transfer(0)
+        if self.model is None:
+            return [], []
+        return [], [[name.encode()] for name in sorted(self.model.devices)]
+
+    def request_listbof(self, *args):
+        self.transfer(0)
+        return [], [[name.encode() + b'.bof.gz'] for name in sorted(models)]
+
+    def request_progdev(self, boffile=b''):
+        self.transfer(0)
+        if boffile == b'':
+            self.model = None
+        else:
+            self.program(boffile)
+        return [], []
+
+    def request_upload(self, port, timeout=b'30'):
+        # receive the bof file in a new socket, the model is recognized by
+        # the name of the bof file if it is found in the file header,
+        # otherwise the current model is kept
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('', int(port)))
+        server.listen(1)
+        server.settimeout(float(timeout))
+        try:
+            conn, _ = server.accept()
+            bofdata = b''
+            while True:
+                data = conn.recv(2**16)
+                if not data:
+                    break
+                bofdata += data
+            conn.close()
+        finally:
+            server.close()
+        self.transfer(len(bofdata))
+        for name in models:
+            if name.encode() in bofdata[:2**16]:
+                self.program(name.encode())
+        return [], []
+
+    def request_status(self, *args):
+        self.transfer(0)
+        if self.model is None:
+            raise ValueError("FPGA not programmed.")
+        return [b'FPGA', b'is', b'programmed'], []
+
+    def request_ping(self, *args):
+        self.transfer(0)
+        return list(args), []
+
+    def request_watchdog(self, *args):
+        return [], []
+
+class KatcpHandler(socketserver.StreamRequestHandler):
+    """
+    Handler of a client connection. Requests are processed in order, one
+    at a time, as in tcpborphserver.
+    """
+    def handle(self):
+        self.send_message(b'#version-connect', [b'katcp-protocol', b'5.0-MI'])
+        self.send_message(b'#version-connect', [b'katcp-library', b'roach-simulator'])
+        self.send_message(b'#version-connect', [b'katcp-device', b'roach-simulator'])
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            line = line.rstrip(b'\r\n')
+            if line.strip():
+                self.handle_line(line)
+
+    def send_message(self, name, args):
+        self.wfile.write(b' '.join([name] + [escape_arg(to_bytes(arg))
+            for arg in args]) + b'\n')
+        self.wfile.flush()
+
+    def handle_line(self, line):
+        words = line.split()
+        match = request_re.match(words[0])
+        if match is None: # not a request (reply or inform), ignore
+            return
+        name = match.group(1)
+        mid  = match.group(2) or b''
+        args = [unescape_arg(word) for word in words[1:]]
+
+        handler = getattr(self.server.roach, 'request_' +
+            name.decode().replace('-', '_'), None)
+        if handler is None:
+            self.send_message(b'!' + name + mid, [b'invalid',
+                b'unknown request ' + name])
+            return
+        try:
+            reply_args, informs = handler(*args)
+        except Exception as e:
+            self.send_message(b'!' + name + mid, [b'fail', str(e).encode()])
+            return
+        for inform_args in informs:
+            self.send_message(b'#' + name + mid, inform_args)
+        self.send_message(b'!' + name + mid, [b'ok'] + reply_args)
+
+class KatcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads      = True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Simulated ROACH katcp server for testing and benchmarking\
+            scripts without hardware.")
+    parser.add_argument("-p", "--port", dest="port", type=int, default=7147,
+        help="TCP port of the katcp server.")
+    parser.add_argument("-b", "--bof", dest="boffile", default=None,
+        help="Bof file (model) programmed at start. Available models: " +
+            ", ".join(sorted(models)) + ".")
+    parser.add_argument("-l", "--latency", dest="latency", type=float,
+        default=0.5, help="Latency added to every request in ms.")
+    parser.add_argument("-bw", "--bandwidth", dest="bandwidth", type=float,
+        default=50, help="Link bandwidth in MB/s.")
+    parser.add_argument("-s", "--shared_link", dest="shared_link",
+        action="store_true", help="If used, the transfers of all the \
+            connections share the link bandwidth.")
+    args = parser.parse_args()
+
+    server = KatcpServer(('', args.port), KatcpHandler)
+    server.roach = SimRoach(args.boffile, args.latency, args.bandwidth,
+        args.shared_link)
+    print("ROACH simulator listening on port " + str(args.port) + ".")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,399 @@
+# Simulated models for the ROACH simulator. Each model defines the registers
+# and brams of a bof file, and generates synthetic accumulated spectra for
+# its spectral brams, with the same layout (interleaved brams, address and
+# data widths, data types) as the real models.
+
+# imports
+import time, struct
+import numpy as np
+
+class Device():
+    """
+    Memory device of the FPGA (register, bram or dram), stored as raw big
+    endian bytes, as they are read through katcp.
+    """
+    def __init__(self, name, nbytes):
+        """
+        :param name: device name.
+        :param nbytes: size of the device in bytes.
+        """
+        self.name = name
+        self.data = bytearray(nbytes)
+
+    def read(self, offset, nbytes):
+        if offset < 0 or offset + nbytes > len(self.data):
+            raise ValueError("Read out of range in device " + self.name + ".")
+        return bytes(self.data[offset:offset+nbytes])
+
+    def write(self, offset, data):
+        if offset < 0 or offset + len(data) > len(self.data):
+            raise ValueError("Write out of range in device " + self.name + ".")
+        self.data[offset:offset+len(data)] = data
+
+    def get_uint(self):
+        return struct.unpack('>I', bytes(self.data[:4]))[0]
+
+    def set_uint(self, value):
+        self.data[:4] = struct.pack('>I', value % 2**32)
+
+class SpecGroup():
+    """
+    Group of spectra that are accumulated together by the model (e.g. a2, b2
+    and ab of the dss model). Each spectrum is stored in a set of interleaved
+    brams. The spectra are computed by a generator function only when a
+    bram of the group is read after a new accumulation has finished, so a
+    group updates every acc_time as in the real model.
+    """
+    def __init__(self, bram_sets, awidth, dwidth, dtypes, acc_reg, generator):
+        """
+        :param bram_sets: list of lists of interleaved bram names, one per
+            spectrum.
+        :param awidth: width of bram address in bits.
+        :param dwidth: width of bram data in bits.
+        :param dtypes: list of data types, one per spectrum.
+        :param acc_reg: name of accumulation length register of the group.
+        :param generator: function generator(model, rng, acc_len) that
+            returns the list of accumulated spectra (float arrays) of the
+            group.
+        """
+        self.bram_sets = bram_sets
+        self.awidth    = awidth
+        self.dwidth    = dwidth
+        self.dtypes    = [np.dtype(dtype) for dtype in dtypes]
+        self.acc_reg   = acc_reg
+        self.generator = generator
+        self.nchannels = 2**awidth * len(bram_sets[0])
+        self.start     = time.time()
+        self.acc_index = None
+
+    def get_acc_count(self, model):
+        """
+        :return: number of finished accumulations since the last reset.
+        """
+        acc_len  = max(model.devices[self.acc_reg].get_uint(), 1)
+        acc_time = 2*model.nchannels * acc_len / (2*model.bandwidth*1e6)
+        return int((time.time() - self.start) / acc_time)
+
+    def update(self, model):
+        """
+        Compute and write the spectra into the brams if there is a new
+        accumulation since the last update.
+        """
+        acc_index = self.get_acc_count(model)
+        if acc_index == self.acc_index:
+            return
+        self.acc_index = acc_index
+
+        rng = np.random.RandomState(acc_index % 2**32)
+        acc_len = max(model.devices[self.acc_reg].get_uint(), 1)
+        specs = self.generator(model, rng, acc_len)
+        for brams, dtype, spec in zip(self.bram_sets, self.dtypes, specs):
+            if dtype.kind == 'u':
+                spec = np.clip(spec, 0, 2**(8*dtype.itemsize)-1)
+            else:
+                spec = np.clip(spec, -2**(8*dtype.itemsize-1), 2**(8*dtype.itemsize-1)-1)
+            spec = spec.astype(dtype)
+            for i, bram in enumerate(brams):
+                model.devices[bram].write(0, spec[i::len(brams)].tobytes())
+
+class Model():
+    """
+    Simulated model (bof file) of the ROACH. It holds the devices of the
+    model, and updates the dynamic devices (spectral brams, counters) before
+    they are read.
+    """
+    def __init__(self, name, bandwidth, nchannels, adc_bits=8, fpga_clk=None):
+        """
+        :param name: model name.
+        :param bandwidth: bandwidth of the model in MHz.
+        :param nchannels: number of channels of the spectra of the model.
+        :param adc_bits: number of bits of the ADC.
+        :param fpga_clk: FPGA clock in MHz, by default bandwidth/4.
+        """
+        self.name        = name
+        self.bandwidth   = bandwidth
+        self.nchannels   = nchannels
+        self.adc_bits    = adc_bits
+        self.fpga_clk    = fpga_clk if fpga_clk is not None else bandwidth/4.0
+        self.dBFS        = 6.02*adc_bits + 1.76 + 10*np.log10(nchannels)
+        self.devices     = {}
+        self.groups      = {} # bram name -> SpecGroup
+        self.counters    = {} # register name -> SpecGroup
+        self.reset_regs  = []
+        self.start       = time.time()
+        self.add_register('sys_clkcounter')
+
+    def add_register(self, name, value=0):
+        self.devices[name] = Device(name, 4)
+        self.devices[name].set_uint(value)
+
+    def add_bram(self, name, awidth, dwidth):
+        self.devices[name] = Device(name, 2**awidth * dwidth // 8)
+
+    def add_group(self, group, cnt_reg=None):
+        """
+        Add a group of spectra to the model, with its brams and registers.
+        :param group: SpecGroup object.
+        :param cnt_reg: accumulation counter register of the group, if any.
+        """
+        if group.acc_reg not in self.devices:
+            self.add_register(group.acc_reg, 1)
+        for brams in group.bram_sets:
+            for bram in brams:
+                self.add_bram(bram, group.awidth, group.dwidth)
+                self.groups[bram] = group
+        if cnt_reg is not None:
+            self.add_register(cnt_reg)
+            self.counters[cnt_reg] = group
+
+    def refresh(self, name):
+        """
+        Update a device before it is read.
+        :param name: device name.
+        """
+        if name in self.groups:
+            self.groups[name].update(self)
+        elif name in self.counters:
+            self.devices[name].set_uint(self.counters[name].get_acc_count(self))
+        elif name == 'sys_clkcounter':
+            ticks = int((time.time() - self.start) * self.fpga_clk * 1e6)
+            self.devices[name].set_uint(ticks)
+
+    def written(self, name):
+        """
+        Apply the side effects of a write into a device: writing the counter
+        reset or an accumulation length register restarts the accumulations.
+        :param name: device name.
+        """
+        groups = set(self.groups.values())
+        if name in self.reset_regs:
+            restart = groups
+        else:
+            restart = [group for group in groups if group.acc_reg == name]
+        for group in restart:
+            group.start = time.time()
+            group.acc_index = None
+
+    def power(self, level_dbfs, acc_len):
+        """
+        Convert a power level in dBFS per channel into accumulated units,
+        the inverse of calandigital.scale_and_dBFS_specdata.
+        """
+        return acc_len * 10**((level_dbfs + self.dBFS) / 10.0)
+
+    def noise_spec(self, rng, acc_len, floor_dbfs, tones={}):
+        """
+        Accumulated power spectrum of a noise floor plus tones. The noise of
+        the accumulation decreases as 1/sqrt(acc_len).
+        :param rng: random number generator.
+        :param acc_len: accumulation length.
+        :param floor_dbfs: noise floor level in dBFS.
+        :param tones: dictionary channel -> tone level in dBFS.
+        :return: accumulated power spectrum.
+        """
+        floor = self.power(floor_dbfs, acc_len)
+        spec  = floor * (1 + rng.randn(self.nchannels) / np.sqrt(acc_len))
+        for chnl, level in tones.items():
+            spec[chnl] += self.power(level, acc_len)
+        return spec
+
+def make_dss_model():
+    """
+    Digital sideband separation model dss_2048ch_1520mhz, used by the DSS,
+    DSS NAOJ and Digital Balance Mixer scripts. The second input has a gain
+    and phase imbalance with a delay with respect to the first one, so the
+    calibration constants are smooth curves, and the synthesized outputs
+    have a finite sideband rejection.
+    """
+    model = Model('dss_2048ch_1520mhz', 1080, 2048)
+    awidth = 8; dwidth = 64; nbrams = 8
+    freqs = np.linspace(0, model.bandwidth, model.nchannels, endpoint=False)
+    gain  = 0.9 * np.exp(1j*(np.radians(20) + 2*np.pi*freqs*1e6*0.1e-9))
+    tones = {300: -10} # tone in channel 300 at -10 dBFS, the rf generator
+                       # is not simulated
+
+    def cal_generator(model, rng, acc_len):
+        a2 = model.noise_spec(rng, acc_len, -60, tones)
+        b2 = a2 * np.abs(gain)**2
+        ab = a2 * np.conj(gain) + model.power(-60, acc_len) * \
+            (rng.randn(model.nchannels) + 1j*rng.randn(model.nchannels)) / \
+            np.sqrt(2*acc_len)
+        return [a2, b2, ab.real, ab.imag]
+
+    def syn_generator(model, rng, acc_len):
+        usb = model.noise_spec(rng, acc_len, -60, tones)
+        lsb = model.noise_spec(rng, acc_len, -60,
+            dict((chnl, level-40) for chnl, level in tones.items())) # 40 dB SRR
+        return [usb, lsb]
+
+    brams = lambda prefix: [prefix + str(i) for i in range(nbrams)]
+    model.add_group(SpecGroup([brams('dout_a2_'), brams('dout_b2_'),
+        brams('dout_ab_re'), brams('dout_ab_im')], awidth, dwidth,
+        ['>u8', '>u8', '>i8', '>i8'], 'cal_acc_len', cal_generator))
+    model.add_group(SpecGroup([brams('dout0_'), brams('dout1_')], awidth,
+        dwidth, ['>u8', '>u8'], 'syn_acc_len', syn_generator))
+
+    # constants and other registers
+    for mult in ['bram_mult0_', 'bram_mult1_']:
+        for i in range(nbrams):
+            model.add_bram(mult + str(i) + '_bram_re', awidth, 32)
+            model.add_bram(mult + str(i) + '_bram_im', awidth, 32)
+    for reg in ['cnt_rst', 'adc0_delay', 'adc1_delay']:
+        model.add_register(reg)
+    model.reset_regs = ['cnt_rst']
+
+    return model
+
+def make_frbd_model():
+    """
+    FRB detection model frbd_64ch_600mhz. Each ACC bram accumulates the
+    dedispersed power of a DM with its own accumulation length.
+    """
+    model = Model('frbd_64ch_600mhz', 600, 64)
+    awidth = 10; dwidth = 32
+
+    def acc_generator(model, rng, acc_len):
+        # 2**awidth accumulations of the dedispersed power, ~50 dB
+        level = 1e5 * (1 + rng.randn(2**awidth) / np.sqrt(acc_len))
+        return [level]
+
+    for i in range(11):
+        model.add_group(SpecGroup([['ACC' + str(i)]], awidth, dwidth, ['>u4'],
+            'acc_len' + str(i), acc_generator))
+        model.add_register('frb_detect' + str(i))
+    model.add_register('cnt_rst')
+    model.reset_regs = ['cnt_rst']
+
+    return model
+
+def make_detector_model():
+    """
+    FRB detector model detector_roach2_v2.2 (DetectorACC_v2.2.py), with 10
+    ACC rams of 2**9 64 bit words.
+    """
+    model = Model('detector_roach2_v2.2', 540, 64, fpga_clk=135)
+    awidth = 9; dwidth = 64
+
+    def acc_generator(model, rng, acc_len):
+        return [1e6 * (1 + 0.01*rng.randn(2**awidth))]
+
+    model.add_register('acc_len', 2**10)
+    for i in range(1, 11):
+        model.add_group(SpecGroup([['ACC' + str(i)]], awidth, dwidth, ['>u8'],
+            'acc_len', acc_generator))
+        model.add_register('theta' + str(i))
+
+    return model
+
+def make_kestfilt_model():
+    """
+    RFI mitigation model kestfilt_4096ch_1080mhz. The primary and reference
+    signals have an RFI tone, and the filter output has the tone removed
+    when the filter is on.
+    """
+    model = Model('kestfilt_4096ch_1080mhz', 540, 4096)
+    awidth = 9; dwidth = 64; nbrams = 8
+    rfi = {2048: -20} # rfi tone at filter channel
+
+    def spec_generator(model, rng, acc_len):
+        prim = model.noise_spec(rng, acc_len, -70, rfi)
+        ref  = model.noise_spec(rng, acc_len, -60, rfi)
+        if model.devices['filter_on'].get_uint():
+            out = model.noise_spec(rng, acc_len, -70)
+        else:
+            out = prim.copy()
+        return [prim, ref, out]
+
+    bram_sets = [['dout' + str(j) + '_' + str(i) for i in range(nbrams)]
+        for j in range(3)]
+    model.add_group(SpecGroup(bram_sets, awidth, dwidth, ['>u8']*3, 'acc_len',
+        spec_generator))
+    for reg in ['cnt_rst', 'filter_on', 'filter_gain', 'filter_acc', 'channel']:
+        model.add_register(reg)
+    for i in range(3):
+        model.add_bram('dout_chnl_real' + str(i), 10, 32)
+        model.add_bram('dout_chnl_imag' + str(i), 10, 32)
+    model.add_bram('dout_chnl_max', 10, 64)
+    model.add_bram('dout_chnl_mean', 10, 64)
+    model.reset_regs = ['cnt_rst']
+
+    return model
+
+def make_spec_model(name, bandwidth, ninputs):
+    """
+    Spectrometer models specNin_4096ch_XXXmhz, with ninputs spectra of
+    4096 channels in 8 interleaved brams each.
+    """
+    model = Model(name, bandwidth, 4096)
+    awidth = 9; dwidth = 64; nbrams = 8
+
+    def spec_generator(model, rng, acc_len):
+        return [model.noise_spec(rng, acc_len, -60, {1000: -20})
+            for _ in range(ninputs)]
+
+    bram_sets = [['dout' + str(j) + '_' + str(i) for i in range(nbrams)]
+        for j in range(ninputs)]
+    model.add_group(SpecGroup(bram_sets, awidth, dwidth, ['>u8']*ninputs,
+        'acc_len', spec_generator))
+    model.add_register('cnt_rst')
+    model.reset_regs = ['cnt_rst']
+
+    return model
+
+def make_spec_compare_model():
+    """
+    HLS FFT comparison model spec_compare, with the spectra of the Xilinx
+    and HLS FFTs in bit reversed order.
+    """
+    model = Model('spec_compare', 100, 1024)
+    nbits = 10
+    bitrev = np.array([int(format(i, '0' + str(nbits) + 'b')[::-1], 2)
+        for i in range(2**nbits)])
+
+    def spec_generator(model, rng, acc_len):
+        spec = model.noise_spec(rng, 1, -60, {100: -10})
+        return [spec[bitrev], spec[bitrev]]
+
+    model.add_register('acc_len', 1)
+    model.add_group(SpecGroup([['dout0'], ['dout']], nbits, 64, ['>u8']*2,
+        'acc_len', spec_generator))
+
+    return model
+
+def make_specdram_model():
+    """
+    DRAM spectrogram model specdram_4096ch_500mhz. The dram is read through
+    the dram_memory device, paged with the dram_controller register.
+    """
+    model = Model('specdram_4096ch_500mhz', 480, 4096)
+    model.add_register('dram_controller')
+    # only the first page is simulated to keep the memory low
+    model.add_bram('dram_memory', 22, 128)
+    rng = np.random.RandomState(0)
+    ndata = len(model.devices['dram_memory'].data) // 4
+    model.devices['dram_memory'].write(0,
+        (1e6*(1 + 0.01*rng.randn(ndata))).astype('>u4').tobytes())
+
+    return model
+
+# available models, the key is matched with the start of the bof file name
+models = {
+    'dss_2048ch_1520mhz'      : make_dss_model,
+    'frbd_64ch_600mhz'        : make_frbd_model,
+    'detector_roach2'         : make_detector_model,
+    'kestfilt_4096ch_1080mhz' : make_kestfilt_model,
+    'spec1in_4096ch_540mhz'   : lambda: make_spec_model('spec1in_4096ch_540mhz', 540, 1),
+    'spec2in_4096ch_1080mhz'  : lambda: make_spec_model('spec2in_4096ch_1080mhz', 1080, 2),
+    'spec_compare'            : make_spec_compare_model,
+    'specdram_4096ch_500mhz'  : make_specdram_model}
+
+def get_model(boffile):
+    """
+    Create the simulated model of a bof file.
+    :param boffile: bof file name or model name.
+    :return: Model object, or None if there is no model for the bof file.
+    """
+    for name, make_model in models.items():
+        if boffile.split('/')[-1].startswith(name):
+            return make_model()
+    return None